@@ -0,0 +1,157 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Measure the memory used by each job tracked by a JobManager.
+
+The jobs of a JobManager, with their data in a shared JobTable, are
+compared to jobs storing every attribute in their own ``__dict__``, as
+every ``Job`` did before the JobTable.
+
+Usage:
+
+    python benchmarks/job_memory.py --count 100000
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import gc
+import logging
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kiosk_client import manager  # noqa: E402 pylint: disable=C0413
+from kiosk_client.job import Job  # noqa: E402 pylint: disable=C0413
+
+
+class OfflineJobManager(manager.JobManager):
+    """JobManager that does not connect to the host."""
+
+    def _get_host(self, host):
+        return host
+
+
+class DictJob(object):
+    """A job with every attribute in its ``__dict__``, as before JobTable."""
+
+    def __init__(self, host, filepath, model_name, model_version):
+        self.logger = logging.getLogger(str(self.__class__.__name__))
+        self.host = str(host)
+        self.filepath = str(filepath)
+        self.model_name = str(model_name)
+        self.model_version = str(model_version)
+        self.job_type = 'segmentation'
+        self.data_scale = ''
+        self.data_label = ''
+        self.preprocess = ''
+        self.postprocess = ''
+        self.upload_prefix = 'uploads'
+        self.expire_time = 3600
+        self.update_interval = 10
+        self.original_name = self.filepath
+        self.download_results = False
+        self.output_dir = '.'
+        self.failed = False
+        self.is_expired = False
+        self.headers = dict(Job.headers)
+        self.status = None
+        self.job_id = None
+        self.created_at = None
+        self.finished_at = None
+        self.postprocess_time = None
+        self.prediction_time = None
+        self.download_time = None
+        self.upload_time = None
+        self.output_url = None
+        self.total_jobs = None
+        self.total_time = None
+        self.reason = None
+        self.children_upload_time = None
+        self.cleanup_time = None
+        self.predict_retries = None
+        self._finished_statuses = set(Job._finished_statuses)
+        self.pool = None
+        self.sleep = Job.sleep
+        self._http_errors = tuple(Job._http_errors)
+
+
+def finish_job(job, i):
+    """Fill in the job data as if it was created, monitored and summarized."""
+    job.job_id = 'predict:{}:image.png'.format(i)
+    job.status = 'done'
+    job.created_at = '2021-01-01T00:00:{:02d}.{:06d}+00:00'.format(
+        i % 60, i % 1000000)
+    job.finished_at = '2021-01-01T00:01:{:02d}.{:06d}+00:00'.format(
+        i % 60, i % 1000000)
+    job.output_url = 'https://storage.googleapis.com/output/{}.zip'.format(i)
+    job.reason = 'None'
+    for name in ('prediction_time', 'postprocess_time', 'upload_time',
+                 'download_time', 'cleanup_time', 'total_time'):
+        setattr(job, name, str(i * 0.001))
+    for name in ('predict_retries', 'total_jobs', 'children_upload_time'):
+        setattr(job, name, str(i % 3))
+    job.is_expired = True
+
+
+def measure(count, layout='table'):
+    """Get the traced bytes per finished job with the given layout."""
+    mgr = OfflineJobManager(host='localhost', job_type='segmentation',
+                            model='model:0')
+    jobs = []
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+
+    for i in range(count):
+        if layout == 'table':
+            job = mgr.make_job('image.png')
+        else:
+            job = DictJob('localhost', 'image.png', 'model', '0')
+            jobs.append(job)
+        finish_job(job, i)
+
+    gc.collect()
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (end - start) / count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-c', '--count', type=int, default=100000,
+                        help='Number of jobs to create.')
+    args = parser.parse_args()
+
+    before = measure(args.count, layout='dict')
+    after = measure(args.count, layout='table')
+    print('before (__dict__): {:.0f} bytes/job over {} jobs'.format(
+        before, args.count))
+    print('after (JobTable):  {:.0f} bytes/job over {} jobs'.format(
+        after, args.count))
+    print('{:.1f}x less memory per job'.format(before / after))
@@ -0,0 +1,296 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Measure the CPU time and memory of the client's hot paths.
+
+Each benchmark is run at several scales, and the CPU time and peak memory
+per item are compared to a stored baseline to catch regressions.
+
+Usage:
+
+    python benchmarks/micro.py
+    python benchmarks/micro.py --scales 1000 10000 --compare
+    python benchmarks/micro.py --save
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import collections
+import gc
+import json
+import logging
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from twisted.internet import defer  # noqa: E402 pylint: disable=C0413
+from PIL import Image  # noqa: E402 pylint: disable=C0413
+
+from kiosk_client import cost  # noqa: E402 pylint: disable=C0413
+from kiosk_client import utils  # noqa: E402 pylint: disable=C0413
+
+from job_memory import OfflineJobManager  # noqa: E402 pylint: disable=C0413
+from job_memory import finish_job  # noqa: E402 pylint: disable=C0413
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+
+SCALES = (1000, 10000, 100000, 1000000)
+
+# name -> (setup, maximum scale, items per call)
+BENCHMARKS = collections.OrderedDict()
+
+
+def benchmark(max_scale=None, items=None):
+    """Register ``setup(scale, tmpdir)``, which returns the function to time.
+
+    The returned function is called several times and must be repeatable.
+    Its time and memory are divided by ``items``, the number of items it
+    processes, which defaults to the scale.
+    """
+    def register(setup):
+        BENCHMARKS[setup.__name__] = (setup, max_scale, items)
+        return setup
+    return register
+
+
+def make_manager(scale, tmpdir):
+    mgr = OfflineJobManager(host='localhost', job_type='segmentation',
+                            model='model:0', output_dir=tmpdir)
+    for i in range(scale):
+        finish_job(mgr.make_job('image.png'), i)
+    return mgr
+
+
+@benchmark()
+def job_json(scale, tmpdir):
+    jobs = make_manager(scale, tmpdir).all_jobs
+    return lambda: [job.json() for job in jobs]
+
+
+@benchmark(items=100)  # the time of each call, which should not grow
+def get_completed_job_count(scale, tmpdir):
+    mgr = make_manager(scale, tmpdir)
+    for i, job in enumerate(mgr.all_jobs):
+        if i % 4:  # jobs in each stage of their lifecycle
+            job.is_expired = False
+            job.status = ('new', 'started', 'done')[i % 4 - 1]
+
+    def run():
+        for _ in range(100):
+            mgr.get_completed_job_count()
+    return run
+
+
+@benchmark()
+def summarize(scale, tmpdir):
+    return make_manager(scale, tmpdir).summarize
+
+
+class DummyResponse(object):
+
+    code = 200
+    phrase = b'OK'
+    request = None
+
+    def json(self):
+        return defer.succeed({'value': 'done'})
+
+
+@benchmark()
+def retry_post_request_wrapper(scale, tmpdir):
+    job = make_manager(1, tmpdir).all_jobs[0]
+    response = DummyResponse()
+    job._make_post_request = lambda host, **kwargs: defer.succeed(response)
+    job._log_http_response = lambda response, created_at: None
+
+    def run():
+        for _ in range(scale):
+            job._retry_post_request_wrapper('http://localhost/api/redis')
+    return run
+
+
+@benchmark(max_scale=100000)
+def iter_image_files(scale, tmpdir):
+    image = os.path.join(tmpdir, 'image.png')
+    Image.new('L', (8, 8)).save(image)
+    with open(image, 'rb') as f:
+        data = f.read()
+    os.remove(image)
+
+    for i in range(scale):
+        subdir = os.path.join(tmpdir, str(i // 1000))
+        if not i % 1000:
+            os.makedirs(subdir)
+        with open(os.path.join(subdir, '{}.png'.format(i)), 'wb') as f:
+            f.write(data)
+    return lambda: list(utils.iter_image_files(tmpdir))
+
+
+@benchmark()
+def parse_create_response(scale, tmpdir):  # pylint: disable=W0613
+    # 100 samples of each node, with a new creation event every 10 samples
+    cost_getter = cost.CostGetter(benchmarking_start_time=0)
+    response = {'data': {'result': [
+        {
+            'metric': {'node': 'node-{}'.format(n)},
+            'values': [[t, str(t - t % 10)] for t in range(1000, 1100)],
+        } for n in range(max(1, scale // 100))
+    ]}}
+    return lambda: cost_getter.parse_create_response(response)
+
+
+def measure(setup, scale, repeat=3, min_time=0.2, items=None):
+    """Get the least CPU time and the peak memory of the benchmark.
+
+    Fast benchmarks are run in a loop taking at least ``min_time`` seconds.
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        func = setup(scale, tmpdir)
+
+        start = time.process_time()
+        func()
+        elapsed = time.process_time() - start
+        loops = max(1, int(math.ceil(min_time / max(elapsed, 1e-6))))
+
+        times = []
+        for _ in range(repeat):
+            gc.collect()
+            start = time.process_time()
+            for _ in range(loops):
+                func()
+            times.append((time.process_time() - start) / loops)
+
+        gc.collect()
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(tmpdir)
+
+    return {
+        'cpu_time_per_item': min(times) / (items or scale),
+        'peak_memory_per_item': peak / (items or scale),
+    }
+
+
+def run(names, scales, repeat=3):
+    results = {}
+    for name in names:
+        setup, max_scale, items = BENCHMARKS[name]
+        for scale in scales:
+            if max_scale and scale > max_scale:
+                continue
+            result = measure(setup, scale, repeat=repeat, items=items)
+            results['{}[{}]'.format(name, scale)] = result
+            print('{:<40} {:>12.3f} us/item {:>12.1f} bytes/item'.format(
+                '{}[{}]'.format(name, scale),
+                result['cpu_time_per_item'] * 1e6,
+                result['peak_memory_per_item']))
+    return results
+
+
+def compare(results, baseline, time_tolerance, memory_tolerance):
+    """Get a description of each result that regressed from the baseline."""
+    tolerances = {
+        'cpu_time_per_item': time_tolerance,
+        'peak_memory_per_item': memory_tolerance,
+    }
+    regressions = []
+    for key, result in sorted(results.items()):
+        for metric, tolerance in tolerances.items():
+            expected = baseline.get(key, {}).get(metric)
+            if expected and result[metric] > expected * (1 + tolerance):
+                regressions.append('{} {}: {:.3g} > {:.3g} (+{:.0%})'.format(
+                    key, metric, result[metric], expected,
+                    result[metric] / expected - 1))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('benchmarks', nargs='*',
+                        help='Benchmarks to run, any of {}. Defaults to '
+                             'all.'.format(', '.join(BENCHMARKS)))
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES,
+                        help='Number of items of each benchmark.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Time each benchmark this many times.')
+    parser.add_argument('--baseline', default=BASELINE,
+                        help='Path of the baseline results.')
+    parser.add_argument('--save', action='store_true',
+                        help='Save the results to the baseline.')
+    parser.add_argument('--compare', action='store_true',
+                        help='Exit with an error if any result regressed '
+                             'from the baseline.')
+    parser.add_argument('--time-tolerance', type=float, default=0.5,
+                        help='Allowed fraction of CPU time regression.')
+    parser.add_argument('--memory-tolerance', type=float, default=0.1,
+                        help='Allowed fraction of peak memory regression.')
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error('Unknown benchmarks: {}'.format(', '.join(unknown)))
+
+    logging.disable(logging.INFO)  # the managers log every status check
+
+    results = run(args.benchmarks or list(BENCHMARKS), args.scales,
+                  repeat=args.repeat)
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.time_tolerance,
+                              args.memory_tolerance)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        if regressions:
+            sys.exit(1)
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=4, sort_keys=True)
+        print('Saved baseline to', args.baseline)
+
+
+if __name__ == '__main__':
+    main()
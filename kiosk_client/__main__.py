@@ -36,6 +36,9 @@ import sys
 
 from twisted.internet import reactor
 
+from kiosk_client import analysis
+from kiosk_client import arrivals
+from kiosk_client import compare
 from kiosk_client import manager
 from kiosk_client import settings
 
@@ -122,6 +125,26 @@ def get_arg_parser():
     parser.add_argument('--no-download-results', action='store_true',
                         help='Upload the final output file to the bucket.')
 
+    parser.add_argument('--redis-multi-get', action='store_true',
+                        default=settings.REDIS_MULTI_GET,
+                        help='Request all summary fields of a job in a single '
+                             'request. Falls back to concurrent requests if '
+                             'the API does not support it.')
+
+    parser.add_argument('--redis-host', default=settings.REDIS_HOST,
+                        help='Read and expire the hashes of jobs directly in '
+                             'Redis on this host instead of through the '
+                             'frontend API.')
+
+    parser.add_argument('--redis-port', type=int,
+                        default=settings.REDIS_PORT,
+                        help='Port of the Redis server.')
+
+    parser.add_argument('--redis-batch-size', type=int,
+                        default=settings.REDIS_BATCH_SIZE,
+                        help='Maximum number of Redis commands sent in each '
+                             'pipelined round trip.')
+
     parser.add_argument('--calculate-cost', action='store_true',
                         help='Use the Grafana API to calculate the cost of '
                              'the job.')
@@ -132,10 +155,158 @@ def get_arg_parser():
                         help='Time between each job creation '
                              '(0.5s is a typical file upload time).')
 
+    parser.add_argument('--schedule-window', type=float,
+                        default=settings.SCHEDULE_WINDOW,
+                        help='Create benchmarking jobs at most this many '
+                             'seconds before they start.')
+
+    parser.add_argument('--max-pending-jobs', type=int,
+                        default=settings.MAX_PENDING_JOBS,
+                        help='Maximum number of benchmarking jobs created '
+                             'but not yet started.')
+
+    parser.add_argument('--upload-concurrency', type=int,
+                        default=settings.UPLOAD_CONCURRENCY,
+                        help='Maximum number of files uploaded at once when '
+                             'processing a directory of files.')
+
+    parser.add_argument('--stage-uploads', type=int,
+                        default=settings.STAGE_UPLOADS,
+                        help='With `--upload`, upload this many copies of '
+                             'the file before the benchmark starts and reuse '
+                             'them for all jobs. Disabled if 0.')
+
+    parser.add_argument('--verify-processes', type=int,
+                        default=settings.VERIFY_PROCESSES,
+                        help='Number of processes verifying the image files '
+                             'of a directory. If 0 or 1, files are verified '
+                             'in the client process.')
+
+    parser.add_argument('--cache-dir', type=str,
+                        default=settings.CACHE_DIR,
+                        help='Directory of local caches, such as the '
+                             'verified image files of previous runs. '
+                             'Disabled if empty.')
+
+    parser.add_argument('--upload-cache', action='store_true',
+                        default=settings.UPLOAD_CACHE,
+                        help='Upload the contents of each file only once, '
+                             'reusing the uploads of previous runs.')
+
+    parser.add_argument('--verify-cached-uploads', action='store_true',
+                        default=settings.VERIFY_CACHED_UPLOADS,
+                        help='Check that a cached upload still exists in the '
+                             'storage bucket before reusing it. Requires '
+                             '--storage-bucket.')
+
+    parser.add_argument('--pack-max-files', type=int,
+                        default=settings.PACK_MAX_FILES,
+                        help='Pack up to this many small image files into '
+                             'each zip archive, processed as a single job. '
+                             'Disabled if 0.')
+
+    parser.add_argument('--pack-max-bytes', type=int,
+                        default=settings.PACK_MAX_BYTES,
+                        help='Maximum total size in bytes of the files '
+                             'packed into each zip archive.')
+
+    parser.add_argument('--upload-workers', type=int,
+                        default=settings.UPLOAD_WORKERS,
+                        help='Maximum number of files uploaded to the '
+                             'storage bucket at once.')
+
+    parser.add_argument('--arrival-process', type=str,
+                        choices=arrivals.ARRIVAL_PROCESSES,
+                        help='Start benchmarking jobs following this arrival '
+                             'process instead of every START_DELAY seconds. '
+                             'Only used in `benchmark` mode.')
+
+    parser.add_argument('--arrival-rate', type=float,
+                        help='Jobs per second of the arrival process, or the '
+                             'starting rate of a `ramp`.')
+
+    parser.add_argument('--arrival-end-rate', type=float,
+                        help='Jobs per second at the end of a `ramp`.')
+
+    parser.add_argument('--arrival-duration', type=float,
+                        help='Seconds of a `ramp` or of each `step`.')
+
+    parser.add_argument('--step-rates', type=float, nargs='+',
+                        help='Jobs per second of each `step`.')
+
+    parser.add_argument('--burst-size', type=int, default=1,
+                        help='Number of jobs started at once in a `burst`.')
+
+    parser.add_argument('--arrival-seed', type=int,
+                        help='Random seed of the `poisson` process.')
+
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        help='Closed-loop benchmarking: keep this many jobs '
+                             'in flight, starting a new job as soon as one '
+                             'finishes. COUNT jobs are run at each given '
+                             'concurrency. Only used in `benchmark` mode.')
+
+    parser.add_argument('--find-capacity', action='store_true',
+                        help='Search for the highest rate of jobs that the '
+                             'cluster sustains, starting COUNT jobs at each '
+                             'rate. The first rate is the ARRIVAL_RATE, or '
+                             'one job every START_DELAY seconds. Only used '
+                             'in `benchmark` mode.')
+
+    parser.add_argument('--capacity-precision', type=float, default=0.1,
+                        help='Stop the capacity search once the highest '
+                             'sustainable rate is known within this '
+                             'fraction.')
+
+    parser.add_argument('--capacity-steps', type=int, default=10,
+                        help='Maximum number of rates run by the capacity '
+                             'search.')
+
+    parser.add_argument('--duration', type=float,
+                        help='Soak mode: start jobs for this many seconds '
+                             'instead of COUNT jobs, releasing each job once '
+                             'it expires so memory does not grow. Jobs are '
+                             'written to rolling JSON Lines files. Only used '
+                             'in `benchmark` mode.')
+
+    parser.add_argument('--roll-interval', type=float, default=3600,
+                        help='Seconds between new output files of a soak '
+                             'run.')
+
     parser.add_argument('--update-interval', type=float,
                         default=settings.UPDATE_INTERVAL,
                         help='Seconds between each job status refresh.')
 
+    parser.add_argument('--poll-batch-size', type=int,
+                        default=settings.POLL_BATCH_SIZE,
+                        help='Maximum number of job statuses requested each '
+                             'poll tick. Disabled (per-job polling) if 0.')
+
+    parser.add_argument('--poll-tick', type=float,
+                        default=settings.POLL_TICK,
+                        help='Seconds between each batch of status requests.')
+
+    parser.add_argument('--poll-jitter', type=float,
+                        default=settings.POLL_JITTER,
+                        help='Randomly scale each poll interval by up to this '
+                             'fraction to de-synchronize status requests.')
+
+    parser.add_argument('--adaptive-polling', action='store_true',
+                        default=settings.ADAPTIVE_POLLING,
+                        help='Poll queued jobs every MAX_UPDATE_INTERVAL and '
+                             'other jobs more often as they near the median '
+                             'completion time of finished jobs.')
+
+    parser.add_argument('--min-update-interval', type=float,
+                        default=settings.MIN_UPDATE_INTERVAL,
+                        help='Minimum seconds between each job status '
+                             'refresh when using adaptive polling.')
+
+    parser.add_argument('--max-update-interval', type=float,
+                        default=settings.MAX_UPDATE_INTERVAL,
+                        help='Maximum seconds between each job status '
+                             'refresh when using adaptive polling.')
+
     parser.add_argument('--refresh-rate', type=float,
                         default=settings.MANAGER_REFRESH_RATE,
                         help='Seconds between each manager status check.')
@@ -157,6 +328,31 @@ def get_arg_parser():
     parser.add_argument('--output-dir', default=settings.OUTPUT_DIR,
                         help='Directory to save the job output.')
 
+    parser.add_argument('--output-format', nargs='+',
+                        default=settings.OUTPUT_FORMATS,
+                        choices=manager.JobManager.supported_formats,
+                        help='Format(s) of the output file. "json" writes all '
+                             'job data at the end of the run. "jsonl" '
+                             'appends each job as it finishes, with a final '
+                             'summary line. "npz" writes the job data as '
+                             'NumPy arrays at the end of the run.')
+
+    parser.add_argument('--journal', type=str,
+                        default=settings.JOURNAL_FILE,
+                        help='Record the lifecycle of each job to this file '
+                             'so an interrupted run can be resumed.')
+
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume the run recorded in the JOURNAL. '
+                             'Finished jobs are restored, unfinished jobs are '
+                             'monitored and only the remaining jobs are '
+                             'created.')
+
+    parser.add_argument('--metrics-port', type=int,
+                        default=settings.METRICS_PORT,
+                        help='Serve live client metrics to Prometheus at '
+                             '/metrics on this port. Disabled if 0.')
+
     return parser
 
 
@@ -184,7 +380,17 @@ def initialize_logger(log_level):
     logging.getLogger('PIL').setLevel(logging.INFO)
 
 
+# commands that analyze the output files of previous runs
+COMMANDS = {
+    'analyze': analysis.main,
+    'compare': compare.main,
+}
+
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        sys.exit(COMMANDS[sys.argv[1]](sys.argv[2:]))
+
     args = get_arg_parser().parse_args()
 
     if settings.LOG_ENABLED:
@@ -202,7 +408,26 @@ if __name__ == '__main__':
         'model': args.model,
         'job_type': args.job_type,
         'update_interval': args.update_interval,
+        'poll_batch_size': args.poll_batch_size,
+        'poll_tick': args.poll_tick,
+        'poll_jitter': args.poll_jitter,
+        'adaptive_polling': args.adaptive_polling,
+        'min_update_interval': args.min_update_interval,
+        'max_update_interval': args.max_update_interval,
         'start_delay': args.start_delay,
+        'schedule_window': args.schedule_window,
+        'max_pending_jobs': args.max_pending_jobs,
+        'upload_concurrency': args.upload_concurrency,
+        'stage_uploads': args.stage_uploads,
+        'verify_processes': args.verify_processes,
+        'cache_dir': args.cache_dir,
+        'upload_cache': args.upload_cache,
+        'verify_cached_uploads': args.verify_cached_uploads,
+        'pack_max_files': args.pack_max_files,
+        'pack_max_bytes': args.pack_max_bytes,
+        'upload_workers': args.upload_workers,
+        'upload_chunk_size': settings.UPLOAD_CHUNK_SIZE,
+        'resumable_upload_threshold': settings.RESUMABLE_UPLOAD_THRESHOLD,
         'refresh_rate': args.refresh_rate,
         'postprocess': args.post,
         'preprocess': args.pre,
@@ -213,16 +438,74 @@ if __name__ == '__main__':
         'storage_bucket': args.storage_bucket,
         'upload_results': args.upload_results,
         'calculate_cost': args.calculate_cost,
+        'multi_get': args.redis_multi_get,
+        'redis_host': args.redis_host,
+        'redis_port': args.redis_port,
+        'redis_batch_size': args.redis_batch_size,
         'download_results': not args.no_download_results,
         'output_dir': args.output_dir,
+        'output_formats': args.output_format,
+        'journal': args.journal,
+        'resume': args.resume,
+        'metrics_port': args.metrics_port,
     }
 
+    if args.resume and not args.journal:
+        raise argparse.ArgumentTypeError('--resume requires a --journal.')
+
     if not os.path.exists(args.file) and not args.benchmark and args.upload:
         raise FileNotFoundError('%s could not be found.' % args.file)
 
     if args.benchmark:
+        arrival_process = None
+        if args.arrival_process:
+            try:
+                arrival_process = arrivals.get_arrival_process(
+                    args.arrival_process,
+                    rate=args.arrival_rate,
+                    end_rate=args.arrival_end_rate,
+                    duration=args.arrival_duration,
+                    rates=args.step_rates,
+                    burst_size=args.burst_size,
+                    seed=args.arrival_seed)
+            except ValueError as err:
+                raise argparse.ArgumentTypeError(str(err))
+
+        if args.concurrency and any(k < 1 for k in args.concurrency):
+            raise argparse.ArgumentTypeError(
+                '--concurrency must be positive integers.')
+
+        if args.duration is not None and args.duration <= 0:
+            raise argparse.ArgumentTypeError('--duration must be positive.')
+
+        if args.duration and args.journal:
+            raise argparse.ArgumentTypeError(
+                '--duration cannot be used with a --journal.')
+
+        if args.find_capacity and args.count < 3:
+            raise argparse.ArgumentTypeError(
+                '--find-capacity requires a --count of at least 3.')
+
         mgr = manager.BenchmarkingJobManager(**mgr_kwargs)
-        mgr.run(filepath=args.file, count=args.count, upload=args.upload)
+        if args.find_capacity:
+            rate = args.arrival_rate
+            if not rate:
+                rate = 1 / args.start_delay if args.start_delay > 0 else 1
+            mgr.find_capacity(filepath=args.file, count=args.count, rate=rate,
+                              precision=args.capacity_precision,
+                              max_steps=args.capacity_steps,
+                              upload=args.upload)
+        elif args.duration:
+            mgr.soak(filepath=args.file, duration=args.duration,
+                     roll_interval=args.roll_interval, upload=args.upload,
+                     arrivals=arrival_process)
+        elif args.concurrency:
+            mgr.run_closed_loop(filepath=args.file, count=args.count,
+                                concurrency=args.concurrency,
+                                upload=args.upload)
+        else:
+            mgr.run(filepath=args.file, count=args.count,
+                    upload=args.upload, arrivals=arrival_process)
 
     else:
         mgr = manager.BatchProcessingJobManager(**mgr_kwargs)
@@ -0,0 +1,308 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Analyze the output files of benchmarking runs"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import json
+
+import numpy as np
+
+from kiosk_client.results import decode
+from kiosk_client.results import load_npz
+from kiosk_client.results import parse_datetimes
+from kiosk_client.results import read_results
+
+
+# timing fields of each job record, in seconds
+TIMING_FIELDS = (
+    'total_time',
+    'prediction_time',
+    'postprocess_time',
+    'upload_time',
+    'download_time',
+    'cleanup_time',
+    'client_upload_time',
+)
+
+PERCENTILES = (50, 90, 99)
+
+
+def _to_float(value):
+    if isinstance(value, list):  # a value for each file of a zip
+        values = [_to_float(v) for v in value]
+        return max(values) if values else np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _count_images(total_jobs, packed_files):
+    """Count the images of each job, at least one."""
+    packed = np.array([len(files or ()) for files in packed_files],
+                      dtype=np.int64)
+    images = np.where(total_jobs >= 1, total_jobs, 1).astype(np.int64)
+    return np.where(packed > 0, packed, images)
+
+
+def to_floats(values):
+    """Convert a column of record values to a float array.
+
+    Missing or invalid values are NaN. Lists of values, one for each file
+    of a zip, are reduced to their maximum.
+    """
+    try:
+        floats = np.array(values, dtype=float)  # None is converted to NaN
+    except (TypeError, ValueError):
+        floats = None
+    if floats is None or floats.ndim != 1:  # lists of the same length
+        floats = np.array([_to_float(v) for v in values], dtype=float)
+    return floats
+
+
+class Results(object):
+    """The job records of one or more output files, as arrays of columns.
+
+    Args:
+        records (list): the record of each job.
+        summaries (list): the summary of each run.
+    """
+
+    def __init__(self, records, summaries=()):
+        self.summaries = list(summaries)
+        self.num_jobs = len(records)
+        self.status = np.array([r.get('status') for r in records],
+                               dtype=object)
+        self.timings = {f: to_floats([r.get(f) for r in records])
+                        for f in TIMING_FIELDS}
+        self.created_at = parse_datetimes([r.get('created_at')
+                                           for r in records])
+        self.finished_at = parse_datetimes([r.get('finished_at')
+                                            for r in records])
+        self.images = _count_images(
+            to_floats([r.get('total_jobs') for r in records]),
+            [r.get('packed_files') for r in records])
+
+    @classmethod
+    def from_npz(cls, path):
+        """Load the columns of a file written by ``write_npz``.
+
+        The numeric columns are memory-mapped from the file.
+        """
+        arrays = load_npz(path, mmap_mode='r')
+        extras = json.loads(str(arrays['extras']))
+
+        results = cls([], [json.loads(str(arrays['summary']))])
+        results.num_jobs = len(arrays['status'])
+        results.status = decode(arrays['status'], arrays['status_strings'])
+        results.created_at = arrays['created_at']
+        results.finished_at = arrays['finished_at']
+
+        for field in TIMING_FIELDS:
+            values = extras.get(field)
+            if values:  # the values of each file of a zip
+                column = np.array(arrays[field])
+                rows = [int(row) for row in values]
+                column[rows] = to_floats(list(values.values()))
+            else:
+                column = arrays[field]
+            results.timings[field] = column
+
+        packed_files = [None] * results.num_jobs
+        for row, files in extras.get('packed_files', {}).items():
+            packed_files[int(row)] = files
+        results.images = _count_images(arrays['total_jobs'], packed_files)
+        return results
+
+    @classmethod
+    def concatenate(cls, results):
+        """Combine the results of several runs."""
+        combined = cls([], [s for r in results for s in r.summaries])
+        combined.num_jobs = sum(r.num_jobs for r in results)
+        for name in ('status', 'created_at', 'finished_at', 'images'):
+            columns = [getattr(r, name) for r in results]
+            if columns:
+                setattr(combined, name, np.concatenate(columns))
+        for field in TIMING_FIELDS:
+            columns = [r.timings[field] for r in results]
+            if columns:
+                combined.timings[field] = np.concatenate(columns)
+        return combined
+
+    @classmethod
+    def load(cls, paths):
+        """Load and combine the output files of one or more runs."""
+        if isinstance(paths, str):
+            paths = [paths]
+        results = []
+        for path in paths:
+            if path.endswith('.npz'):
+                results.append(cls.from_npz(path))
+            else:
+                records, summary = read_results(path)
+                results.append(cls(records, [summary]))
+        if len(results) == 1:
+            return results[0]
+        return cls.concatenate(results)
+
+    @property
+    def done(self):
+        """Boolean mask of the jobs that finished successfully."""
+        return self.status == 'done'
+
+    def get_percentiles(self, field, percentiles=PERCENTILES):
+        """Get the percentiles and mean of a timing field of finished jobs.
+
+        Returns:
+            dict: the value of each percentile as ``'p50'``, etc., and the
+                ``'mean'``, or ``None`` if no job has a value.
+        """
+        values = self.timings[field][self.done]
+        values = values[~np.isnan(values)]
+        if not values.size:
+            return None
+        result = {'p{}'.format(q): v for q, v in zip(
+            percentiles, np.percentile(values, percentiles).tolist())}
+        result['mean'] = float(values.mean())
+        return result
+
+    def get_time_elapsed(self):
+        """Get the seconds from the first job created to the last finished."""
+        if not np.isfinite(self.created_at).any():
+            return None
+        end = self.finished_at[np.isfinite(self.finished_at)]
+        if not end.size:
+            return None
+        return float(end.max() - np.nanmin(self.created_at))
+
+    def get_completions_per_minute(self):
+        """Get the number of jobs finished in each minute of the run."""
+        finished_at = self.finished_at[self.done]
+        finished_at = finished_at[np.isfinite(finished_at)]
+        if not finished_at.size:
+            return []
+        minutes = (finished_at - np.nanmin(self.created_at)) // 60
+        return np.bincount(np.maximum(minutes, 0).astype(np.int64)).tolist()
+
+    def get_cost(self):
+        """Get the total cost of all runs, if known."""
+        costs = [_to_float(s.get('total_node_and_networking_costs'))
+                 for s in self.summaries]
+        costs = [c for c in costs if not np.isnan(c)]
+        return sum(costs) if costs else None
+
+    def report(self):
+        """Summarize the throughput and latency of the jobs."""
+        done = self.done
+        num_images = int(self.images[done].sum())
+        time_elapsed = self.get_time_elapsed()
+        cost = self.get_cost()
+
+        report = {
+            'num_jobs': self.num_jobs,
+            'num_done': int(done.sum()),
+            'num_failed': int((self.status == 'failed').sum()),
+            'num_images': num_images,
+            'time_elapsed': time_elapsed,
+            'throughput': None,
+            'images_per_second': None,
+            'cost': cost,
+            'cost_per_image': None,
+            'completions_per_minute': self.get_completions_per_minute(),
+        }
+        if cost is not None and num_images:
+            report['cost_per_image'] = cost / num_images
+        if time_elapsed:
+            report['throughput'] = report['num_done'] / time_elapsed
+            report['images_per_second'] = num_images / time_elapsed
+        for field in TIMING_FIELDS:
+            report[field] = self.get_percentiles(field)
+        return report
+
+
+def format_report(name, report):
+    """Format a report of ``Results.report`` as readable text."""
+    lines = ['{}: {} jobs ({} done, {} failed) in {} seconds'.format(
+        name, report['num_jobs'], report['num_done'], report['num_failed'],
+        _format(report['time_elapsed']))]
+    lines.append('  throughput: {} jobs/s, {} images/s'.format(
+        _format(report['throughput']), _format(report['images_per_second'])))
+    if report['cost_per_image'] is not None:
+        lines.append('  cost: {} per image'.format(
+            _format(report['cost_per_image'])))
+    for field in TIMING_FIELDS:
+        if report[field]:
+            lines.append('  {}: {}'.format(field, ', '.join(
+                '{} {}'.format(k, _format(v))
+                for k, v in sorted(report[field].items()))))
+    lines.append('  completions per minute: {}'.format(
+        ' '.join(str(c) for c in report['completions_per_minute'])))
+    return '\n'.join(lines)
+
+
+def _format(value):
+    return 'n/a' if value is None else '{:.4g}'.format(value)
+
+
+def get_arg_parser(parser=None):
+    if parser is None:
+        parser = argparse.ArgumentParser(
+            prog='python -m kiosk_client analyze',
+            description='Report the throughput and latency of benchmarking '
+                        'runs.')
+
+    parser.add_argument('files', nargs='+',
+                        help='Output files of the runs, as JSON, JSON '
+                             'Lines or NumPy arrays.')
+
+    parser.add_argument('--combine', action='store_true',
+                        help='Report all files as a single run.')
+
+    parser.add_argument('--json', action='store_true',
+                        help='Print the reports as JSON.')
+
+    return parser
+
+
+def main(argv=None):
+    args = get_arg_parser().parse_args(argv)
+
+    if args.combine:
+        reports = [('combined', Results.load(args.files).report())]
+    else:
+        reports = [(f, Results.load(f).report()) for f in args.files]
+
+    if args.json:
+        print(json.dumps(dict(reports), indent=4))
+    else:
+        print('\n\n'.join(format_report(n, r) for n, r in reports))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Tests for the analysis of output files"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from kiosk_client import analysis
+from kiosk_client import results
+from kiosk_client import store
+
+
+def _get_records():
+    records = []
+    for i in range(6):
+        records.append({
+            'status': 'done',
+            'created_at': '2021-01-01T00:00:{:02d}+00:00'.format(i * 10),
+            'finished_at': '2021-01-01T00:{:02d}:{:02d}+00:00'.format(
+                1 + i // 3, i),
+            'total_time': float(i + 1),
+            'prediction_time': str(i),
+            'postprocess_time': None,
+            'total_jobs': 1.0,
+        })
+    records[-1]['status'] = 'failed'
+    records[0]['prediction_time'] = [1.0, 2.0]  # the files of a zip
+    records[1]['packed_files'] = ['a.png', 'b.png', 'c.png']
+    return records
+
+
+class TestAnalysis(object):
+
+    def test_to_floats(self):
+        np.testing.assert_equal(analysis.to_floats([1, '2.5', None]),
+                                [1, 2.5, np.nan])
+        np.testing.assert_equal(
+            analysis.to_floats([[1, 3], 'None', [], {}, 2]),
+            [3, np.nan, np.nan, np.nan, 2])
+        np.testing.assert_equal(analysis.to_floats([[1, 3], [4, 2]]), [3, 4])
+
+    def test_parse_datetimes(self):
+        seconds = analysis.parse_datetimes([
+            '1970-01-01T00:00:01',
+            '1970-01-01T00:00:01.5Z',
+            '1970-01-01T01:00:02+01:00',
+            '1969-12-31T19:00:03-05:00',
+            None,
+            'None',
+        ])
+        np.testing.assert_equal(seconds, [1, 1.5, 2, 3, np.nan, np.nan])
+
+    def test_report(self):
+        report = analysis.Results(_get_records()).report()
+        assert report['num_jobs'] == 6
+        assert report['num_done'] == 5
+        assert report['num_failed'] == 1
+        assert report['num_images'] == 7
+        assert report['time_elapsed'] == 125  # until the failed job
+        assert report['throughput'] == pytest.approx(5 / 125)
+        assert report['images_per_second'] == pytest.approx(7 / 125)
+        assert report['completions_per_minute'] == [0, 3, 2]
+        assert report['total_time'] == {'p50': 3, 'p90': 4.6, 'p99': 4.96,
+                                        'mean': 3}
+        assert report['prediction_time']['p50'] == 2
+        assert report['postprocess_time'] is None
+        assert report['cost_per_image'] is None
+
+        # the cost of each run is summed
+        summaries = [{'total_node_and_networking_costs': '1.4'},
+                     {'total_node_and_networking_costs': ''}]
+        report = analysis.Results(_get_records(), summaries).report()
+        assert report['cost'] == 1.4
+        assert report['cost_per_image'] == pytest.approx(0.2)
+
+        report = analysis.Results([]).report()
+        assert report['num_jobs'] == 0
+        assert report['throughput'] is None
+        assert report['completions_per_minute'] == []
+
+    def test_load(self, tmpdir, capsys):
+        json_path = os.path.join(str(tmpdir), 'results.json')
+        with open(json_path, 'w') as f:
+            json.dump({'job_data': _get_records()[:3]}, f)
+
+        jsonl_path = os.path.join(str(tmpdir), 'results.jsonl')
+        writer = results.JsonlResultsWriter(jsonl_path)
+        for record in _get_records()[3:]:
+            writer.write(record)
+        writer.write_summary({'total_node_and_networking_costs': '7'})
+
+        combined = analysis.Results.load([json_path, jsonl_path])
+        assert combined.num_jobs == 6
+        assert combined.report() == analysis.Results(
+            _get_records(), [{}, {'total_node_and_networking_costs': '7'}]
+        ).report()
+
+        analysis.main([json_path, jsonl_path])
+        out = capsys.readouterr().out
+        assert '{}: 3 jobs (3 done, 0 failed)'.format(json_path) in out
+        assert 'cost: 3.5 per image' in out
+
+        analysis.main([json_path, jsonl_path, '--combine', '--json'])
+        reports = json.loads(capsys.readouterr().out)
+        assert reports['combined']['num_jobs'] == 6
+
+    def test_load_npz(self, tmpdir):
+        table = store.JobTable()
+        for record in _get_records():
+            table.load_record(table.append(), record)
+        summary = {'total_node_and_networking_costs': '7'}
+        npz_path = os.path.join(str(tmpdir), 'results.npz')
+        results.write_npz(npz_path, table, summary)
+
+        expected = analysis.Results(_get_records(), [summary])
+        loaded = analysis.Results.load(npz_path)
+        assert isinstance(loaded.timings['total_time'], np.memmap)
+        np.testing.assert_equal(loaded.timings['prediction_time'],
+                                expected.timings['prediction_time'])
+        assert loaded.report() == expected.report()
+
+        # combined with other formats
+        json_path = os.path.join(str(tmpdir), 'results.json')
+        with open(json_path, 'w') as f:
+            json.dump({'job_data': _get_records()}, f)
+        combined = analysis.Results.load([npz_path, json_path])
+        assert combined.num_jobs == 12
+        assert combined.report()['num_images'] == 14
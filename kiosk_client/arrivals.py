@@ -0,0 +1,247 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Arrival processes that decide when each benchmarking job is started"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import itertools
+import math
+import random
+
+
+class ArrivalProcess(object):
+    """Generates the start time of each job, in seconds since the start.
+
+    Iterating over an arrival process yields the non-decreasing start time
+    of each job. All rates are in jobs per second.
+    """
+
+    name = None
+
+    def __iter__(self):
+        raise NotImplementedError
+
+    def describe(self):
+        """Get the name and parameters of the process, for the output file.
+
+        Infinite rates, such as starting all jobs at once, are ``None`` so
+        the output file is valid JSON.
+        """
+        params = {k: _finite_or_none(v) for k, v in vars(self).items()
+                  if not k.startswith('_')}
+        params['name'] = self.name
+        return params
+
+    @property
+    def is_finite(self):
+        """Whether every rate and duration is finite.
+
+        A process with an infinite rate starts any number of jobs at once.
+        """
+        return all(_is_finite(v) for k, v in vars(self).items()
+                   if not k.startswith('_'))
+
+
+def _is_finite(value):
+    if isinstance(value, list):
+        return all(_is_finite(v) for v in value)
+    return not isinstance(value, float) or math.isfinite(value)
+
+
+def _finite_or_none(value):
+    if isinstance(value, list):
+        return [_finite_or_none(v) for v in value]
+    if not _is_finite(value):
+        return None
+    return value
+
+
+def _positive(value, name, allow_zero=False):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        value = float('nan')
+    if not value >= 0 or (value == 0 and not allow_zero):
+        raise ValueError('%s must be a positive number.' % name)
+    return value
+
+
+class ConstantArrivals(ArrivalProcess):
+    """Start jobs at a constant rate.
+
+    Args:
+        rate (float): jobs per second. If infinite, start all jobs at once,
+            and the rate is described as ``None``.
+    """
+
+    name = 'constant'
+
+    def __init__(self, rate):
+        self.rate = _positive(rate, 'rate')
+
+    @classmethod
+    def from_interval(cls, interval):
+        """Start a job every ``interval`` seconds."""
+        interval = _positive(interval, 'interval', allow_zero=True)
+        return cls(1 / interval if interval else float('inf'))
+
+    def __iter__(self):
+        interval = 1 / self.rate
+        for i in itertools.count():
+            yield i * interval
+
+
+class PoissonArrivals(ArrivalProcess):
+    """Start jobs with exponentially distributed times between them.
+
+    Args:
+        rate (float): average jobs per second.
+        seed (int): seed of the random number generator.
+    """
+
+    name = 'poisson'
+
+    def __init__(self, rate, seed=None):
+        self.rate = _positive(rate, 'rate')
+        self.seed = seed
+
+    def __iter__(self):
+        rng = random.Random(self.seed)
+        t = 0
+        while True:
+            yield t
+            t += rng.expovariate(self.rate)
+
+
+class RampArrivals(ArrivalProcess):
+    """Linearly change the rate of jobs, then keep the final rate.
+
+    Args:
+        start_rate (float): jobs per second at the start.
+        end_rate (float): jobs per second after ``duration`` seconds.
+        duration (float): seconds to change from start_rate to end_rate.
+    """
+
+    name = 'ramp'
+
+    def __init__(self, start_rate, end_rate, duration):
+        self.start_rate = _positive(start_rate, 'start_rate', allow_zero=True)
+        self.end_rate = _positive(end_rate, 'end_rate')
+        self.duration = _positive(duration, 'duration')
+
+    def __iter__(self):
+        s, e, d = self.start_rate, self.end_rate, self.duration
+        a = (e - s) / (2 * d)  # jobs started by time t: a * t^2 + s * t
+        ramp_jobs = (s + e) * d / 2
+        for k in itertools.count():
+            if k >= ramp_jobs:
+                yield d + (k - ramp_jobs) / e
+            elif a == 0:
+                yield k / s
+            else:  # solve a * t^2 + s * t = k
+                yield (-s + math.sqrt(s * s + 4 * a * k)) / (2 * a)
+
+
+class StepArrivals(ArrivalProcess):
+    """Start jobs at a sequence of constant rates, each for a fixed time.
+
+    The last rate is kept after all steps are complete.
+
+    Args:
+        rates (list): jobs per second of each step.
+        duration (float): seconds of each step.
+    """
+
+    name = 'step'
+
+    def __init__(self, rates, duration):
+        self.rates = [_positive(r, 'rate', allow_zero=True) for r in rates]
+        self.duration = _positive(duration, 'duration')
+        if not self.rates or not self.rates[-1]:
+            raise ValueError('The last step must have a positive rate.')
+
+    def __iter__(self):
+        for i, rate in enumerate(self.rates):
+            start = i * self.duration
+            is_last = i == len(self.rates) - 1
+            # the jobs started before the end of this step
+            count = float('inf') if is_last else rate * self.duration
+            j = 0
+            while j < count:
+                yield start + j / rate
+                j += 1
+
+
+class BurstArrivals(ArrivalProcess):
+    """Start jobs in periodic bursts.
+
+    Args:
+        rate (float): average jobs per second.
+        burst_size (int): number of jobs started at the same time.
+    """
+
+    name = 'burst'
+
+    def __init__(self, rate, burst_size):
+        self.rate = _positive(rate, 'rate')
+        self.burst_size = int(_positive(burst_size, 'burst_size'))
+
+    def __iter__(self):
+        interval = self.burst_size / self.rate
+        for i in itertools.count():
+            yield (i // self.burst_size) * interval
+
+
+ARRIVAL_PROCESSES = ('constant', 'poisson', 'ramp', 'step', 'burst')
+
+
+def get_arrival_process(name, rate=None, **kwargs):
+    """Create an arrival process by name.
+
+    Args:
+        name (str): name of the process, one of ``ARRIVAL_PROCESSES``.
+        rate (float): jobs per second, or the starting rate of a ramp.
+        kwargs (dict): other parameters of the process: ``end_rate`` and
+            ``duration`` for ramps, ``rates`` and ``duration`` for steps,
+            ``burst_size`` for bursts and ``seed`` for Poisson processes.
+
+    Returns:
+        ArrivalProcess: the arrival process.
+    """
+    if name == 'constant':
+        return ConstantArrivals(rate)
+    if name == 'poisson':
+        return PoissonArrivals(rate, seed=kwargs.get('seed'))
+    if name == 'ramp':
+        return RampArrivals(rate, kwargs.get('end_rate'),
+                            kwargs.get('duration'))
+    if name == 'step':
+        return StepArrivals(kwargs.get('rates'), kwargs.get('duration'))
+    if name == 'burst':
+        return BurstArrivals(rate, kwargs.get('burst_size', 1))
+    raise ValueError('Invalid arrival process "%s", must be one of %s.' %
+                     (name, ', '.join(ARRIVAL_PROCESSES)))
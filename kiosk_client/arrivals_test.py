@@ -0,0 +1,117 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Tests for arrival processes"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import itertools
+import json
+
+import pytest
+
+from kiosk_client import arrivals
+
+
+def take(process, n):
+    return list(itertools.islice(process, n))
+
+
+class TestArrivals(object):
+
+    def test_constant(self):
+        assert take(arrivals.ConstantArrivals(2), 4) == [0, 0.5, 1, 1.5]
+        assert take(arrivals.ConstantArrivals.from_interval(0), 3) == [0] * 3
+        # all at once is described as valid JSON
+        describe = arrivals.ConstantArrivals.from_interval(0).describe()
+        assert describe == {'name': 'constant', 'rate': None}
+        json.dumps(describe, allow_nan=False)
+        assert not arrivals.ConstantArrivals.from_interval(0).is_finite
+        assert arrivals.ConstantArrivals(2).is_finite
+        assert take(arrivals.ConstantArrivals.from_interval(2), 3) == [0, 2, 4]
+
+        for rate in (0, -1, None, 'one', float('nan')):
+            with pytest.raises(ValueError):
+                arrivals.ConstantArrivals(rate)
+
+    def test_poisson(self):
+        starts = take(arrivals.PoissonArrivals(10, seed=1), 10000)
+        assert starts == sorted(starts)
+        assert starts == take(arrivals.PoissonArrivals(10, seed=1), 10000)
+        # the average rate should be close to the given rate
+        assert 9 < len(starts) / starts[-1] < 11
+
+    def test_ramp(self):
+        starts = take(arrivals.RampArrivals(0, 4, 2), 8)
+        assert starts == sorted(starts)
+        # 4 jobs are started during the ramp, then 4 jobs per second.
+        assert starts[4:] == [2, 2.25, 2.5, 2.75]
+        assert starts[:4] == pytest.approx([0, 1, 2 ** .5, 3 ** .5])
+
+        starts = take(arrivals.RampArrivals(2, 2, 1), 4)
+        assert starts == [0, 0.5, 1, 1.5]
+
+        with pytest.raises(ValueError):
+            arrivals.RampArrivals(1, 0, 1)
+        with pytest.raises(ValueError):
+            arrivals.RampArrivals(1, 2, 0)
+
+    def test_step(self):
+        starts = take(arrivals.StepArrivals([1, 0, 2], 2), 6)
+        assert starts == [0, 1, 4, 4.5, 5, 5.5]
+
+        assert not arrivals.StepArrivals([1, float('inf')], 2).is_finite
+
+        with pytest.raises(ValueError):
+            arrivals.StepArrivals([1, 0], 2)
+        with pytest.raises(ValueError):
+            arrivals.StepArrivals([], 2)
+
+    def test_burst(self):
+        starts = take(arrivals.BurstArrivals(2, 3), 7)
+        assert starts == [0, 0, 0, 1.5, 1.5, 1.5, 3]
+
+        with pytest.raises(ValueError):
+            arrivals.BurstArrivals(2, 0)
+
+    def test_get_arrival_process(self):
+        processes = {
+            'constant': {'rate': 1},
+            'poisson': {'rate': 1, 'seed': 1},
+            'ramp': {'rate': 1, 'end_rate': 2, 'duration': 3},
+            'step': {'rates': [1, 2], 'duration': 3},
+            'burst': {'rate': 1, 'burst_size': 2},
+        }
+        assert set(processes) == set(arrivals.ARRIVAL_PROCESSES)
+        for name, kwargs in processes.items():
+            process = arrivals.get_arrival_process(name, **kwargs)
+            assert isinstance(process, arrivals.ArrivalProcess)
+            assert process.describe()['name'] == name
+
+        with pytest.raises(ValueError):
+            arrivals.get_arrival_process('unknown', rate=1)
+        with pytest.raises(ValueError):
+            arrivals.get_arrival_process('ramp', rate=1)  # missing params
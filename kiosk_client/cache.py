@@ -0,0 +1,182 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Local caches that let repeated runs skip redundant work"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+
+class FileIndex(object):
+    """Remembers whether each file is a valid image.
+
+    Each verdict is keyed by the path, size and modification time of the
+    file, so a file that changes is verified again. The index may be used
+    from multiple threads.
+
+    Args:
+        path (str): path of the SQLite database, or ``:memory:``.
+    """
+
+    def __init__(self, path=':memory:'):
+        self.logger = logging.getLogger(str(self.__class__.__name__))
+        self.path = path
+        if path != ':memory:':
+            dirname = os.path.dirname(os.path.abspath(path))
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS files ('
+                         'path TEXT PRIMARY KEY, size INTEGER, '
+                         'mtime REAL, valid INTEGER)')
+
+    def _execute(self, *args):
+        with self._lock:
+            return self._db.execute(*args).fetchone()
+
+    def __len__(self):
+        return self._execute('SELECT COUNT(*) FROM files')[0]
+
+    def get(self, filepath, size, mtime):
+        """Get the verdict of a file.
+
+        Returns:
+            bool: whether the file is valid, or None if it is not known.
+        """
+        row = self._execute(
+            'SELECT valid FROM files WHERE path = ? AND size = ? '
+            'AND mtime = ?', (filepath, size, mtime))
+        return None if row is None else bool(row[0])
+
+    def put(self, filepath, size, mtime, valid):
+        """Record the verdict of a file."""
+        self._execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                      (filepath, size, mtime, int(valid)))
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self.commit()
+            self._db.close()
+            self._db = None
+
+
+def hash_file(filepath, chunk_size=1 << 20):
+    """Get the SHA-256 hex digest of the contents of a file."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        chunk = f.read(chunk_size)
+        while chunk:
+            digest.update(chunk)
+            chunk = f.read(chunk_size)
+    return digest.hexdigest()
+
+
+class UploadCache(object):
+    """Remembers where the contents of each file were uploaded.
+
+    Uploads are keyed by the hash of the file and the destination, so
+    identical files are only uploaded once to each destination, even if
+    they have different paths. The cache may be used from multiple threads.
+
+    Args:
+        path (str): path of the SQLite database, or ``:memory:``.
+        exists (function): if given, called with the uploaded name of a
+            cached upload to verify it still exists before it is reused.
+    """
+
+    def __init__(self, path=':memory:', exists=None):
+        self.logger = logging.getLogger(str(self.__class__.__name__))
+        self.path = path
+        self.exists = exists
+        if path != ':memory:':
+            dirname = os.path.dirname(os.path.abspath(path))
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS uploads ('
+                         'digest TEXT, destination TEXT, name TEXT, '
+                         'PRIMARY KEY (digest, destination))')
+
+    def _execute(self, *args):
+        with self._lock:
+            row = self._db.execute(*args).fetchone()
+            self._db.commit()
+            return row
+
+    def __len__(self):
+        return self._execute('SELECT COUNT(*) FROM uploads')[0]
+
+    def get(self, digest, destination):
+        """Get the uploaded name of the contents, or None if not uploaded."""
+        row = self._execute(
+            'SELECT name FROM uploads WHERE digest = ? AND destination = ?',
+            (digest, destination))
+        if row is None:
+            return None
+
+        name = row[0]
+        if self.exists is not None and not self.exists(name):
+            self.logger.debug('Cached upload %s no longer exists.', name)
+            self.discard(digest, destination)
+            return None
+        return name
+
+    def put(self, digest, destination, name):
+        """Record the uploaded name of the contents."""
+        self._execute('INSERT OR REPLACE INTO uploads VALUES (?, ?, ?)',
+                      (digest, destination, name))
+
+    def discard(self, digest, destination):
+        self._execute(
+            'DELETE FROM uploads WHERE digest = ? AND destination = ?',
+            (digest, destination))
+
+    def lookup(self, filepath, destination):
+        """Hash the file and get its uploaded name.
+
+        Returns:
+            tuple: the digest of the file and its uploaded name, or None if
+                it was not uploaded.
+        """
+        digest = hash_file(filepath)
+        return digest, self.get(digest, destination)
+
+    def close(self):
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+            self._db = None
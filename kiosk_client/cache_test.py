@@ -0,0 +1,118 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Tests for local caches"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+from kiosk_client import cache
+
+
+class TestFileIndex(object):
+
+    def test_get_put(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'cache', 'images.sqlite')
+        index = cache.FileIndex(path)
+        assert index.get('a.png', 1, 2.5) is None
+
+        index.put('a.png', 1, 2.5, True)
+        index.put('b.png', 1, 2.5, False)
+        assert index.get('a.png', 1, 2.5) is True
+        assert index.get('b.png', 1, 2.5) is False
+        assert len(index) == 2
+
+        # modified files are not known
+        assert index.get('a.png', 2, 2.5) is None
+        assert index.get('a.png', 1, 3.5) is None
+
+        index.put('a.png', 2, 3.5, False)
+        assert index.get('a.png', 2, 3.5) is False
+        assert len(index) == 2
+        index.close()
+        index.close()  # closing twice is fine
+
+        # verdicts are persisted
+        index = cache.FileIndex(path)
+        assert index.get('b.png', 1, 2.5) is False
+        assert len(index) == 2
+        index.close()
+
+
+def test_hash_file(tmpdir):
+    a = tmpdir.join('a.png')
+    a.write('content')
+    b = tmpdir.join('b.png')
+    b.write('content')
+    c = tmpdir.join('c.png')
+    c.write('other content')
+    assert cache.hash_file(str(a)) == cache.hash_file(str(b))
+    assert cache.hash_file(str(a), chunk_size=2) == cache.hash_file(str(b))
+    assert cache.hash_file(str(a)) != cache.hash_file(str(c))
+
+
+class TestUploadCache(object):
+
+    def test_get_put(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'uploads.sqlite')
+        uploads = cache.UploadCache(path)
+        assert uploads.get('abc', 'host') is None
+
+        uploads.put('abc', 'host', 'uploads/x.png')
+        assert uploads.get('abc', 'host') == 'uploads/x.png'
+        assert uploads.get('abc', 'other host') is None
+        assert len(uploads) == 1
+        uploads.close()
+
+        # uploads are persisted
+        uploads = cache.UploadCache(path)
+        assert uploads.get('abc', 'host') == 'uploads/x.png'
+
+        uploads.discard('abc', 'host')
+        assert uploads.get('abc', 'host') is None
+        uploads.close()
+
+    def test_exists(self):
+        existing = {'uploads/x.png'}
+        uploads = cache.UploadCache(exists=lambda name: name in existing)
+        uploads.put('abc', 'host', 'uploads/x.png')
+        assert uploads.get('abc', 'host') == 'uploads/x.png'
+
+        existing.clear()
+        assert uploads.get('abc', 'host') is None
+        assert len(uploads) == 0  # stale uploads are forgotten
+
+    def test_lookup(self, tmpdir):
+        p = tmpdir.join('a.png')
+        p.write('content')
+        uploads = cache.UploadCache()
+        digest, name = uploads.lookup(str(p), 'host')
+        assert digest == cache.hash_file(str(p))
+        assert name is None
+
+        uploads.put(digest, 'host', 'uploads/a.png')
+        assert uploads.lookup(str(p), 'host') == (digest, 'uploads/a.png')
@@ -0,0 +1,261 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Compare the performance of two benchmarking runs"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import json
+
+import numpy as np
+
+from kiosk_client.analysis import Results
+
+
+# the compared metrics, and whether higher values are better
+METRICS = (
+    ('throughput', True),
+    ('total_time_p50', False),
+    ('total_time_p90', False),
+    ('total_time_p99', False),
+    ('cost_per_image', False),
+)
+
+
+def bootstrap_mean(values, size, random_state):
+    """Sample the bootstrap distribution of the mean of the values."""
+    values = np.asarray(values, dtype=float)
+    indices = random_state.randint(0, values.size, (size, values.size))
+    return values[indices].mean(axis=1)
+
+
+def bootstrap_percentile(values, q, size, random_state):
+    """Sample the bootstrap distribution of a percentile of the values.
+
+    The percentile of a resample is one of its order statistics, so it is
+    drawn from the beta distribution of that order statistic instead of
+    resampling all of the values ``size`` times.
+    """
+    values = np.sort(values)
+    n = values.size
+    k = int(round(q / 100 * (n - 1))) + 1  # the rank of the percentile
+    quantiles = random_state.beta(k, n - k + 1, size)
+    return values[np.minimum((quantiles * n).astype(np.int64), n - 1)]
+
+
+def bootstrap_sum(values, size, random_state):
+    """Sample the bootstrap distribution of the sum of the values.
+
+    The sum of a resample is drawn from its normal approximation instead of
+    resampling all of the values ``size`` times.
+    """
+    values = np.asarray(values, dtype=float)
+    return random_state.normal(values.sum(), values.std() * values.size ** 0.5,
+                               size)
+
+
+def get_estimate(results, metric, size, random_state):
+    """Get the value of a metric of a run and its bootstrap samples.
+
+    Throughput is the number of jobs done per second of the run, as in
+    ``Results.report``. It is resampled by minute, scaled by the resampled
+    mean of the jobs finished in each full minute of the run: the last,
+    partial minute is dropped. Latency percentiles are resampled by job.
+    The cost is measured once per run, so the cost per image is resampled
+    by the number of images of the jobs done.
+
+    Returns:
+        tuple: the value of the metric, or ``None`` if it is unknown, and
+            an array of bootstrap samples or ``None``.
+    """
+    if metric == 'throughput':
+        time_elapsed = results.get_time_elapsed()
+        if not time_elapsed:
+            return None, None
+        throughput = results.done.sum() / time_elapsed
+        counts = np.array(results.get_completions_per_minute()[:-1])
+        if not counts.size or not counts.mean():
+            return throughput, None
+        return throughput, (throughput / counts.mean() *
+                            bootstrap_mean(counts, size, random_state))
+
+    if metric == 'cost_per_image':
+        cost = results.get_cost()
+        images = np.where(results.done, results.images, 0)
+        if cost is None or not images.sum():
+            return None, None
+        samples = bootstrap_sum(images, size, random_state)
+        return cost / images.sum(), cost / np.maximum(samples, 1)
+
+    field, q = metric.rsplit('_p', 1)
+    values = results.timings[field][results.done]
+    values = values[~np.isnan(values)]
+    if not values.size:
+        return None, None
+    q = float(q)
+    return (np.percentile(values, q),
+            bootstrap_percentile(values, q, size, random_state))
+
+
+def compare(baseline, candidate, threshold=0.1, confidence=0.95,
+            size=1000, random_state=None):
+    """Compare the metrics of a candidate run to a baseline run.
+
+    A metric regressed if it got worse by more than ``threshold`` and the
+    confidence interval of its change does not include zero.
+
+    Args:
+        baseline (Results): the results of the baseline run.
+        candidate (Results): the results of the candidate run.
+        threshold (float): the largest relative change for the worse that
+            is not a regression.
+        confidence (float): the confidence level of the intervals.
+        size (int): the number of bootstrap samples of each metric.
+        random_state (numpy.random.RandomState): the random resampling.
+
+    Returns:
+        list: a dict for each metric, with the ``baseline`` and
+            ``candidate`` values, the relative ``change``, its confidence
+            interval ``ci`` and whether it is a ``regression``.
+    """
+    if random_state is None:
+        random_state = np.random.RandomState()
+
+    alpha = (1 - confidence) / 2 * 100
+    rows = []
+    for metric, higher_is_better in METRICS:
+        base, base_samples = get_estimate(
+            baseline, metric, size, random_state)
+        cand, cand_samples = get_estimate(
+            candidate, metric, size, random_state)
+
+        row = {
+            'metric': metric,
+            'baseline': None if base is None else float(base),
+            'candidate': None if cand is None else float(cand),
+            'change': None,
+            'ci': None,
+            'regression': False,
+        }
+        rows.append(row)
+        if not base or cand is None:
+            continue
+
+        row['change'] = float(cand / base - 1)
+        if base_samples is not None and cand_samples is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                changes = cand_samples / base_samples - 1
+            changes = changes[np.isfinite(changes)]
+            if changes.size:
+                row['ci'] = np.percentile(
+                    changes, [alpha, 100 - alpha]).tolist()
+
+        sign = -1 if higher_is_better else 1  # positive changes are worse
+        worse = sign * row['change'] > threshold
+        if row['ci'] is not None:
+            worse = worse and min(sign * c for c in row['ci']) > 0
+        row['regression'] = worse
+    return rows
+
+
+def format_comparison(rows, confidence=0.95):
+    """Format the comparison of ``compare`` as a readable table."""
+    lines = ['{:<16}{:>12}{:>12}{:>10}  {}'.format(
+        'metric', 'baseline', 'candidate', 'change',
+        '{:g}% CI'.format(confidence * 100))]
+    for row in rows:
+        ci = ''
+        if row['ci'] is not None:
+            ci = '[{}, {}]'.format(*(_format_change(c) for c in row['ci']))
+        lines.append('{:<16}{:>12}{:>12}{:>10}  {:<20}{}'.format(
+            row['metric'], _format(row['baseline']),
+            _format(row['candidate']), _format_change(row['change']), ci,
+            'REGRESSION' if row['regression'] else '').rstrip())
+    return '\n'.join(lines)
+
+
+def _format(value):
+    return 'n/a' if value is None else '{:.4g}'.format(value)
+
+
+def _format_change(value):
+    return 'n/a' if value is None else '{:+.1%}'.format(value)
+
+
+def get_arg_parser(parser=None):
+    if parser is None:
+        parser = argparse.ArgumentParser(
+            prog='python -m kiosk_client compare',
+            description='Compare the throughput, latency and cost of a '
+                        'candidate run to a baseline run. Exits with status '
+                        '1 if any metric regressed.')
+
+    parser.add_argument('baseline',
+                        help='Output file of the baseline run.')
+
+    parser.add_argument('candidate',
+                        help='Output file of the candidate run.')
+
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Largest relative change for the worse that '
+                             'is not a regression.')
+
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help='Confidence level of the intervals.')
+
+    parser.add_argument('--samples', type=int, default=1000,
+                        help='Number of bootstrap samples of each metric.')
+
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the bootstrap resampling.')
+
+    parser.add_argument('--json', action='store_true',
+                        help='Print the comparison as JSON.')
+
+    return parser
+
+
+def main(argv=None):
+    args = get_arg_parser().parse_args(argv)
+
+    rows = compare(Results.load(args.baseline),
+                   Results.load(args.candidate),
+                   threshold=args.threshold,
+                   confidence=args.confidence,
+                   size=args.samples,
+                   random_state=np.random.RandomState(args.seed))
+
+    if args.json:
+        print(json.dumps(rows, indent=4))
+    else:
+        print(format_comparison(rows, args.confidence))
+
+    return int(any(row['regression'] for row in rows))
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
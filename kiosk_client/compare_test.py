@@ -0,0 +1,190 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Tests for the comparison of benchmarking runs"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from kiosk_client import analysis
+from kiosk_client import compare
+
+
+def _get_results(num_jobs=600, latency=10, rate=1, cost=6.0, seed=0):
+    random_state = np.random.RandomState(seed)
+    records = []
+    for i in range(num_jobs):
+        total_time = latency * random_state.lognormal(0, 0.25)
+        created_at = i / rate
+        records.append({
+            'status': 'done',
+            'created_at': '1970-01-01T00:00:00Z',
+            'finished_at': '1970-01-01T{:02d}:{:02d}:{:09.6f}Z'.format(
+                *_split(created_at + total_time)),
+            'total_time': total_time,
+            'total_jobs': 1,
+        })
+    return analysis.Results(
+        records, [{'total_node_and_networking_costs': cost}])
+
+
+def _split(seconds):
+    return int(seconds // 3600), int(seconds % 3600 // 60), seconds % 60
+
+
+class TestCompare(object):
+
+    def test_bootstrap_percentile(self):
+        random_state = np.random.RandomState(0)
+        values = random_state.exponential(size=500)
+
+        samples = compare.bootstrap_percentile(values, 90, 4000, random_state)
+        expected = np.percentile(values[random_state.randint(
+            0, values.size, (4000, values.size))], 90, axis=1)
+
+        assert samples.mean() == pytest.approx(expected.mean(), rel=0.02)
+        assert samples.std() == pytest.approx(expected.std(), rel=0.1)
+        assert set(samples).issubset(values)
+
+    def test_bootstrap_mean(self):
+        random_state = np.random.RandomState(0)
+        samples = compare.bootstrap_mean([1, 2, 3], 1000, random_state)
+        assert samples.shape == (1000,)
+        assert samples.min() >= 1 and samples.max() <= 3
+        assert samples.mean() == pytest.approx(2, rel=0.05)
+
+    def test_bootstrap_sum(self):
+        random_state = np.random.RandomState(0)
+        values = random_state.exponential(size=500)
+
+        samples = compare.bootstrap_sum(values, 4000, random_state)
+        expected = values[random_state.randint(
+            0, values.size, (4000, values.size))].sum(axis=1)
+
+        assert samples.mean() == pytest.approx(expected.mean(), rel=0.01)
+        assert samples.std() == pytest.approx(expected.std(), rel=0.1)
+
+    def test_get_estimate(self):
+        random_state = np.random.RandomState(0)
+        results = _get_results(rate=2)
+
+        # the throughput of the analysis report, with the partial last minute
+        # dropped from the bootstrap samples
+        throughput, samples = compare.get_estimate(
+            results, 'throughput', 1000, random_state)
+        assert throughput == pytest.approx(results.report()['throughput'])
+        assert samples.mean() == pytest.approx(throughput, rel=0.01)
+
+        cost, samples = compare.get_estimate(
+            results, 'cost_per_image', 1000, random_state)
+        assert cost == pytest.approx(results.report()['cost_per_image'])
+        assert samples.mean() == pytest.approx(cost)
+
+        # too short to resample by minute
+        throughput, samples = compare.get_estimate(
+            _get_results(num_jobs=10), 'throughput', 1000, random_state)
+        assert throughput > 0
+        assert samples is None
+
+    def test_compare(self):
+        baseline = _get_results()
+
+        # the same run does not regress
+        rows = compare.compare(baseline, _get_results(seed=1),
+                               random_state=np.random.RandomState(0))
+        assert [r['metric'] for r in rows] == [m for m, _ in compare.METRICS]
+        for row in rows:
+            assert not row['regression']
+            assert abs(row['change']) < 0.1
+            assert row['ci'][0] <= row['change'] <= row['ci'][1]
+
+        # slower jobs at a lower rate that cost more
+        candidate = _get_results(latency=15, rate=0.5, cost=9.0, seed=1)
+        rows = compare.compare(baseline, candidate,
+                               random_state=np.random.RandomState(0))
+        rows = {r['metric']: r for r in rows}
+        assert rows['throughput']['change'] == pytest.approx(-0.5, abs=0.05)
+        assert rows['throughput']['ci'][1] < 0
+        assert rows['total_time_p50']['change'] == pytest.approx(
+            0.5, abs=0.1)
+        assert rows['cost_per_image']['change'] == pytest.approx(0.5)
+        assert all(r['regression'] for r in rows.values())
+
+        # the changes do not exceed a larger threshold
+        rows = compare.compare(baseline, candidate, threshold=1,
+                               random_state=np.random.RandomState(0))
+        assert not any(r['regression'] for r in rows)
+
+        # improvements are never regressions
+        rows = compare.compare(candidate, baseline,
+                               random_state=np.random.RandomState(0))
+        assert not any(r['regression'] for r in rows)
+
+    def test_compare_unknown(self):
+        rows = compare.compare(analysis.Results([]), _get_results(),
+                               random_state=np.random.RandomState(0))
+        for row in rows:
+            assert row['baseline'] is None
+            assert row['change'] is None
+            assert not row['regression']
+
+        # a run too short to resample its throughput has no interval
+        rows = compare.compare(_get_results(num_jobs=10),
+                               _get_results(num_jobs=10, rate=0.5),
+                               random_state=np.random.RandomState(0))
+        rows = {r['metric']: r for r in rows}
+        assert rows['throughput']['change'] < 0
+        assert rows['throughput']['ci'] is None
+
+    def test_main(self, tmpdir, capsys):
+        paths = []
+        for name, latency in (('baseline', 10), ('candidate', 20)):
+            path = os.path.join(str(tmpdir), '{}.json'.format(name))
+            with open(path, 'w') as f:
+                results = _get_results(num_jobs=100, latency=latency)
+                json.dump({'job_data': [
+                    {'status': 'done', 'total_time': t}
+                    for t in results.timings['total_time']]}, f)
+            paths.append(path)
+
+        assert compare.main(paths) == 1
+        output = capsys.readouterr().out
+        assert 'total_time_p50' in output
+        assert 'REGRESSION' in output
+
+        assert compare.main(paths + ['--threshold', '2']) == 0
+        capsys.readouterr()
+
+        assert compare.main(paths[:1] * 2 + ['--json']) == 0
+        rows = json.loads(capsys.readouterr().out)
+        assert rows[1]['metric'] == 'total_time_p50'
+        assert rows[1]['change'] == 0
+        assert rows[0]['baseline'] is None  # no finish times
@@ -34,15 +34,93 @@ import timeit
 
 import dateutil.parser
 import treq
-from twisted.internet import defer
+from twisted.internet import defer, threads
 from twisted.internet import error as twisted_errors
 from twisted.web import _newclient as twisted_client
+from twisted.web.client import URI
 
+from kiosk_client.redis_backend import is_retryable as is_redis_retryable
+from kiosk_client.store import JobTable, TableField
 from kiosk_client.utils import sleep, strip_bucket_prefix, get_download_path
 
 
 class Job(object):
 
+    # Store job attributes in slots and summary data in a shared JobTable to
+    # minimize the memory used by each of many jobs. A __dict__ is only
+    # created if other attributes are set (e.g. monkey-patching).
+    __slots__ = (
+        'host',
+        'filepath',
+        'model_name',
+        'model_version',
+        'job_type',
+        'data_scale',
+        'data_label',
+        'upload_prefix',
+        'expire_time',
+        'update_interval',
+        'download_results',
+        'multi_get',
+        'output_dir',
+        'pool',
+        'poller',
+        'polling_policy',
+        'upload_cache',
+        'metrics',
+        'redis',
+        '_table',
+        '_row',
+        '__dict__',
+    )
+
+    # summary data
+    original_name = TableField('original_name')
+    preprocess = TableField('preprocess')
+    postprocess = TableField('postprocess')
+    status = TableField('status')
+    job_id = TableField('job_id')
+    created_at = TableField('created_at')
+    finished_at = TableField('finished_at')
+    postprocess_time = TableField('postprocess_time')
+    prediction_time = TableField('prediction_time')
+    download_time = TableField('download_time')
+    upload_time = TableField('upload_time')
+    output_url = TableField('output_url')
+    total_jobs = TableField('total_jobs')
+    total_time = TableField('total_time')
+    reason = TableField('reason')
+    children_upload_time = TableField('children_upload_time')
+    cleanup_time = TableField('cleanup_time')
+    predict_retries = TableField('predict_retries')
+    client_upload_time = TableField('client_upload_time')
+    upload_size = TableField('upload_size')
+    packed_files = TableField('packed_files')  # original files in a zip
+
+    failed = TableField('failed')  # for error handling
+    is_expired = TableField('is_expired')
+
+    # shared by all jobs
+    logger = logging.getLogger('Job')
+
+    headers = {
+        'Content-Type': ['application/json'],
+        'Connection': 'close',
+    }
+
+    sleep = staticmethod(sleep)  # allow monkey-patch
+
+    _finished_statuses = frozenset({'done', 'failed'})
+
+    _http_errors = (
+        twisted_client.ResponseNeverReceived,
+        twisted_client.RequestTransmissionFailed,
+        twisted_errors.ConnectBindError,
+        twisted_errors.TimeoutError,
+        twisted_errors.ConnectError,
+        twisted_errors.ConnectionRefusedError,
+    )
+
     def __init__(self, host, filepath, model_name, model_version, **kwargs):
         """Creates and tracks a DeepCell Kiosk job, recording various summary data.
 
@@ -53,7 +131,9 @@ class Job(object):
             model_version (int): Version of servable model.
             kwargs (dict): Optional keyword arguments.
         """
-        self.logger = logging.getLogger(str(self.__class__.__name__))
+        # summary data is stored in a row of the table.
+        table = kwargs.get('table')
+        self._table = JobTable() if table is None else table
 
         self.host = str(host)
         self.filepath = str(filepath)
@@ -81,14 +161,13 @@ class Job(object):
             raise ValueError('`model_version` must be a number, got ' +
                              self.model_version)
 
-        self.preprocess = kwargs.get('preprocess', '')
-        self.postprocess = kwargs.get('postprocess', '')
         self.upload_prefix = kwargs.get('upload_prefix', 'uploads')
         self.upload_prefix = strip_bucket_prefix(self.upload_prefix)
         self.expire_time = int(kwargs.get('expire_time', 3600))
         self.update_interval = int(kwargs.get('update_interval', 10))
-        self.original_name = kwargs.get('original_name', self.filepath)
         self.download_results = kwargs.get('download_results', False)
+        # fetch many fields in a single request if the API supports it
+        self.multi_get = kwargs.get('multi_get', False)
 
         self.output_dir = kwargs.get('output_dir', get_download_path())
         if not os.path.isdir(self.output_dir):
@@ -98,44 +177,21 @@ class Job(object):
             raise ValueError('Invalid value for output_dir,'
                              ' %s is not writable.' % self.output_dir)
 
-        self.failed = False  # for error handling
-        self.is_expired = False
-
-        self.headers = {
-            'Content-Type': ['application/json'],
-            'Connection': 'close',
-        }
-
-        # summary data
-        self.status = None
-        self.job_id = None
-        self.created_at = None
-        self.finished_at = None
-        self.postprocess_time = None
-        self.prediction_time = None
-        self.download_time = None
-        self.upload_time = None
-        self.output_url = None
-        self.total_jobs = None
-        self.total_time = None
-        self.reason = None
-        self.children_upload_time = None
-        self.cleanup_time = None
-        self.predict_retries = None
-        self._finished_statuses = {'done', 'failed'}
-
         self.pool = kwargs.get('pool')
-
-        self.sleep = sleep  # allow monkey-patch
-
-        self._http_errors = (
-            twisted_client.ResponseNeverReceived,
-            twisted_client.RequestTransmissionFailed,
-            twisted_errors.ConnectBindError,
-            twisted_errors.TimeoutError,
-            twisted_errors.ConnectError,
-            twisted_errors.ConnectionRefusedError,
-        )
+        self.poller = kwargs.get('poller')  # monitor using a StatusPoller
+        # decides the interval between status requests if there is no poller
+        self.polling_policy = kwargs.get('polling_policy')
+        # reuse previous uploads of the same file contents
+        self.upload_cache = kwargs.get('upload_cache')
+        self.metrics = kwargs.get('metrics')  # record ClientMetrics
+        # read and expire the job's hash directly with a RedisBackend
+        self.redis = kwargs.get('redis')
+
+        self._row = self._table.append(
+            original_name=kwargs.get('original_name', self.filepath),
+            model='{}:{}'.format(self.model_name, self.model_version),
+            preprocess=kwargs.get('preprocess', ''),
+            postprocess=kwargs.get('postprocess', ''))
 
     @property
     def is_done(self):
@@ -143,43 +199,14 @@ class Job(object):
 
     @property
     def is_summarized(self):
-        if self.status == 'failed':
-            return True
-        summaries = (self.created_at, self.finished_at, self.output_url)
-        is_summarized = all(x is not None for x in summaries)
-        return is_summarized and self.is_done
+        return self._table.is_summarized(self._row)
 
     def json(self):
+        return self._table.record(self._row)
 
-        def _float(x):
-            if isinstance(x, list):
-                return [_float(y) for y in x]
-            try:
-                return float(x)
-            except:  # pylint: disable=bare-except
-                return x
-
-        return {
-            'input_file': self.original_name,
-            'status': self.status,
-            'total_time': _float(self.total_time),
-            'total_jobs': _float(self.total_jobs),
-            'download_url': self.output_url,
-            'created_at': self.created_at,
-            'finished_at': self.finished_at,
-            'prediction_time': _float(self.prediction_time),
-            'postprocess_time': _float(self.postprocess_time),
-            'upload_time': _float(self.upload_time),
-            'download_time': _float(self.download_time),
-            'predict_retries': _float(self.predict_retries),
-            'cleanup_time': _float(self.cleanup_time),
-            'children_upload_time': _float(self.children_upload_time),
-            'model': '{}:{}'.format(self.model_name, self.model_version),
-            'postprocess': self.postprocess,
-            'preprocess': self.preprocess,
-            'reason': self.reason,
-            'job_id': self.job_id,
-        }
+    def load_json(self, record):
+        """Restore the summary data of the job from its ``json()``."""
+        self._table.load_record(self._row, record)
 
     def _log_http_response(self, response, created_at):
         log = self.logger.debug if response.code == 200 else self.logger.warning
@@ -203,8 +230,18 @@ class Job(object):
 
         return treq.post(host, **req_kwargs)
 
+    def _get_endpoint(self, url):
+        """Get the path of a URL of the API, without parsing it if possible."""
+        if url.startswith(self.host):  # URLs of the API are built from host
+            return url[len(self.host):] or '/'
+        return URI.fromBytes(url.encode()).path.decode()
+
     @defer.inlineCallbacks
     def _retry_post_request_wrapper(self, host, name='REDIS', **kwargs):
+        endpoint = None
+        if self.metrics is not None:
+            endpoint = self._get_endpoint(host)
+
         retrying = True  # retry loop to prevent stackoverflow
         while retrying:
             created_at = timeit.default_timer()
@@ -214,9 +251,15 @@ class Job(object):
             except self._http_errors as err:
                 self.logger.warning('[%s]: Encountered %s during %s: %s',
                                     self.job_id, type(err).__name__, name, err)
+                if endpoint is not None:
+                    self.metrics.request_retries.inc(endpoint=endpoint)
                 yield self.sleep(self.update_interval)
                 continue  # return to top of retry loop
 
+            if endpoint is not None:
+                self.metrics.request_latency.observe(
+                    timeit.default_timer() - created_at, endpoint=endpoint)
+
             try:
                 self._log_http_response(response, created_at)
                 json_content = yield response.json()  # parse the JSON data
@@ -224,6 +267,8 @@ class Job(object):
                 self.logger.error('[%s]: Failed to parse %s response as JSON '
                                   'due to %s: %s', self.job_id, name,
                                   type(err).__name__, err)
+                if endpoint is not None:
+                    self.metrics.request_retries.inc(endpoint=endpoint)
                 yield self.sleep(self.update_interval)
                 continue  # return to top of retry loop
 
@@ -231,19 +276,84 @@ class Job(object):
 
         defer.returnValue(json_content)  # "return" the value
 
+    @defer.inlineCallbacks
+    def _retry_redis_request(self, name, command, *args):
+        retrying = True  # retry loop to prevent stackoverflow
+        while retrying:
+            created_at = timeit.default_timer()
+            try:
+                value = yield command(*args)
+            except Exception as err:  # pylint: disable=broad-except
+                if not is_redis_retryable(err):
+                    raise
+                self.logger.warning('[%s]: Encountered %s during %s: %s',
+                                    self.job_id, type(err).__name__, name, err)
+                if self.metrics is not None:
+                    self.metrics.request_retries.inc(endpoint='redis')
+                yield self.sleep(self.update_interval)
+                continue  # return to top of retry loop
+
+            if self.metrics is not None:
+                self.metrics.request_latency.observe(
+                    timeit.default_timer() - created_at, endpoint='redis')
+            retrying = False  # success
+
+        defer.returnValue(value)  # "return" the value
+
     @defer.inlineCallbacks
     def upload_file(self):
         host = '{}/api/upload'.format(self.host)
         name = 'UPLOAD {}'.format(self.filepath)
+
+        digest = None
+        if self.upload_cache is not None:
+            digest, uploaded_path = yield threads.deferToThread(
+                self.upload_cache.lookup, self.filepath, host)
+            if uploaded_path is not None:
+                self.logger.debug('Reusing upload %s of file %s.',
+                                  uploaded_path, self.filepath)
+                self.upload_size = 0  # nothing was uploaded
+                self.client_upload_time = 0
+                defer.returnValue(uploaded_path)
+
+        start = timeit.default_timer()
         with open(self.filepath, 'rb') as f:
+            upload_size = os.fstat(f.fileno()).st_size  # treq closes the file
             payload = {'file': (self.filepath, f)}
             response = yield self._retry_post_request_wrapper(
                 host, name, files=payload, headers=self.headers)
+        self.upload_size = upload_size
+        self.client_upload_time = timeit.default_timer() - start
+        if self.metrics is not None:
+            self.metrics.uploaded_bytes.inc(self.upload_size)
         uploaded_path = response.get('uploadedName')
+
+        if digest is not None and uploaded_path:
+            self.upload_cache.put(digest, host, uploaded_path)
         defer.returnValue(uploaded_path)  # "return" the value
 
+    @defer.inlineCallbacks
+    def upload(self):
+        """Upload the file and use the uploaded file for the job."""
+        uploaded_path = yield self.upload_file()
+
+        try:
+            self.filepath = os.path.relpath(uploaded_path, self.upload_prefix)
+        except ValueError:
+            # relpath on Windows can cause ValuError
+            # if the paths are not on the same drive.
+            # ValueError: path is on mount 'C:', start on mount 'D:'
+            self.filepath = uploaded_path
+        defer.returnValue(self.filepath)
+
     @defer.inlineCallbacks
     def get_redis_value(self, field):
+        if self.redis is not None:
+            name = 'REDIS HGET {}'.format(field)
+            value = yield self._retry_redis_request(
+                name, self.redis.hget, self.job_id, field)
+            defer.returnValue(value)  # "return" the value
+
         host = '{}/api/redis'.format(self.host)
         payload = {'hash': self.job_id, 'key': field}
         name = 'REDIS HGET {}'.format(field)
@@ -252,6 +362,51 @@ class Job(object):
         value = response.get('value')
         defer.returnValue(value)  # "return" the value
 
+    @defer.inlineCallbacks
+    def get_redis_values(self, fields):
+        """Get the values of many fields of the job's hash.
+
+        If ``multi_get`` is enabled, all fields are requested at once.
+        Otherwise, or if the response is not valid, each field is requested
+        concurrently. With a ``redis`` backend, all fields are read with a
+        single ``HMGET`` command.
+
+        Args:
+            fields (list): The fields of the job's hash to get.
+
+        Returns:
+            dict: The value of each field.
+        """
+        fields = list(fields)
+        if self.redis is not None:
+            name = 'REDIS HMGET {}'.format(','.join(fields))
+            values = yield self._retry_redis_request(
+                name, self.redis.hmget, self.job_id, fields)
+            defer.returnValue(dict(zip(fields, values)))
+
+        if self.multi_get:
+            host = '{}/api/redis'.format(self.host)
+            payload = {'hash': self.job_id, 'keys': fields}
+            name = 'REDIS HMGET {}'.format(','.join(fields))
+            response = yield self._retry_post_request_wrapper(host, name,
+                                                              json=payload)
+            values = response.get('value')
+            if isinstance(values, dict):
+                values = [values.get(f) for f in fields]
+            if isinstance(values, list) and len(values) == len(fields):
+                defer.returnValue(dict(zip(fields, values)))
+
+            self.logger.warning('[%s]: Invalid HMGET response, requesting '
+                                'each field instead: %s', self.job_id,
+                                response)
+            self.multi_get = False  # do not try again
+
+        requests = [defer.maybeDeferred(self.get_redis_value, f)
+                    for f in fields]
+        results = yield defer.DeferredList(requests, fireOnOneErrback=True,
+                                           consumeErrors=True)
+        defer.returnValue({f: v for f, (_, v) in zip(fields, results)})
+
     @defer.inlineCallbacks
     def create(self):
         # Build a deferred request to the create API
@@ -281,18 +436,31 @@ class Job(object):
 
         defer.returnValue(job_id)  # "return" the value
 
+    def update_status(self, status):
+        if self.status != status:
+            self.status = status
+            self.logger.info('[%s]: Found new %sstatus `%s`.', self.job_id,
+                             'final ' if self.is_done else '', self.status)
+
     @defer.inlineCallbacks
     def monitor(self):
+        if self.poller is not None:
+            # the poller updates the status until the job is done
+            yield self.poller.register(self)
+
+        started_at = timeit.default_timer()
         while not self.is_done:
 
-            yield self.sleep(self.update_interval)  # prevent 429s
+            interval = self.update_interval
+            if self.polling_policy is not None:
+                interval = self.polling_policy.next_interval(
+                    self, timeit.default_timer() - started_at)
+
+            yield self.sleep(interval)  # prevent 429s
 
             status = yield self.get_redis_value('status')
 
-            if self.status != status:
-                self.status = status
-                self.logger.info('[%s]: Found new %sstatus `%s`.', self.job_id,
-                                 'final ' if self.is_done else '', self.status)
+            self.update_status(status)
 
         defer.returnValue(self.is_done)  # "return" the value
 
@@ -315,15 +483,15 @@ class Job(object):
             'total_jobs',
             'total_time',
         )
+        values = yield self.get_redis_values(summary_attributes + attributes)
+
         # get the string values
         for name in summary_attributes:
-            value = yield self.get_redis_value(name)
-            setattr(self, name, value)  # save the valid value to self
+            setattr(self, name, values[name])  # save the valid value to self
 
         # get the numerical values and parse into list if required
         for name in attributes:
-            value = yield self.get_redis_value(name)
-            value = str(value).split(',')
+            value = str(values[name]).split(',')
             if len(value) == 1:
                 value = value[0]
             setattr(self, name, value)  # save the valid value to self
@@ -332,6 +500,12 @@ class Job(object):
 
     @defer.inlineCallbacks
     def expire(self):
+        if self.redis is not None:
+            value = yield self._retry_redis_request(
+                'REDIS EXPIRE', self.redis.expire, self.job_id,
+                self.expire_time)
+            defer.returnValue(value)  # "return" the value
+
         host = '{}/api/redis/expire'.format(self.host)
         payload = {'hash': self.job_id, 'expireIn': self.expire_time}
         name = 'REDIS EXPIRE'
@@ -356,12 +530,16 @@ class Job(object):
             except self._http_errors as err:
                 self.logger.warning('[%s]: Encountered %s during %s: %s',
                                     self.job_id, type(err).__name__, name, err)
+                if self.metrics is not None:
+                    self.metrics.request_retries.inc(endpoint='download')
                 yield self.sleep(self.update_interval)
                 continue  # return to top of retry loop
             retrying = False  # success
 
         with open(dest, 'wb') as outfile:
             yield response.collect(outfile.write)
+            if self.metrics is not None:
+                self.metrics.downloaded_bytes.inc(outfile.tell())
 
         self.logger.info('Saved output file: "%s" in %s s.',
                          dest, timeit.default_timer() - start)
@@ -398,19 +576,29 @@ class Job(object):
             yield self.sleep(delay)
 
         if upload:
-            uploaded_path = yield self.upload_file()
+            yield self.upload()
 
-            try:
-                self.filepath = os.path.relpath(
-                    uploaded_path, self.upload_prefix)
-            except ValueError:
-                # relpath on Windows can cause ValuError
-                # if the paths are not on the same drive.
-                # ValueError: path is on mount 'C:', start on mount 'D:'
-                self.filepath = uploaded_path
+        result = yield self._process(create=True)
+        defer.returnValue(result)
 
+    @defer.inlineCallbacks
+    def resume(self, delay=0):
+        """Monitor, summarize and expire a job that was already created.
+
+        Args:
+            delay (float): seconds to wait before resuming the job.
+        """
+        if delay:
+            yield self.sleep(delay)
+
+        result = yield self._process(create=False)
+        defer.returnValue(result)
+
+    @defer.inlineCallbacks
+    def _process(self, create=True):
         try:
-            self.job_id = yield self.create()
+            if create:
+                self.job_id = yield self.create()
             assert self.job_id is not None, 'Create did not return a job ID'
 
             success = yield self.monitor()
@@ -431,13 +619,17 @@ class Job(object):
                                  self.job_id, diff.total_seconds(),
                                  self.status, self.output_url)
 
+                if self.poller is not None:
+                    self.poller.record_total_time(self.total_time)
+                elif self.polling_policy is not None:
+                    self.polling_policy.record(self.total_time)
+
                 if self.download_results:
                     success = yield self.download_output()
 
             elif self.status == 'failed':
-                reason = yield self.get_redis_value('reason')
                 self.logger.warning('[%s]: Found final status `%s`: %s',
-                                    self.job_id, self.status, reason)
+                                    self.job_id, self.status, self.reason)
 
             else:
                 raise ValueError('Job %s was about to expire with status %s' %
@@ -37,8 +37,12 @@ import pytest
 import pytest_twisted
 
 from twisted.internet import defer
+from twisted.internet import error as twisted_errors
 
+from kiosk_client import cache
 from kiosk_client import job
+from kiosk_client import metrics
+from kiosk_client import redis_backend
 
 global FAILED
 FAILED = False  # global toggle for failed responses
@@ -73,14 +77,15 @@ class DummyResponse(object):
             raise AttributeError('on purpose')
 
 
-def _get_default_job(filepath='filepath.png'):
+def _get_default_job(filepath='filepath.png', **kwargs):
     return job.Job(
         filepath=filepath,
         host='localhost',
         model_name='model_name',
         model_version='0',
         download_results=True,
-        update_interval=0.0001)
+        update_interval=0.0001,
+        **kwargs)
 
 
 class TestJob(object):
@@ -174,11 +179,38 @@ class TestJob(object):
         filepath = 'test.png'
         p = tmpdir.join(filepath)
         p.write('content')
-        j = _get_default_job(filepath=str(p))
+        client_metrics = metrics.ClientMetrics()
+        j = _get_default_job(filepath=str(p), metrics=client_metrics)
 
         j._retry_post_request_wrapper = dummy_request_success
         uploaded_path = yield j.upload_file()
         assert uploaded_path == 'uploads/blah.png'
+        assert j.upload_size == len('content')
+        assert client_metrics.uploaded_bytes.get() == len('content')
+        assert j.client_upload_time >= 0
+        assert j.json()['upload_size'] == len('content')
+
+        # upload sets the filepath relative to the upload prefix
+        filepath = yield j.upload()
+        assert filepath == j.filepath == 'blah.png'
+
+        # identical files are only uploaded once
+        posts = []
+
+        def dummy_request_count(*_, **__):
+            posts.append(True)
+            return dummy_request_success()
+
+        uploads = cache.UploadCache()
+        for filepath in ('a.png', 'b.png'):
+            p = tmpdir.join(filepath)
+            p.write('same content')
+            j = _get_default_job(filepath=str(p), upload_cache=uploads)
+            j._retry_post_request_wrapper = dummy_request_count
+            uploaded_path = yield j.upload_file()
+            assert uploaded_path == 'uploads/blah.png'
+        assert len(posts) == 1
+        assert j.upload_size == j.client_upload_time == 0  # reused
 
         filepath = 'test2.png'
         p = tmpdir.join(filepath)
@@ -189,6 +221,27 @@ class TestJob(object):
         job_id = yield j.upload_file()
         assert job_id is None
 
+    @pytest_twisted.inlineCallbacks
+    def test_upload_file_closed(self, tmpdir):
+
+        class UploadResponse(DummyResponse):
+            def json(self):
+                return defer.succeed({'uploadedName': 'uploads/test.png'})
+
+        def dummy_post(_, **kwargs):
+            for _, f in kwargs['files'].values():
+                f.close()  # treq closes the file once it is sent
+            return defer.succeed(UploadResponse())
+
+        p = tmpdir.join('test.png')
+        p.write('content')
+        j = _get_default_job(filepath=str(p))
+        j._make_post_request = dummy_post
+
+        uploaded_path = yield j.upload_file()
+        assert uploaded_path == 'uploads/test.png'
+        assert j.upload_size == len('content')
+
     @pytest_twisted.inlineCallbacks
     def test_download_output(self, tmpdir, mocker):
 
@@ -210,7 +263,8 @@ class TestJob(object):
 
         mocker.patch('kiosk_client.job.get_download_path',
                      lambda: str(tmpdir))
-        j = _get_default_job()
+        client_metrics = metrics.ClientMetrics()
+        j = _get_default_job(metrics=client_metrics)
         j.output_url = 'fakeURL.com/testfile.txt'
         mocker.patch('treq.get', send_get_request)
 
@@ -219,6 +273,8 @@ class TestJob(object):
         assert str(result).startswith(str(tmpdir))
         with open(result, 'r') as f:
             assert f.read() == 'success'
+        assert client_metrics.downloaded_bytes.get() == len('success')
+        assert client_metrics.request_retries.get(endpoint='download') == 1
 
     @pytest_twisted.inlineCallbacks
     def test_summarize(self):
@@ -252,6 +308,34 @@ class TestJob(object):
         assert results
         assert results == j.is_done
 
+        # test monitoring with a PollingPolicy
+        class DummyPolicy(object):
+            intervals = []
+
+            def next_interval(self, job, elapsed):
+                self.intervals.append(elapsed)
+                return 0
+
+        _monitor_counter = 0
+        j = _get_default_job(polling_policy=DummyPolicy())
+        j.get_redis_value = get_redis_value
+        results = yield j.monitor()
+        assert results
+        assert len(j.polling_policy.intervals) == 4
+
+        # test monitoring with a StatusPoller
+        class DummyPoller(object):
+            def register(self, job):
+                job.update_status('done')
+                return defer.succeed(job.is_done)
+
+        j = _get_default_job()
+        j.poller = DummyPoller()
+        j.get_redis_value = None  # should not be called
+        results = yield j.monitor()
+        assert results
+        assert j.status == 'done'
+
     @pytest_twisted.inlineCallbacks
     def test_restart(self):
 
@@ -323,6 +407,41 @@ class TestJob(object):
         job_id = yield j.get_redis_value('status')
         assert job_id is None
 
+    @pytest_twisted.inlineCallbacks
+    def test_get_redis_values(self):
+        fields = ['status', 'reason']
+
+        @pytest_twisted.inlineCallbacks
+        def dummy_request_list(*_, **kwargs):
+            assert kwargs['json']['keys'] == fields
+            yield defer.returnValue({'value': ['done', 'none']})
+
+        @pytest_twisted.inlineCallbacks
+        def dummy_request_dict(*_, **__):
+            yield defer.returnValue({'value': {'status': 'done'}})
+
+        @pytest_twisted.inlineCallbacks
+        def dummy_request_fail(*_, **__):
+            yield defer.returnValue({'value': None})
+
+        # test multi_get
+        j = _get_default_job()
+        j.multi_get = True
+        j._retry_post_request_wrapper = dummy_request_list
+        values = yield j.get_redis_values(fields)
+        assert values == {'status': 'done', 'reason': 'none'}
+
+        j._retry_post_request_wrapper = dummy_request_dict
+        values = yield j.get_redis_values(fields)
+        assert values == {'status': 'done', 'reason': None}
+
+        # test fallback to concurrent requests
+        j._retry_post_request_wrapper = dummy_request_fail
+        j.get_redis_value = lambda x: x
+        values = yield j.get_redis_values(fields)
+        assert values == {f: f for f in fields}
+        assert not j.multi_get
+
     @pytest_twisted.inlineCallbacks
     def test_expire(self):
 
@@ -344,6 +463,61 @@ class TestJob(object):
         job_id = yield j.expire()
         assert job_id is None
 
+    @pytest_twisted.inlineCallbacks
+    def test_redis_backend(self):
+
+        class DummyRedis(object):
+            failures = 1  # connection errors before each success
+            error = twisted_errors.ConnectionLost()
+
+            def _reply(self, value):
+                if self.failures:
+                    self.failures -= 1
+                    return defer.fail(self.error)
+                return defer.succeed(value)
+
+            def hget(self, key, field):
+                return self._reply('{}:{}'.format(key, field))
+
+            def hmget(self, key, fields):
+                return self._reply(['{}:{}'.format(key, f) for f in fields])
+
+            def expire(self, key, seconds):
+                return self._reply(seconds)
+
+        client_metrics = metrics.ClientMetrics()
+        j = _get_default_job(redis=DummyRedis(), metrics=client_metrics,
+                             expire_time=10)
+        j.job_id = 'job'
+        j._retry_post_request_wrapper = None  # should not be called
+
+        value = yield j.get_redis_value('status')
+        assert value == 'job:status'
+
+        j.redis.failures = 1
+        values = yield j.get_redis_values(['status', 'reason'])
+        assert values == {'status': 'job:status', 'reason': 'job:reason'}
+
+        value = yield j.expire()
+        assert value == 10
+
+        # connection errors are retried
+        assert client_metrics.request_retries.get(endpoint='redis') == 2
+        assert client_metrics.request_latency.get(endpoint='redis') == 3
+
+        # so are replies of a server that is not ready yet
+        j.redis.failures = 1
+        j.redis.error = redis_backend.RedisError('LOADING Redis is loading')
+        value = yield j.get_redis_value('status')
+        assert value == 'job:status'
+        assert client_metrics.request_retries.get(endpoint='redis') == 3
+
+        # but other errors are not
+        j.redis.failures = 1
+        j.redis.error = redis_backend.RedisError('ERR unknown command')
+        with pytest.raises(redis_backend.RedisError):
+            yield j.get_redis_value('status')
+
     @pytest_twisted.inlineCallbacks
     def test_start(self):
 
@@ -399,6 +573,46 @@ class TestJob(object):
         value = yield j.start(delay, upload)
         assert value is False  # failed
 
+    @pytest_twisted.inlineCallbacks
+    def test_resume(self):
+
+        @pytest_twisted.inlineCallbacks
+        def dummy_request_success(*_, **__):
+            yield defer.returnValue(True)
+
+        def fail(*_, **__):
+            raise AssertionError('should not be called')
+
+        j = _get_default_job()
+        j.create = fail
+        j.upload_file = fail
+        j.summarize = dummy_request_success
+        j.monitor = dummy_request_success
+        j.expire = dummy_request_success
+
+        # the job was never created
+        value = yield j.resume(0.000001)
+        assert value is False
+        assert j.failed
+
+        j.failed = False
+        j.job_id = 'existing_job'
+        j.status = 'failed'
+        value = yield j.resume(0.000001)
+        assert value
+        assert j.is_expired
+
+    def test_load_json(self):
+        j = _get_default_job()
+        j.status = 'done'
+        j.total_time = '1.5'
+        j.output_url = 'url'
+
+        j2 = _get_default_job()
+        j2.load_json(j.json())
+        assert j2.json() == j.json()
+        assert j2.total_time == 1.5
+
     @pytest_twisted.inlineCallbacks
     def test__retry_post_request_wrapper(self, mocker):
 
@@ -421,3 +635,19 @@ class TestJob(object):
         mocker.patch('treq.post', dummy_post_request)
         result = yield j._retry_post_request_wrapper('host', {})
         assert result.get('success')
+
+        # record the latency and retries of each endpoint
+        client_metrics = metrics.ClientMetrics()
+        j = _get_default_job(metrics=client_metrics)
+        _make_request_failed = False
+        result = yield j._retry_post_request_wrapper(
+            'http://localhost/api/redis', {})
+        assert result.get('success')
+        latency = client_metrics.request_latency
+        retries = client_metrics.request_retries
+        assert retries.get(endpoint='/api/redis') >= 1
+        assert latency.get(endpoint='/api/redis') >= 1
+
+        # URLs built from the host are not parsed
+        assert j._get_endpoint('localhost/api/predict') == '/api/predict'
+        assert j._get_endpoint('http://other/api/redis') == '/api/redis'
@@ -0,0 +1,112 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Durable journal of job lifecycle events, used to resume runs"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import logging
+import os
+import time
+
+
+class Journal(object):
+    """Append-only JSON Lines log of the lifecycle events of each job.
+
+    Each event is identified by the job's ``key`` and is flushed to disk as
+    soon as it is written, so the state of every job can be recovered with
+    ``Journal.load`` if the process dies.
+
+    Args:
+        path (str): path of the journal file.
+        append (bool): append to an existing journal instead of replacing it.
+    """
+
+    def __init__(self, path, append=False):
+        self.logger = logging.getLogger(str(self.__class__.__name__))
+        self.path = path
+        self._file = open(path, 'a' if append else 'w')
+
+    def write(self, event, key, **data):
+        """Write a single event.
+
+        Args:
+            event (str): name of the event, e.g. "created" or "expired".
+            key (object): identifies the job, must be JSON-serializable.
+            data (dict): other data of the event.
+        """
+        if self._file is None:
+            raise ValueError('Cannot write to a closed Journal.')
+        data.update(event=event, key=key, time=time.time())
+        self._file.write(json.dumps(data))
+        self._file.write('\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @classmethod
+    def load(cls, path):
+        """Get the latest state of each job in the journal.
+
+        Args:
+            path (str): path of the journal file.
+
+        Returns:
+            dict: the state of each job by key, with the fields "job_id",
+                "filepath", "status", "expired" and "record", if known.
+        """
+        states = {}
+        if not os.path.exists(path):
+            return states
+
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    break  # the last line may be incomplete
+
+                event = data.pop('event', None)
+                state = states.setdefault(data.pop('key', None), {})
+
+                if event == 'created':
+                    # a new job resets the previous state
+                    state.clear()
+                    state.update(job_id=data.get('job_id'),
+                                 filepath=data.get('filepath'),
+                                 expired=False)
+                elif event == 'status':
+                    state['status'] = data.get('status')
+                elif event == 'expired':
+                    state['expired'] = True
+                    state['record'] = data.get('record')
+
+        states.pop(None, None)
+        return states
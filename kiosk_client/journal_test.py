@@ -0,0 +1,92 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Tests for Journal class"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import pytest
+
+from kiosk_client import journal
+
+
+class TestJournal(object):
+
+    def test_write_load(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'journal.jsonl')
+        assert journal.Journal.load(path) == {}
+
+        j = journal.Journal(path)
+        j.write('created', 0, job_id='a', filepath='a.png')
+        j.write('status', 0, status='new')
+        j.write('created', 'b.png', job_id='b', filepath='b.png')
+        j.write('status', 0, status='done')
+        j.write('expired', 0, record={'job_id': 'a'})
+        j.write('status', 'b.png', status='predicting')
+
+        # events are flushed as they are written
+        states = journal.Journal.load(path)
+        j.close()
+
+        with pytest.raises(ValueError):
+            j.write('status', 0, status='new')
+
+        assert states == {
+            0: {
+                'job_id': 'a',
+                'filepath': 'a.png',
+                'status': 'done',
+                'expired': True,
+                'record': {'job_id': 'a'},
+            },
+            'b.png': {
+                'job_id': 'b',
+                'filepath': 'b.png',
+                'status': 'predicting',
+                'expired': False,
+            },
+        }
+
+        # a job created again replaces the previous state
+        j = journal.Journal(path, append=True)
+        j.write('created', 0, job_id='c', filepath='c.png')
+        j.close()
+
+        # incomplete lines are ignored
+        with open(path, 'a') as f:
+            f.write('{"event": "status", "key"')
+
+        states = journal.Journal.load(path)
+        assert states[0] == {'job_id': 'c', 'filepath': 'c.png',
+                             'expired': False}
+        assert states['b.png']['status'] == 'predicting'
+
+        # replace the journal
+        j = journal.Journal(path)
+        j.close()
+        assert journal.Journal.load(path) == {}
@@ -28,19 +28,39 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import itertools
 import json
 import logging
 import os
+import shutil
+import tempfile
+import threading
 import timeit
 import uuid
 
 import requests
-from google.cloud import storage as google_storage
-from twisted.internet import defer, reactor
+from twisted.internet import defer, reactor, task, threads
 from twisted.web.client import HTTPConnectionPool
 
+from kiosk_client.arrivals import ConstantArrivals
+from kiosk_client.cache import FileIndex
+from kiosk_client.cache import UploadCache
 from kiosk_client.job import Job
+from kiosk_client.packing import iter_packs
+from kiosk_client.journal import Journal
+from kiosk_client.metrics import ClientMetrics
+from kiosk_client.metrics import listen as listen_metrics
+from kiosk_client.poller import AdaptivePollingPolicy
+from kiosk_client.poller import PollingPolicy
+from kiosk_client.poller import StatusPoller
+from kiosk_client.redis_backend import RedisBackend
+from kiosk_client.results import JsonlResultsWriter
+from kiosk_client.results import write_npz
+from kiosk_client.storage import Uploader
+from kiosk_client.storage import get_storage
+from kiosk_client.store import JobTable
 from kiosk_client.utils import iter_image_files
+from kiosk_client.utils import percentile
 from kiosk_client.utils import sleep
 from kiosk_client.utils import strip_bucket_prefix
 from kiosk_client.utils import get_download_path
@@ -58,14 +78,76 @@ class JobManager(object):
         upload_prefix (str): upload all files to this folder in the bucket.
         refresh_rate (int): seconds between each manager status check.
         update_interval (int): seconds between each job status refresh.
+        poll_batch_size (int): maximum status requests per poll tick.
+            If 0, each job polls its own status independently.
+        poll_tick (float): seconds between each batch of status requests.
+        poll_jitter (float): randomly scale each poll interval by up to this
+            fraction to de-synchronize status requests.
+        adaptive_polling (bool): poll queued jobs less often and running jobs
+            more often as they near the median job completion time.
+        min_update_interval (float): minimum seconds between status requests
+            of a job, if using adaptive polling.
+        max_update_interval (float): maximum seconds between status requests
+            of a job, if using adaptive polling.
+        multi_get (bool): request all summary fields of a job at once.
+        redis_host (str): read and expire the hashes of jobs directly in
+            Redis on this host instead of through the API. Disabled if empty.
+        redis_port (int): port of the Redis server.
+        redis_batch_size (int): maximum number of Redis commands sent in
+            each pipelined round trip.
         expire_time (int): seconds until finished jobs are expired.
         start_delay (int): delay between each job, in seconds.
+        schedule_window (float): create benchmarking jobs at most this many
+            seconds before they start.
+        max_pending_jobs (int): maximum number of benchmarking jobs created
+            but not yet started.
+        upload_concurrency (int): maximum number of files uploaded at once
+            when processing a directory of files or staging uploads.
+        stage_uploads (int): when benchmarking with uploads, upload this many
+            copies of the file before any job is created, and reuse them
+            for all jobs. Disabled if 0.
+        verify_processes (int): number of processes verifying the image
+            files of a directory. If 0 or 1, files are verified in this
+            process.
+        cache_dir (str): directory of local caches. Disabled if empty.
+        storage_bucket (str): the bucket of uploaded files, or a local
+            directory as "file:///path/to/dir".
+        upload_workers (int): maximum number of files uploaded to the
+            storage bucket at once.
+        upload_chunk_size (int): bytes of each chunk of a resumable upload.
+        resumable_upload_threshold (int): upload files of at least this
+            many bytes in chunks with a resumable upload.
+        upload_cache (bool): upload the contents of each file only once,
+            reusing uploads of previous runs if ``cache_dir`` is set.
+        verify_cached_uploads (bool): check that a cached upload still
+            exists in the storage bucket before reusing it. Requires
+            ``storage_bucket``.
+        pack_max_files (int): pack up to this many small image files into
+            each zip archive, processed as a single job. Disabled if 0.
+        pack_max_bytes (int): maximum total size of the files packed into
+            each zip archive.
+        output_formats (list): formats of the output files, any of
+            ``supported_formats``.
+        journal (str): path of a journal file recording the lifecycle of
+            each job, so that the run can be resumed if interrupted.
+        resume (bool): resume the run recorded in the journal, restoring
+            finished jobs and monitoring unfinished jobs.
+        metrics_port (int): serve live client metrics to Prometheus at
+            ``/metrics`` on this port. Disabled if 0.
     """
 
+    supported_formats = ('json', 'jsonl', 'npz')
+
     def __init__(self, host, job_type, **kwargs):
         self.logger = logging.getLogger(str(self.__class__.__name__))
         self.created_at = timeit.default_timer()
         self.all_jobs = []
+        self.job_table = JobTable()  # summary data of all jobs
+        self.arrivals = None  # the ArrivalProcess of benchmarking jobs
+        self.concurrency_results = []  # closed-loop results per concurrency
+        self.capacity_results = None  # results of the capacity search
+        self.num_evicted = 0  # expired jobs released from the job table
+        self._expired_rows = []  # rows of expired jobs to release
 
         self.host = self._get_host(host)
         self.job_type = job_type
@@ -109,10 +191,53 @@ class JobManager(object):
         self.update_interval = kwargs.get('update_interval', 10)
         self.expire_time = kwargs.get('expire_time', 3600)
         self.start_delay = kwargs.get('start_delay', 0.1)
+        self.schedule_window = float(kwargs.get('schedule_window',
+                                                settings.SCHEDULE_WINDOW))
+        self.max_pending_jobs = max(1, int(kwargs.get(
+            'max_pending_jobs', settings.MAX_PENDING_JOBS)))
+        self.upload_concurrency = max(1, int(kwargs.get(
+            'upload_concurrency', settings.UPLOAD_CONCURRENCY)))
+        self.stage_uploads = int(kwargs.get('stage_uploads',
+                                            settings.STAGE_UPLOADS))
+        self.staging_results = None  # time taken to stage uploads
+        self.verify_processes = max(1, int(kwargs.get(
+            'verify_processes', settings.VERIFY_PROCESSES)))
+        self.cache_dir = kwargs.get('cache_dir', settings.CACHE_DIR)
+
         self.bucket = kwargs.get('storage_bucket')
+        self.upload_cache = None  # reuse uploads of the same file contents
+        if kwargs.get('upload_cache', settings.UPLOAD_CACHE):
+            exists = None
+            if kwargs.get('verify_cached_uploads',
+                          settings.VERIFY_CACHED_UPLOADS):
+                if not self.bucket:
+                    raise ValueError('A storage bucket is required to verify '
+                                     'cached uploads.')
+                exists = self._blob_exists
+            path = ':memory:'  # only reuse uploads of this run
+            if self.cache_dir:
+                path = os.path.join(self.cache_dir, 'uploads.sqlite')
+            self.upload_cache = UploadCache(path, exists=exists)
+
+        self.pack_max_files = int(kwargs.get('pack_max_files',
+                                             settings.PACK_MAX_FILES))
+        self.pack_max_bytes = int(kwargs.get('pack_max_bytes',
+                                             settings.PACK_MAX_BYTES))
+        self.storage = None  # created with the first upload
+        self._storage_lock = threading.Lock()  # uploads run in threads
+        self.storage_kwargs = {
+            'chunk_size': kwargs.get('upload_chunk_size',
+                                     settings.UPLOAD_CHUNK_SIZE),
+            'resumable_threshold': kwargs.get(
+                'resumable_upload_threshold',
+                settings.RESUMABLE_UPLOAD_THRESHOLD),
+        }
+        self.uploader = Uploader(kwargs.get('upload_workers',
+                                            settings.UPLOAD_WORKERS))
         self.upload_results = kwargs.get('upload_results', False)
         self.download_results = kwargs.get('download_results', True)
         self.calculate_cost = kwargs.get('calculate_cost', False)
+        self.multi_get = kwargs.get('multi_get', settings.REDIS_MULTI_GET)
 
         self.output_dir = kwargs.get('output_dir', get_download_path())
         if not os.path.isdir(self.output_dir):
@@ -122,6 +247,52 @@ class JobManager(object):
             raise ValueError('Invalid value for output_dir,'
                              ' %s is not writable.' % self.output_dir)
 
+        self.output_formats = set(kwargs.get('output_formats',
+                                             settings.OUTPUT_FORMATS))
+        unknown_formats = self.output_formats - set(self.supported_formats)
+        if unknown_formats:
+            raise ValueError('Invalid output formats: %s. Must be one of %s.'
+                             % (', '.join(sorted(unknown_formats)),
+                                ', '.join(self.supported_formats)))
+
+        # stream each job's record to disk as soon as it is expired
+        self.results_writer = None
+        self.segment = 0  # the index of the rolled file of a soak run
+        self.segment_started_at = None
+        if 'jsonl' in self.output_formats:
+            self.results_writer = JsonlResultsWriter(
+                self._get_output_filepath('jsonl'))
+            self.job_table.add_listener(self._write_expired_job)
+
+        # record the lifecycle of each job to resume interrupted runs
+        self.journal = None
+        self.resumed_jobs = {}  # journaled state of each job by key
+        journal_path = kwargs.get('journal')
+        resume = kwargs.get('resume', False)
+        if resume and not journal_path:
+            raise ValueError('A journal is required to resume a run.')
+        if resume and self.pack_max_files > 1:
+            raise ValueError('Runs with packed files cannot be resumed.')
+        if journal_path:
+            if resume:
+                self.resumed_jobs = Journal.load(journal_path)
+                self.logger.info('Resuming %s jobs from journal %s.',
+                                 len(self.resumed_jobs), journal_path)
+            self.journal = Journal(journal_path, append=resume)
+            self.job_table.add_listener(self._journal_job)
+
+        # live client metrics, only recorded if served to Prometheus
+        self.metrics = None
+        self.metrics_port = int(kwargs.get('metrics_port',
+                                           settings.METRICS_PORT))
+        self.metrics_server = None
+        if self.metrics_port:
+            self.metrics = ClientMetrics()
+            self.metrics.watch(self.job_table)
+            self.metrics_server = listen_metrics(self.metrics,
+                                                 self.metrics_port)
+            self.logger.info('Serving metrics on port %s.', self.metrics_port)
+
         # initializing cost estimation workflow
         self.cost_getter = CostGetter()
 
@@ -132,6 +303,42 @@ class JobManager(object):
         self.pool.maxPersistentPerHost = settings.CONCURRENT_REQUESTS_PER_HOST
         self.pool.retryAutomatically = False
 
+        # poll job statuses in batches instead of once per job
+        self.polling_policy = self._get_polling_policy(**kwargs)
+        poll_batch_size = int(kwargs.get('poll_batch_size',
+                                         settings.POLL_BATCH_SIZE))
+        if poll_batch_size > 0:
+            self.poller = StatusPoller(
+                batch_size=poll_batch_size,
+                tick=kwargs.get('poll_tick', settings.POLL_TICK),
+                policy=self.polling_policy)
+        else:
+            self.poller = None  # each job polls its own status
+
+        # read and expire job hashes directly in Redis, in pipelines
+        self.redis = None
+        redis_host = kwargs.get('redis_host', settings.REDIS_HOST)
+        if redis_host:
+            self.redis = RedisBackend(
+                redis_host,
+                port=kwargs.get('redis_port', settings.REDIS_PORT),
+                batch_size=kwargs.get('redis_batch_size',
+                                      settings.REDIS_BATCH_SIZE))
+
+    def _get_polling_policy(self, **kwargs):
+        jitter = kwargs.get('poll_jitter', settings.POLL_JITTER)
+        if not kwargs.get('adaptive_polling', settings.ADAPTIVE_POLLING):
+            return PollingPolicy(update_interval=self.update_interval,
+                                 jitter=jitter)
+
+        return AdaptivePollingPolicy(
+            update_interval=self.update_interval,
+            min_interval=kwargs.get('min_update_interval',
+                                    settings.MIN_UPDATE_INTERVAL),
+            max_interval=kwargs.get('max_update_interval',
+                                    settings.MAX_UPDATE_INTERVAL),
+            jitter=jitter)
+
     def _get_host(self, host):
         """Send a GET request to the provided host. Check for redirects.
 
@@ -155,11 +362,54 @@ class JobManager(object):
         except:
             raise RuntimeError('Could not connect to host: %s' % host)
 
+    def get_storage(self):
+        """Get the storage backend of the bucket, shared by all uploads."""
+        with self._storage_lock:
+            if self.storage is None:
+                if not self.bucket:
+                    raise ValueError('A storage bucket is required to upload.')
+                self.storage = get_storage(self.bucket, **self.storage_kwargs)
+        return self.storage
+
+    def _blob_exists(self, name):
+        """Returns True if the blob exists in the storage bucket."""
+        return self.get_storage().exists(name)
+
     def upload_file(self, filepath, acl='publicRead',
                     hash_filename=True, prefix=None):
+        """Upload the file to the storage bucket in a worker thread.
+
+        Returns:
+            twisted.internet.defer.Deferred: fires with the uploaded name.
+        """
+        return self.uploader.run(self._upload_file, filepath, acl=acl,
+                                 hash_filename=hash_filename, prefix=prefix)
+
+    def upload_files(self, filepaths, **kwargs):
+        """Upload many files at once, in up to ``upload_workers`` threads.
+
+        Returns:
+            twisted.internet.defer.DeferredList: fires with the result of
+                each upload.
+        """
+        return defer.DeferredList(
+            [self.upload_file(f, **kwargs) for f in filepaths],
+            consumeErrors=True)
+
+    def _upload_file(self, filepath, acl='publicRead',
+                     hash_filename=True, prefix=None):
         prefix = self.upload_prefix if prefix is None else prefix
+        storage = self.get_storage()
+
+        digest = None
+        destination = '{}/{}'.format(self.bucket, prefix)
+        if self.upload_cache is not None and hash_filename:
+            digest, name = self.upload_cache.lookup(filepath, destination)
+            if name is not None:
+                self.logger.debug('Reusing upload %s of %s.', name, filepath)
+                return os.path.basename(name)
+
         start = timeit.default_timer()
-        storage_client = google_storage.Client()
 
         self.logger.debug('Uploading %s.', filepath)
         if hash_filename:
@@ -168,67 +418,69 @@ class JobManager(object):
         else:
             dest = os.path.basename(filepath)
 
-        bucket = storage_client.get_bucket(self.bucket)
-        blob = bucket.blob(os.path.join(prefix, dest))
-        blob.upload_from_filename(filepath, predefined_acl=acl)
+        name = storage.upload(filepath, os.path.join(prefix, dest), acl=acl)
         self.logger.debug('Uploaded %s to %s in %s seconds.',
                           filepath, dest, timeit.default_timer() - start)
+        if self.metrics is not None:
+            self.metrics.uploaded_bytes.inc(os.path.getsize(filepath))
+        if digest is not None:
+            self.upload_cache.put(digest, destination, name)
         return dest
 
     def make_job(self, filepath):
-        return Job(filepath=filepath,
-                   host=self.host,
-                   model_name=self.model_name,
-                   model_version=self.model_version,
-                   job_type=self.job_type,
-                   data_scale=self.data_scale,
-                   data_label=self.data_label,
-                   postprocess=self.postprocess,
-                   upload_prefix=self.upload_prefix,
-                   update_interval=self.update_interval,
-                   download_results=self.download_results,
-                   expire_time=self.expire_time,
-                   pool=self.pool,
-                   output_dir=self.output_dir)
+        """Create a new job, stored in the job table and ``all_jobs``."""
+        self.evict_expired_jobs()  # reuse the rows of expired jobs
+        job = Job(filepath=filepath,
+                  host=self.host,
+                  model_name=self.model_name,
+                  model_version=self.model_version,
+                  job_type=self.job_type,
+                  data_scale=self.data_scale,
+                  data_label=self.data_label,
+                  postprocess=self.postprocess,
+                  upload_prefix=self.upload_prefix,
+                  update_interval=self.update_interval,
+                  download_results=self.download_results,
+                  multi_get=self.multi_get,
+                  expire_time=self.expire_time,
+                  pool=self.pool,
+                  poller=self.poller,
+                  polling_policy=self.polling_policy,
+                  upload_cache=self.upload_cache,
+                  metrics=self.metrics,
+                  redis=self.redis,
+                  table=self.job_table,
+                  output_dir=self.output_dir)
+        if job._row < len(self.all_jobs):  # the row of an evicted job
+            self.all_jobs[job._row] = job
+        else:
+            self.all_jobs.append(job)  # the index of each job is its row
+        return job
 
     def get_completed_job_count(self):
-        created, complete, failed, expired = 0, 0, 0, 0
-
-        statuses = {}
-
-        for j in self.all_jobs:
-            expired += int(j.is_expired)  # true mark of being done
-            complete += int(j.is_summarized)
-            created += int(j.job_id is not None)
-
-            if j.status is not None:
-                if j.status not in statuses:
-                    statuses[j.status] = 1
-                else:
-                    statuses[j.status] += 1
+        table = self.job_table
 
-            if j.failed:
-                j.restart(delay=self.start_delay * failed)
+        # true mark of being done
+        expired = table.count_flagged('is_expired') + self.num_evicted
+        complete = table.count_summarized() + self.num_evicted
+        created = table.count_created() + self.num_evicted
+        statuses = table.count_statuses()
+        total = len(table) - table.count_released() + self.num_evicted
 
-            # # TODO: patched! "done" jobs can get stranded before summarization
-            # if j.status == 'done' and not j.is_summarized:
-            #     j.summarize()
-            #
-            # # TODO: patched! sometimes jobs don't get expired?
-            # elif j.status == 'done' and j.is_summarized and not j.is_expired:
-            #     j.expire()
+        for i, row in enumerate(table.failed_rows()):
+            self.all_jobs[row].restart(delay=self.start_delay * i)
 
         self.logger.info('%s created; %s finished; %s summarized; '
                          '%s; %s jobs total', created, expired, complete,
                          '; '.join('%s %s' % (v, k)
                                    for k, v in statuses.items()),
-                         len(self.all_jobs))
+                         total)
 
-        if len(self.all_jobs) - expired <= 25:
-            for j in self.all_jobs:
-                if not j.is_expired:
-                    self.logger.info('Waiting on key `%s` with status %s',
-                                     j.job_id, j.status)
+        if total - expired <= 25:
+            for row in table.iter_flagged('is_expired', False):
+                self.logger.info('Waiting on key `%s` with status %s',
+                                 table.get(row, 'job_id'),
+                                 table.get(row, 'status'))
 
         return expired
 
@@ -245,53 +497,222 @@ class JobManager(object):
 
             complete = self.get_completed_job_count()  # synchronous
 
-        self.summarize()  # synchronous
+        yield self.summarize()
 
         yield self._stop()
 
+    def _get_output_filepath(self, ext, num_jobs=None, segment=None):
+        if num_jobs is None:  # the number of jobs is not yet known
+            num_jobs = 'stream_'
+        else:
+            num_jobs = '{}jobs_'.format(num_jobs)
+        if segment is not None:  # one of the rolled files of a soak run
+            num_jobs = '{}part{}_'.format(num_jobs, segment)
+        filename = '{}{}{}delay_{}.{}'.format(
+            '{}gpu_'.format(settings.NUM_GPUS) if settings.NUM_GPUS else '',
+            num_jobs, self.start_delay, uuid.uuid4().hex, ext)
+        return os.path.join(self.output_dir, filename)
+
+    def _write_expired_job(self, row, field, _, new):
+        if field == 'is_expired' and new:
+            self.results_writer.write(self.job_table.record(row))
+
+    def _queue_expired_job(self, row, field, _, new):
+        if field == 'is_expired' and new:
+            self._expired_rows.append(row)
+
+    def evict_expired_jobs(self):
+        """Drop the ``Job`` of each expired job and release its table row.
+
+        Rows are queued for eviction as their jobs expire, so every other
+        listener sees the expired row before it is released.
+        """
+        for row in self._expired_rows:
+            self.all_jobs[row] = None
+            self.job_table.release(row)
+        self.num_evicted += len(self._expired_rows)
+        self._expired_rows = []
+
+    def get_journal_key(self, row):
+        """Get the key identifying a job across resumed runs."""
+        return row
+
+    def _journal_job(self, row, field, _, new):
+        key = self.get_journal_key(row)
+        if field == 'job_id' and new is not None:
+            self.journal.write('created', key, job_id=new,
+                               filepath=self.all_jobs[row].filepath)
+        elif field == 'status':
+            self.journal.write('status', key, status=new)
+        elif field == 'is_expired' and new:
+            self.journal.write('expired', key,
+                               record=self.job_table.record(row))
+
+    def resume_job(self, job, delay=0):
+        """Restore the job from the journal of a previous run.
+
+        Finished jobs are restored as they were. Jobs that were created but
+        not finished are monitored, summarized and expired.
+
+        Args:
+            job (kiosk_client.job.Job): a new job, not yet started.
+            delay (float): seconds to wait before resuming an unfinished job.
+
+        Returns:
+            bool: whether the job was found in the journal.
+        """
+        if not self.resumed_jobs:
+            return False  # not resuming a run
+
+        state = self.resumed_jobs.get(self.get_journal_key(job._row))
+        if not state or not state.get('job_id'):
+            return False  # the job was never created
+
+        job.filepath = state.get('filepath') or job.filepath
+        job.job_id = state['job_id']
+        job.status = state.get('status')
+
+        if state.get('expired') and state.get('record'):
+            job.load_json(state['record'])
+            job.is_expired = True
+            self.logger.debug('[%s]: Restored finished job.', job.job_id)
+        else:
+            self.logger.info('[%s]: Resuming job with status `%s`.',
+                             job.job_id, job.status)
+            job.resume(delay=delay)
+        return True
+
+    def get_upload_results(self):
+        """Get the number, size and throughput of all uploaded files.
+
+        Returns:
+            dict: the upload statistics, or None if no files were uploaded.
+                Files reused from the upload cache are not counted.
+        """
+        table = self.job_table
+        sizes, times = [], []
+        for row in range(len(table)):
+            size = table.get(row, 'upload_size')
+            upload_time = table.get(row, 'client_upload_time')
+            if (isinstance(size, float) and isinstance(upload_time, float)
+                    and upload_time > 0):  # not reused from the cache
+                sizes.append(size)
+                times.append(upload_time)
+
+        if not sizes:
+            return None
+
+        throughputs = [s / t for s, t in zip(sizes, times) if t > 0]
+        return {
+            'num_files': len(sizes),
+            'total_bytes': sum(sizes),
+            'upload_time_p50': percentile(times, 50),
+            'upload_time_p99': percentile(times, 99),
+            'bytes_per_second_p50': percentile(throughputs, 50),
+            'bytes_per_second_p10': percentile(throughputs, 10),
+            'upload_concurrency': self.upload_concurrency,
+        }
+
     def summarize(self):
+        """Write the output files and upload them, if required.
+
+        Returns:
+            twisted.internet.defer.Deferred: fires once the output files are
+                uploaded.
+        """
         time_elapsed = timeit.default_timer() - self.created_at
+        num_jobs = len(self.job_table)
         self.logger.info('Finished %s jobs in %s seconds.',
-                         len(self.all_jobs), time_elapsed)
+                         num_jobs, time_elapsed)
 
         # add cost and timing data to json output
+        summary = self._get_summary(self.cost_getter, num_jobs, time_elapsed)
+        if self.concurrency_results:
+            summary['concurrency_results'] = self.concurrency_results
+        if self.staging_results:
+            summary['staging_results'] = self.staging_results
+        if self.capacity_results:
+            summary['capacity_results'] = self.capacity_results
+        if self.pack_max_files > 1:
+            summary['num_files'] = sum(
+                len(self.job_table.get(row, 'packed_files') or [None])
+                for row in range(num_jobs))
+        upload_results = self.get_upload_results()
+        if upload_results:
+            summary['upload_results'] = upload_results
+
+        output_filepaths = []
+
+        if 'json' in self.output_formats:
+            jsondata = dict(summary)
+            jsondata['job_data'] = list(self.job_table.iter_records())
+
+            output_filepath = self._get_output_filepath('json', num_jobs)
+            with open(output_filepath, 'w') as jsonfile:
+                json.dump(jsondata, jsonfile, indent=4)
+                self.logger.info('Wrote job data as JSON to %s.',
+                                 output_filepath)
+            output_filepaths.append(output_filepath)
+
+        if 'npz' in self.output_formats:
+            output_filepath = self._get_output_filepath('npz', num_jobs)
+            write_npz(output_filepath, self.job_table, summary)
+            self.logger.info('Wrote job data as NumPy arrays to %s.',
+                             output_filepath)
+            output_filepaths.append(output_filepath)
+
+        if self.results_writer is not None:
+            self.results_writer.write_summary(summary)
+            output_filepaths.append(self.results_writer.path)
+
+        if self.journal is not None:
+            self.journal.close()
+
+        if self.redis is not None:
+            self.redis.close()
+
+        return self._upload_outputs(output_filepaths)
+
+    def _get_summary(self, cost_getter, num_jobs, time_elapsed):
+        """Get the costs and timing of jobs for an output file."""
         cpu_cost, gpu_cost, total_cost = '', '', ''
         if self.calculate_cost:
             try:
-                cpu_cost, gpu_cost, total_cost = self.cost_getter.finish()
+                cpu_cost, gpu_cost, total_cost = cost_getter.finish()
             except Exception as err:  # pylint: disable=broad-except
                 self.logger.error('Encountered %s while getting cost data: %s',
                                   type(err).__name__, err)
 
-        jsondata = {
+        summary = {
             'cpu_node_cost': cpu_cost,
             'gpu_node_cost': gpu_cost,
             'total_node_and_networking_costs': total_cost,
             'start_delay': self.start_delay,
-            'num_jobs': len(self.all_jobs),
+            'num_jobs': num_jobs,
             'time_elapsed': time_elapsed,
-            'job_data': [j.json() for j in self.all_jobs]
         }
-
-        output_filepath = '{}{}jobs_{}delay_{}.json'.format(
-            '{}gpu_'.format(settings.NUM_GPUS) if settings.NUM_GPUS else '',
-            len(self.all_jobs), self.start_delay, uuid.uuid4().hex)
-        output_filepath = os.path.join(self.output_dir, output_filepath)
-
-        with open(output_filepath, 'w') as jsonfile:
-            json.dump(jsondata, jsonfile, indent=4)
-            self.logger.info('Wrote job data as JSON to %s.', output_filepath)
-
-        if self.upload_results:
-            try:
-                _ = self.upload_file(output_filepath,
-                                     hash_filename=False,
-                                     prefix='output')
-            except Exception as err:  # pylint: disable=broad-except
-                self.logger.error(err)
-                self.logger.error('Could not upload output file to bucket. '
-                                  'Copy this file from the docker container to '
-                                  'keep the data.')
+        if self.arrivals is not None:
+            summary['arrival_process'] = self.arrivals.describe()
+        return summary
+
+    def _upload_outputs(self, output_filepaths):
+        """Upload the output files to the bucket, if ``upload_results``."""
+        if not self.upload_results:
+            return defer.succeed(None)
+
+        def log_error(err):
+            self.logger.error(err.value)
+            self.logger.error('Could not upload output file to '
+                              'bucket. Copy this file from the docker '
+                              'container to keep the data.')
+
+        uploads = []
+        for output_filepath in output_filepaths:
+            d = defer.maybeDeferred(self.upload_file, output_filepath,
+                                    hash_filename=False, prefix='output')
+            d.addErrback(log_error)
+            uploads.append(d)
+        return defer.DeferredList(uploads)
 
     def run(self, *args, **kwargs):
         raise NotImplementedError
@@ -301,51 +722,611 @@ class BenchmarkingJobManager(JobManager):
     # pylint: disable=arguments-differ
 
     @defer.inlineCallbacks
-    def run(self, filepath, count, upload=False):
+    def stage_files(self, filepath, count):
+        """Upload copies of the file before the benchmark starts.
+
+        Up to ``stage_uploads`` copies are uploaded, ``upload_concurrency``
+        at a time. The benchmark clock and cost estimate are restarted
+        once all copies are uploaded, so upload time is not measured.
+
+        Args:
+            filepath (str): the file to upload.
+            count (int): the number of jobs that will use the copies.
+
+        Returns:
+            list: the uploaded path of each copy.
+        """
+        copies = max(1, min(self.stage_uploads, count))
+        self.logger.info('Staging %s copies of file `%s`.', copies, filepath)
+        start = timeit.default_timer()
+
+        def upload_copy():
+            job = Job(filepath=filepath,
+                      host=self.host,
+                      model_name=self.model_name,
+                      model_version=self.model_version,
+                      upload_prefix=self.upload_prefix,
+                      update_interval=self.update_interval,
+                      pool=self.pool,
+                      output_dir=self.output_dir)
+            return job.upload()  # each copy is a distinct upload
+
+        uploads = defer.DeferredSemaphore(self.upload_concurrency)
+        filepaths = yield defer.gatherResults(
+            [uploads.run(upload_copy) for _ in range(copies)],
+            consumeErrors=True)
+
+        time_elapsed = timeit.default_timer() - start
+        self.logger.info('Staged %s copies of file `%s` in %s seconds.',
+                         copies, filepath, time_elapsed)
+        self.staging_results = {
+            'copies': copies,
+            'time_elapsed': time_elapsed,
+        }
+
+        # the benchmark starts now
+        self.created_at = timeit.default_timer()
+        self.cost_getter = CostGetter()
+        defer.returnValue(filepaths)
+
+    @defer.inlineCallbacks
+    def run(self, filepath, count, upload=False, arrivals=None):
+        """Create ``count`` jobs of the same file.
+
+        Jobs are created lazily as their start times approach, so only the
+        jobs starting within ``schedule_window`` seconds (and at most
+        ``max_pending_jobs``) are waiting to start at any time.
+
+        Args:
+            filepath (str): the file to process.
+            count (int): the number of jobs to create.
+            upload (bool): upload the file before creating each job.
+                If ``stage_uploads`` is set, copies of the file are uploaded
+                before the first job is created instead.
+            arrivals (ArrivalProcess): decides when each job is started.
+                Defaults to a new job every ``start_delay`` seconds.
+        """
         self.logger.info('Benchmarking %s jobs of file `%s`', count, filepath)
 
-        for i in range(count):
+        if arrivals is None:
+            arrivals = ConstantArrivals.from_interval(self.start_delay)
+        self.arrivals = arrivals
 
-            job = self.make_job(filepath)
+        filepaths = [filepath]
+        if upload and self.stage_uploads > 0:
+            filepaths = yield self.stage_files(filepath, count)
+            upload = False
 
-            self.all_jobs.append(job)
+        # log progress and restart failed jobs while creating the others
+        logger = task.LoopingCall(self.get_completed_job_count)
+        logger.start(self.refresh_rate, now=False)
+        try:
+            yield self._create_jobs(filepaths,
+                                    itertools.islice(arrivals, count),
+                                    upload=upload)
+        finally:
+            logger.stop()
 
-            # stagger the delay seconds; if upload it will be staggered already
-            job.start(delay=self.start_delay * i * int(not upload),
-                      upload=upload)
+        yield self.check_job_status()
 
-            yield self.sleep(self.start_delay * upload)
+    @defer.inlineCallbacks
+    def _create_jobs(self, filepaths, starts, upload=False):
+        """Create a job of each file in turn at each start time.
+
+        Jobs restored from the journal are resumed without waiting for
+        their start times, and the first job that is not resumed starts
+        immediately.
+
+        Args:
+            filepaths (list): the files to process.
+            starts (iterable): the start time of each job, in seconds since
+                the first job.
+            upload (bool): upload the file before creating each job.
+        """
+        resumed = 0
+        first_start = None  # start time of the first job not resumed
+        previous_start = 0
+        scheduled_until = 0  # jobs starting before this time are created
+        pending = 0  # jobs created since the last wake up
+        started_at = None
+        for i, start in enumerate(starts):
+            job = self.make_job(filepaths[i % len(filepaths)])
+
+            if self.resume_job(job, delay=self.start_delay * resumed):
+                resumed += 1
+                continue
+
+            if first_start is None:
+                first_start = start
+                started_at = timeit.default_timer()
+            start -= first_start
+
+            if not upload and (start >= scheduled_until or
+                               pending >= self.max_pending_jobs):
+                # wait until this job starts, then schedule the next window
+                elapsed = timeit.default_timer() - started_at
+                yield self.sleep(max(0, start - elapsed))
+                previous_start = start
+                scheduled_until = start + self.schedule_window
+                pending = 0
 
             if upload:
+                # uploads are started in order as each job arrives
+                yield self.sleep(start - previous_start)
+                previous_start = start
+                job.start(delay=0, upload=upload)
                 self.get_completed_job_count()  # log during uploading
+            else:
+                job.start(delay=start - previous_start)
+                pending += 1
+
+    @defer.inlineCallbacks
+    def soak(self, filepath, duration, roll_interval=3600, upload=False,
+             arrivals=None):
+        """Create jobs of the same file for ``duration`` seconds.
+
+        Memory is bounded by the number of jobs in flight instead of the
+        number of jobs created: the record of each expired job is written to
+        a JSON Lines file, then its ``Job`` is dropped and its row of the
+        job table is reused. Every ``roll_interval`` seconds, the file is
+        finished with a summary of its jobs and a new file is started, so
+        each file can be analyzed on its own. Other output formats are not
+        written.
+
+        Args:
+            filepath (str): the file to process.
+            duration (float): seconds to create new jobs for. The run ends
+                once the jobs in flight have expired.
+            roll_interval (float): seconds between new output files.
+            upload (bool): upload the file before creating each job.
+                If ``stage_uploads`` is set, copies of the file are uploaded
+                before the first job is created instead.
+            arrivals (ArrivalProcess): decides when each job is started.
+                Defaults to a new job every ``start_delay`` seconds. Its
+                rates must be finite, or jobs would be created without
+                limit.
+        """
+        if duration <= 0:
+            raise ValueError('duration must be positive.')
+        if roll_interval <= 0:
+            raise ValueError('roll_interval must be positive.')
+        if self.journal is not None:
+            raise ValueError('Soak runs cannot be journaled.')
+
+        self.logger.info('Soaking with jobs of file `%s` for %s seconds.',
+                         filepath, duration)
+
+        if arrivals is None:
+            arrivals = ConstantArrivals.from_interval(self.start_delay)
+        if not arrivals.is_finite:
+            raise ValueError('Soak runs require a finite arrival rate. Set '
+                             'a positive start_delay or arrival rate.')
+        self.arrivals = arrivals
+
+        filepaths = [filepath]
+        if upload and self.stage_uploads > 0:
+            filepaths = yield self.stage_files(filepath, self.stage_uploads)
+            upload = False
+
+        if self.results_writer is None:
+            self.job_table.add_listener(self._write_expired_job)
+        self.job_table.add_listener(self._queue_expired_job)
+        self.segment_started_at = timeit.default_timer()
+        self.results_writer = JsonlResultsWriter(
+            self._get_output_filepath('jsonl', segment=self.segment))
+
+        roller = task.LoopingCall(self.roll_results)
+        roller.start(roll_interval, now=False)
+        logger = task.LoopingCall(self.get_completed_job_count)
+        logger.start(self.refresh_rate, now=False)
+        try:
+            starts = itertools.takewhile(lambda start: start < duration,
+                                         arrivals)
+            yield self._create_jobs(filepaths, starts, upload=upload)
+
+            # wait until the jobs in flight have expired
+            self.evict_expired_jobs()
+            while len(self.job_table) > self.job_table.count_released():
+                yield self.sleep(self.refresh_rate)
+                self.evict_expired_jobs()
+        finally:
+            roller.stop()
+            logger.stop()
+
+        self.logger.info('Finished %s jobs in %s seconds.', self.num_evicted,
+                         timeit.default_timer() - self.created_at)
+        yield self.roll_results(final=True)
+
+        yield self._stop()
+
+    def roll_results(self, final=False):
+        """Finish the output file of a soak run with a summary of its jobs,
+        and write the jobs that expire next to a new file.
+
+        Args:
+            final (bool): do not start a new file.
+
+        Returns:
+            twisted.internet.defer.Deferred: fires once the finished file is
+                uploaded.
+        """
+        now = timeit.default_timer()
+        writer = self.results_writer
+        cost_getter, self.cost_getter = self.cost_getter, CostGetter()
+
+        summary = self._get_summary(cost_getter, writer.count,
+                                    now - self.segment_started_at)
+        summary['segment'] = self.segment
+        writer.write_summary(summary)
+
+        if not final:
+            self.segment += 1
+            self.segment_started_at = now
+            self.results_writer = JsonlResultsWriter(
+                self._get_output_filepath('jsonl', segment=self.segment))
+        return self._upload_outputs([writer.path])
+
+    @defer.inlineCallbacks
+    def run_closed_loop(self, filepath, count, concurrency, upload=False):
+        """Create ``count`` jobs of the same file, keeping a fixed number of
+        jobs in flight. A new job is created as soon as another finishes.
+
+        Args:
+            filepath (str): the file to process.
+            count (int): the number of jobs to create at each concurrency.
+            concurrency (list): the numbers of jobs to keep in flight.
+                Each concurrency is run in turn, after the previous one.
+            upload (bool): upload the file before creating each job.
+                If ``stage_uploads`` is set, copies of the file are uploaded
+                before the first job is created instead.
+        """
+        if isinstance(concurrency, int):
+            concurrency = [concurrency]
+
+        filepaths = [filepath]
+        if upload and self.stage_uploads > 0:
+            filepaths = yield self.stage_files(filepath, count)
+            upload = False
+
+        logger = task.LoopingCall(self.get_completed_job_count)
+        logger.start(self.refresh_rate, now=False)
+        try:
+            for level in concurrency:
+                self.logger.info('Benchmarking %s jobs of file `%s` with %s '
+                                 'jobs in flight.', count, filepath, level)
+                result = yield self._run_concurrency(
+                    filepaths, count, level, upload=upload)
+                self.concurrency_results.append(result)
+        finally:
+            logger.stop()
+
+        for result in self.concurrency_results:
+            self.logger.info('Concurrency %s: %s jobs per second, '
+                             'median latency %s seconds.',
+                             result['concurrency'], result['throughput'],
+                             result['latency_p50'])
 
         yield self.check_job_status()
 
+    def _run_concurrency(self, filepaths, count, concurrency, upload=False):
+        """Run ``count`` jobs of the files with ``concurrency`` jobs in
+        flight, using each file in turn.
+
+        Returns:
+            twisted.internet.defer.Deferred: fires with the throughput and
+                latency of the jobs once they have all expired.
+        """
+        if concurrency < 1:
+            raise ValueError('concurrency must be a positive integer.')
+
+        finished = defer.Deferred()
+        first_row = len(self.job_table)
+        created_at, latencies = {}, []
+        state = {'started': 0, 'finished': 0, 'expired': 0}
+        started_at = timeit.default_timer()
+
+        def start_job():
+            if state['started'] < count:
+                job = self.make_job(
+                    filepaths[state['started'] % len(filepaths)])
+                state['started'] += 1
+                job.start(delay=0, upload=upload)
+
+        def on_change(row, field, old, new):
+            if row < first_row:
+                return  # a job of a previous concurrency
+
+            if field == 'job_id' and new is not None:
+                created_at[row] = timeit.default_timer()
+
+            elif (field == 'status' and new in Job._finished_statuses
+                  and old not in Job._finished_statuses):
+                state['finished'] += 1
+                if row in created_at:
+                    latencies.append(
+                        timeit.default_timer() - created_at[row])
+                start_job()  # replace the finished job
+
+            elif field == 'is_expired' and new:
+                state['expired'] += 1
+                if state['expired'] == count:
+                    self.job_table.remove_listener(on_change)
+                    finished.callback(self._get_concurrency_result(
+                        concurrency, first_row, started_at, latencies))
+
+        self.job_table.add_listener(on_change)
+        for _ in range(min(concurrency, count)):
+            start_job()
+        return finished
+
+    def _get_concurrency_result(self, concurrency, first_row,
+                                started_at, latencies):
+        time_elapsed = timeit.default_timer() - started_at
+        rows = range(first_row, len(self.job_table))
+        total_times = [self.job_table.get(row, 'total_time') for row in rows]
+        total_times = [t for t in total_times if isinstance(t, float)]
+        return {
+            'concurrency': concurrency,
+            'num_jobs': len(rows),
+            'time_elapsed': time_elapsed,
+            'throughput': len(rows) / time_elapsed if time_elapsed else 0,
+            'latency_p50': percentile(total_times, 50),
+            'latency_p90': percentile(total_times, 90),
+            'latency_p99': percentile(total_times, 99),
+            'client_latency_p50': percentile(latencies, 50),
+            'client_latency_p99': percentile(latencies, 99),
+        }
+
+    @defer.inlineCallbacks
+    def find_capacity(self, filepath, count, rate=1, max_rate=None,
+                      precision=0.1, max_steps=10, tolerance=0.1,
+                      max_latency_growth=2, upload=False):
+        """Search for the highest rate of jobs that the cluster sustains.
+
+        ``count`` jobs are started at each rate. The rate is doubled until
+        it is not sustainable, then the highest sustainable rate is found
+        by binary search. A rate is sustainable if jobs finish as fast as
+        they are started, their latency does not grow during the run and
+        few of them fail.
+
+        Args:
+            filepath (str): the file to process.
+            count (int): the number of jobs to create at each rate.
+            rate (float): jobs per second of the first rate.
+            max_rate (float): never start jobs faster than this.
+            precision (float): stop once the lowest rate found not to be
+                sustainable is within this fraction of the highest
+                sustainable rate.
+            max_steps (int): the maximum number of rates to run.
+            tolerance (float): the fraction of the rate that the throughput
+                may fall short by, and the fraction of jobs that may fail.
+            max_latency_growth (float): the maximum ratio of the median
+                latency of the last third of jobs to that of the first third.
+            upload (bool): upload the file before creating each job.
+                If ``stage_uploads`` is set, copies of the file are uploaded
+                before the first job is created instead.
+        """
+        if count < 3:
+            raise ValueError('At least 3 jobs are required at each rate.')
+        if rate <= 0:
+            raise ValueError('rate must be positive.')
+
+        filepaths = [filepath]
+        if upload and self.stage_uploads > 0:
+            filepaths = yield self.stage_files(filepath, count)
+            upload = False
+
+        steps = []
+        best = None  # the result of the highest sustainable rate
+        unsustainable = None  # the lowest rate that was not sustainable
+        logger = task.LoopingCall(self.get_completed_job_count)
+        logger.start(self.refresh_rate, now=False)
+        try:
+            for _ in range(max_steps):
+                self.logger.info('Benchmarking %s jobs of file `%s` at %s '
+                                 'jobs per second.', count, filepath, rate)
+                result = yield self._run_rate(filepaths, count, rate,
+                                              upload=upload)
+                growth = result['latency_growth']
+                result['sustainable'] = (
+                    result['throughput'] >= rate * (1 - tolerance) and
+                    (growth is None or growth <= max_latency_growth) and
+                    result['num_failed'] <= count * tolerance)
+                steps.append(result)
+                self.logger.info('%s jobs per second is %ssustainable: '
+                                 'throughput %s jobs per second, latency '
+                                 'grew %s times.', rate,
+                                 '' if result['sustainable'] else 'not ',
+                                 result['throughput'], growth)
+
+                if not result['sustainable']:
+                    unsustainable = min(unsustainable or rate, rate)
+                elif best is None or rate > best['rate']:
+                    best = result
+
+                if unsustainable is None:
+                    if max_rate and rate >= max_rate:
+                        break
+                    rate = min(rate * 2, max_rate or float('inf'))
+                elif best is None:
+                    rate /= 2
+                elif unsustainable <= best['rate'] * (1 + precision):
+                    break
+                else:
+                    rate = (best['rate'] + unsustainable) / 2
+        finally:
+            logger.stop()
+
+        best = best or {}
+        self.capacity_results = {
+            'capacity': best.get('rate'),
+            'throughput': best.get('throughput'),
+            'latency_p50': best.get('latency_p50'),
+            'latency_p99': best.get('latency_p99'),
+            'cost_per_image': best.get('cost_per_image'),
+            'steps': steps,
+        }
+        self.logger.info('Maximum sustainable rate: %s jobs per second.',
+                         self.capacity_results['capacity'])
+
+        yield self.check_job_status()
+
+    def _run_rate(self, filepaths, count, rate, upload=False):
+        """Run ``count`` jobs of the files, started at ``rate`` jobs per
+        second, using each file in turn.
+
+        Jobs are created by ``_create_jobs``, so only the jobs within the
+        schedule window are waiting to start at any time.
+
+        Returns:
+            twisted.internet.defer.Deferred: fires with the throughput and
+                latency of the jobs once they have all expired.
+        """
+        finished = defer.Deferred()
+        first_row = len(self.job_table)
+        finished_at = []
+        state = {'expired': 0}
+        cost_getter = CostGetter() if self.calculate_cost else None
+
+        def on_change(row, field, old, new):
+            if row < first_row:
+                return  # a job of a previous rate
+
+            if (field == 'status' and new in Job._finished_statuses
+                    and old not in Job._finished_statuses):
+                finished_at.append(timeit.default_timer())
+
+            elif field == 'is_expired' and new:
+                state['expired'] += 1
+                if state['expired'] == count:
+                    self.job_table.remove_listener(on_change)
+                    finished.callback(self._get_rate_result(
+                        rate, first_row, finished_at, cost_getter))
+
+        self.job_table.add_listener(on_change)
+        starts = itertools.islice(ConstantArrivals(rate), count)
+        created = self._create_jobs(filepaths, starts, upload=upload)
+        return created.addCallback(lambda _: finished)
+
+    def _get_rate_result(self, rate, first_row, finished_at, cost_getter):
+        rows = range(first_row, len(self.job_table))
+        total_times = [self.job_table.get(row, 'total_time') for row in rows]
+        total_times = [t for t in total_times if isinstance(t, float)]
+        statuses = [self.job_table.get(row, 'status') for row in rows]
+
+        # jobs finish as fast as they start, unless they queue up
+        span = finished_at[-1] - finished_at[0] if finished_at else 0
+        throughput = (len(finished_at) - 1) / span if span else 0
+
+        # a growing queue increases the latency of later jobs
+        latency_growth = None
+        third = len(total_times) // 3
+        if third and percentile(total_times[:third], 50):
+            latency_growth = (percentile(total_times[-third:], 50) /
+                              percentile(total_times[:third], 50))
+
+        cost_per_image = None
+        if cost_getter is not None:
+            try:
+                _, _, total_cost = cost_getter.finish()
+                cost_per_image = float(total_cost) / len(rows)
+            except Exception as err:  # pylint: disable=broad-except
+                self.logger.error('Encountered %s while getting cost data: %s',
+                                  type(err).__name__, err)
+
+        return {
+            'rate': rate,
+            'num_jobs': len(rows),
+            'num_failed': statuses.count('failed'),
+            'throughput': throughput,
+            'latency_p50': percentile(total_times, 50),
+            'latency_p99': percentile(total_times, 99),
+            'latency_growth': latency_growth,
+            'cost_per_image': cost_per_image,
+        }
+
 
 class BatchProcessingJobManager(JobManager):
     # pylint: disable=arguments-differ
 
+    def get_journal_key(self, row):
+        # the order of files may change between runs
+        return self.job_table.get(row, 'original_name')
+
     @defer.inlineCallbacks
     def run(self, filepath):
+        """Create a job for each image/zip file in ``filepath``.
+
+        Up to ``upload_concurrency`` files are uploaded at once. Files are
+        discovered as upload slots become free, and each job is started as
+        soon as its file is uploaded.
+        """
         self.logger.info('Benchmarking all image/zip files in `%s`', filepath)
 
-        for f in iter_image_files(filepath):
-            _ = timeit.default_timer()
-            job = self.make_job(f)
-            self.all_jobs.append(job)
-            self.logger.info('Uploading file "%s".', f)
-            uploaded_path = yield job.upload_file()
-            self.logger.info('Uploaded file "%s" in %s seconds.',
-                             f, timeit.default_timer() - _)
-            try:
-                job.filepath = os.path.relpath(
-                    uploaded_path, self.upload_prefix)
-            except ValueError:
-                # relpath on Windows can cause ValuError
-                # if the paths are not on the same drive.
-                # ValueError: path is on mount 'C:', start on mount 'D:'
-                job.filepath = uploaded_path
+        index = None  # skip verifying files verified by previous runs
+        if self.cache_dir:
+            index = FileIndex(os.path.join(self.cache_dir, 'images.sqlite'))
+
+        files = iter_image_files(filepath, index=index,
+                                 processes=self.verify_processes)
+        packs = self._iter_packs(files)
 
-            job.start(delay=self.start_delay)
+        uploads = defer.DeferredSemaphore(self.upload_concurrency)
+        resumed = 0
+        try:
+            while True:
+                yield uploads.acquire()  # wait for a free upload slot
+                # verifying and packing files blocks, so keep the reactor free
+                item = yield threads.deferToThread(next, packs, None)
+                if item is None:
+                    uploads.release()
+                    break
+
+                f, packed_files = item
+                job = self.make_job(f)
+                job.packed_files = packed_files
+
+                if self.resume_job(job, delay=self.start_delay * resumed):
+                    resumed += 1
+                    uploads.release()
+                    continue
+
+                d = self._upload_and_start(job)
+                d.addBoth(lambda _: uploads.release())
+        finally:
+            if index is not None:
+                index.close()
 
         yield self.check_job_status()
+
+    def _iter_packs(self, filepaths):
+        if self.pack_max_files <= 1:  # each file is its own job
+            return ((f, None) for f in filepaths)
+
+        pack_dir = tempfile.mkdtemp(prefix='kiosk_packs_')
+        reactor.addSystemEventTrigger(  # pylint: disable=no-member
+            'after', 'shutdown', shutil.rmtree, pack_dir, True)
+        self.logger.info('Packing up to %s files in each zip archive in %s',
+                         self.pack_max_files, pack_dir)
+        return iter_packs(filepaths, pack_dir,
+                          max_files=self.pack_max_files,
+                          max_bytes=self.pack_max_bytes)
+
+    @defer.inlineCallbacks
+    def _upload_and_start(self, job):
+        self.logger.info('Uploading file "%s".', job.filepath)
+        try:
+            yield job.upload()
+        except Exception as err:  # pylint: disable=broad-except
+            self.logger.error('Could not upload file "%s" due to %s: %s',
+                              job.filepath, type(err).__name__, err)
+            job.reason = 'Upload failed: {}'.format(err)
+            job.status = 'failed'
+            job.is_expired = True  # nothing more to do
+            return
+
+        self.logger.info('Uploaded file "%s" in %s seconds.',
+                         job.original_name, job.client_upload_time)
+        if job.packed_files:
+            os.remove(job.original_name)  # the pack is no longer needed
+        job.start(delay=self.start_delay)
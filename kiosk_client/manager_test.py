@@ -28,17 +28,26 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import json
 import os
 import random
+import threading
+import time
+import zipfile
 
 from PIL import Image
 from twisted.internet import defer
+from twisted.internet import reactor
+from twisted.internet import task
 
 import pytest
 import pytest_twisted
 import requests
 
+from kiosk_client import arrivals
+from kiosk_client import journal
 from kiosk_client import manager
+from kiosk_client import results
 from kiosk_client import settings
 
 
@@ -64,6 +73,19 @@ class TestJobManager(object):
             model='m:0',
             data_scale='1',
             data_label='1')
+        assert mgr.poller is None  # each job polls its own status by default
+        assert mgr.verify_processes == 1  # no worker processes by default
+        assert not mgr.cache_dir  # no caches by default
+        mgr = manager.JobManager(job_type='job', host='localhost',
+                                 poll_batch_size=8)
+        assert mgr.poller.batch_size == 8
+        assert mgr.poller.policy is mgr.polling_policy
+        # jobs polling their own status use the same policy
+        mgr = manager.JobManager(job_type='job', host='localhost',
+                                 adaptive_polling=True, poll_jitter=0.2)
+        assert isinstance(mgr.polling_policy, manager.AdaptivePollingPolicy)
+        assert mgr.polling_policy.jitter == 0.2
+        assert mgr.make_job('image.png').polling_policy is mgr.polling_policy
         # test bad model value
         with pytest.raises(Exception):
             mgr = manager.JobManager(
@@ -95,6 +117,12 @@ class TestJobManager(object):
                 model='m:0',
                 data_scale='1',
                 data_label='1.3')
+        # test bad output_formats value
+        with pytest.raises(ValueError):
+            mgr = manager.JobManager(
+                job_type='job',
+                host='localhost',
+                output_formats=['json', 'csv'])
         # test bad output_dir value
         with pytest.raises(ValueError):
             mgr = manager.JobManager(
@@ -130,7 +158,101 @@ class TestJobManager(object):
         with pytest.raises(RuntimeError):
             mgr._get_host(host)
 
-    def test_make_job(self):
+    @pytest_twisted.inlineCallbacks
+    def test_upload_file(self, tmpdir, mocker):
+        tmpdir = str(tmpdir)
+        bucket = os.path.join(tmpdir, 'bucket')
+        paths = []
+        for filename in ('a.png', 'b.png'):
+            path = os.path.join(tmpdir, filename)
+            with open(path, 'w') as f:
+                f.write('same content')
+            paths.append(path)
+
+        mgr = manager.JobManager(host='localhost', job_type='job',
+                                 storage_bucket='file://' + bucket)
+        dest = yield mgr.upload_file(paths[0])
+        assert dest.endswith('.png') and dest != 'a.png'
+        assert os.path.isfile(os.path.join(bucket, 'uploads', dest))
+
+        dest = yield mgr.upload_file(paths[1], hash_filename=False,
+                                     prefix='output')
+        assert os.path.isfile(os.path.join(bucket, 'output', 'b.png'))
+
+        results = yield mgr.upload_files(paths, prefix='many')
+        assert all(success for success, _ in results)
+        assert len(os.listdir(os.path.join(bucket, 'many'))) == 2
+        assert mgr.get_storage() is mgr.get_storage()  # reused
+
+        # a bucket is required
+        mgr = manager.JobManager(host='localhost', job_type='job')
+        with pytest.raises(ValueError):
+            yield mgr.upload_file(paths[0])
+
+        # concurrent first uploads share a single storage backend
+        created = []
+
+        def slow_get_storage(*_, **__):
+            time.sleep(0.01)
+            created.append(object())
+            return created[-1]
+
+        mocker.patch('kiosk_client.manager.get_storage', slow_get_storage)
+        mgr = manager.JobManager(host='localhost', job_type='job',
+                                 storage_bucket='file://' + bucket)
+        workers = [threading.Thread(target=mgr.get_storage)
+                   for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert len(created) == 1
+        assert mgr.get_storage() is created[0]
+
+    @pytest_twisted.inlineCallbacks
+    def test_upload_file_cache(self, tmpdir):
+        tmpdir = str(tmpdir)
+        bucket = os.path.join(tmpdir, 'bucket')
+        paths = []
+        for filename in ('a.png', 'b.png'):
+            path = os.path.join(tmpdir, filename)
+            with open(path, 'w') as f:
+                f.write('same content')
+            paths.append(path)
+
+        mgr = manager.JobManager(host='localhost', job_type='job',
+                                 storage_bucket='file://' + bucket,
+                                 upload_cache=True,
+                                 verify_cached_uploads=True, cache_dir='')
+        uploads = os.path.join(bucket, 'uploads')
+        dest = yield mgr.upload_file(paths[0])
+        assert (yield mgr.upload_file(paths[1])) == dest
+        assert os.listdir(uploads) == [dest]
+
+        # output files are always uploaded
+        yield mgr.upload_file(paths[1], hash_filename=False)
+        assert sorted(os.listdir(uploads)) == sorted([dest, 'b.png'])
+
+        # cached uploads can only be verified in a bucket
+        with pytest.raises(ValueError):
+            manager.JobManager(host='localhost', job_type='job',
+                               upload_cache=True, verify_cached_uploads=True)
+
+        # uploads that no longer exist are uploaded again
+        os.remove(os.path.join(uploads, dest))
+        new_dest = yield mgr.upload_file(paths[1])
+        assert new_dest != dest
+        assert sorted(os.listdir(uploads)) == sorted([new_dest, 'b.png'])
+
+        # without a cache, each file is uploaded
+        mgr = manager.JobManager(host='localhost', job_type='job',
+                                 storage_bucket='file://' + bucket)
+        assert mgr.upload_cache is None
+        yield mgr.upload_file(paths[0])
+        yield mgr.upload_file(paths[0])
+        assert len(os.listdir(uploads)) == 4
+
+    def test_make_job(self, mocker):
         mgr = manager.JobManager(
             job_type='job',
             host='localhost',
@@ -145,6 +267,24 @@ class TestJobManager(object):
         assert j1.data_label == mgr.data_label == j2.data_label
 
         assert j1.json() == j2.json()
+        assert j1.redis is mgr.redis is None
+        assert j1.metrics is mgr.metrics is None  # not served
+
+        # record metrics if they are served
+        listen = mocker.patch('kiosk_client.manager.listen_metrics')
+        mgr = manager.JobManager(job_type='job', host='localhost',
+                                 metrics_port=9100)
+        listen.assert_called_once_with(mgr.metrics, 9100)
+        assert mgr.make_job('test.png').metrics is mgr.metrics
+
+        # read jobs directly from redis
+        mgr = manager.JobManager(job_type='job', host='localhost',
+                                 redis_host='redis', redis_port=6380,
+                                 redis_batch_size=10)
+        assert mgr.redis.host == 'redis'
+        assert mgr.redis.port == 6380
+        assert mgr.redis.batch_size == 10
+        assert mgr.make_job('test.png').redis is mgr.redis
 
     def test_get_completed_job_count(self):
         mgr = manager.JobManager(host='localhost', job_type='job')
@@ -152,7 +292,7 @@ class TestJobManager(object):
         j1 = mgr.make_job('test.png')
         j2 = mgr.make_job('test.png')
 
-        mgr.all_jobs = [j1, j2]
+        assert mgr.all_jobs == [j1, j2]
 
         j1.status = 'new'
         j2.status = 'new'
@@ -203,20 +343,88 @@ class TestJobManager(object):
                                  calculate_cost=True,
                                  output_dir=str(tmpdir))
 
-        fakejson = lambda: {'output_url': 'example.com/json.txt'}
-        mgr.all_jobs = [Bunch(output_url='example.com/a.txt', json=fakejson),
-                        Bunch(output_url='example.com/b.txt', json=fakejson)]
+        for name in ('a.txt', 'b.txt'):
+            j = mgr.make_job(name)
+            j.output_url = 'example.com/{}'.format(name)
 
         # monkey-patches for testing
         mgr.cost_getter.finish = lambda: (1, 2, 3)
         mgr.upload_file = fake_upload_file
         mgr.summarize()
 
+        outputs = [f for f in os.listdir(str(tmpdir)) if f.endswith('.json')]
+        assert len(outputs) == 1
+        with open(os.path.join(str(tmpdir), outputs[0])) as f:
+            data = json.load(f)
+        assert data['num_jobs'] == 2
+        assert data['total_node_and_networking_costs'] == 3
+        assert [d['download_url'] for d in data['job_data']] == [
+            'example.com/a.txt', 'example.com/b.txt']
+
         # test Exceptions
         mgr.cost_getter.finish = lambda: 0 / 1
         mgr.upload_file = fake_upload_file_bad
         mgr.summarize()
 
+    def test_summarize_jsonl(self, tmpdir):
+        outdir = str(tmpdir)
+        mgr = manager.JobManager(host='localhost', job_type='job',
+                                 output_dir=outdir,
+                                 output_formats=['jsonl'])
+
+        uploaded = []
+        mgr.upload_file = lambda path, **_: uploaded.append(path)
+
+        jobs = [mgr.make_job(name) for name in ('a.png', 'b.png', 'c.png')]
+        path = mgr.results_writer.path
+
+        # each job is written as soon as it is expired
+        jobs[1].is_expired = True
+        records, summary = results.read_jsonl(path)
+        assert [r['input_file'] for r in records] == ['b.png']
+        assert not summary
+
+        jobs[0].is_expired = True
+        jobs[2].is_expired = True
+        mgr.summarize()
+        records, summary = results.read_jsonl(path)
+        assert [r['input_file'] for r in records] == [
+            'b.png', 'a.png', 'c.png']
+        assert summary['num_jobs'] == 3
+
+        # no JSON file is written
+        assert os.listdir(outdir) == [os.path.basename(path)]
+        assert not uploaded
+
+        # both formats
+        mgr = manager.JobManager(host='localhost', job_type='job',
+                                 output_dir=outdir, upload_results=True,
+                                 output_formats=['json', 'jsonl'])
+        mgr.upload_file = lambda path, **_: uploaded.append(path)
+        mgr.summarize()
+        assert len(uploaded) == 2
+        assert {os.path.splitext(p)[-1] for p in uploaded} == {
+            '.json', '.jsonl'}
+
+    def test_summarize_npz(self, tmpdir):
+        outdir = str(tmpdir)
+        mgr = manager.JobManager(host='localhost', job_type='job',
+                                 output_dir=outdir,
+                                 output_formats=['npz'])
+        for name in ('a.png', 'b.png'):
+            j = mgr.make_job(name)
+            j.status = 'done'
+            j.total_time = 2
+        mgr.summarize()
+
+        outputs = os.listdir(outdir)
+        assert len(outputs) == 1
+        assert outputs[0].endswith('.npz')
+        records, summary = results.read_npz(os.path.join(outdir, outputs[0]))
+        assert [r['input_file'] for r in records] == ['a.png', 'b.png']
+        assert [r['total_time'] for r in records] == [2, 2]
+        assert summary['num_jobs'] == 2
+
     @pytest_twisted.inlineCallbacks
     def test_check_job_status(self):
         mgr = manager.JobManager(
@@ -251,6 +459,60 @@ class TestJobManager(object):
         assert _status_counter == len(mgr.all_jobs)
         assert _is_stopped
 
+    def test_resume_job(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'journal.jsonl')
+
+        with pytest.raises(ValueError):
+            manager.JobManager(host='localhost', job_type='job', resume=True)
+
+        mgr = manager.JobManager(host='localhost', job_type='job',
+                                 journal=path)
+        assert not mgr.resume_job(mgr.make_job('a.png'))  # not resuming
+
+        # finished
+        j = mgr.all_jobs[0]
+        j.filepath = 'uploaded/a.png'
+        j.job_id = 'a'
+        j.status = 'done'
+        j.total_time = '3'
+        j.is_expired = True
+
+        # unfinished
+        j = mgr.make_job('b.png')
+        j.job_id = 'b'
+        j.status = 'new'
+
+        # never created
+        mgr.make_job('c.png')
+        mgr.summarize()
+
+        mgr = manager.JobManager(host='localhost', job_type='job',
+                                 journal=path, resume=True)
+        assert set(mgr.resumed_jobs) == {0, 1}
+
+        started = []
+
+        jobs = [mgr.make_job(f) for f in ('a.png', 'b.png', 'c.png')]
+        jobs[1].resume = lambda delay=0: started.append(jobs[1])
+
+        assert [mgr.resume_job(j) for j in jobs] == [True, True, False]
+        assert started == [jobs[1]]
+
+        assert jobs[0].is_expired
+        assert jobs[0].filepath == 'uploaded/a.png'
+        assert jobs[0].json()['total_time'] == 3
+        assert jobs[0].status == 'done'
+        assert jobs[1].job_id == 'b'
+        assert jobs[1].status == 'new'
+        assert not jobs[1].is_expired
+        assert jobs[2].job_id is None
+
+        # the restored jobs are recorded in the new journal
+        mgr.summarize()
+        states = journal.Journal.load(path)
+        assert states[0]['expired']
+        assert states[1]['status'] == 'new'
+
 
 class TestBenchmarkingJobManager(object):
 
@@ -290,6 +552,357 @@ class TestBenchmarkingJobManager(object):
 
         yield mgr.run(valid_image, count=2, upload=False)
 
+    @pytest_twisted.inlineCallbacks
+    def test_run_progress(self, mocker):
+        mocker.patch('requests.get', dummy_ssl_redirect)
+        mgr = manager.BenchmarkingJobManager(host='localhost', job_type='job',
+                                             start_delay=1, schedule_window=0)
+        mgr.refresh_rate = 0.01
+        checks = []
+
+        def make_job(*args, **kwargs):
+            j = manager.JobManager.make_job(mgr, *args, **kwargs)
+            j.start = lambda delay, upload=False: None
+            return j
+
+        mgr.make_job = make_job
+        mgr.check_job_status = lambda: checks.append('done')
+        mgr.sleep = lambda seconds: task.deferLater(reactor, 0.05, id, None)
+        mgr.get_completed_job_count = lambda: checks.append('progress')
+
+        # progress is checked while the jobs are being created
+        yield mgr.run('image.png', count=3)
+        assert checks[-1] == 'done'
+        assert 'progress' in checks[:-1]
+
+    @pytest_twisted.inlineCallbacks
+    def test_run_arrivals(self, mocker):
+        mocker.patch('requests.get', dummy_ssl_redirect)
+        mgr = manager.BenchmarkingJobManager(host='localhost', job_type='job',
+                                             start_delay=0.5)
+        delays, sleeps = [], []
+
+        def make_job(*args, **kwargs):
+            j = manager.JobManager.make_job(mgr, *args, **kwargs)
+            j.start = lambda delay, upload=False: delays.append(delay)
+            return j
+
+        mgr.make_job = make_job
+        mgr.check_job_status = lambda: True
+        mgr.sleep = sleeps.append
+        mgr.get_completed_job_count = lambda: True
+
+        # default to start_delay
+        yield mgr.run('image.png', count=3)
+        assert delays == [0, 0.5, 0]  # jobs are created a second ahead
+        assert sleeps == [0, pytest.approx(1, abs=0.1)]
+        assert mgr.arrivals.describe() == {'name': 'constant', 'rate': 2}
+
+        del delays[:], sleeps[:]
+        yield mgr.run('image.png', count=4,
+                      arrivals=arrivals.BurstArrivals(rate=1, burst_size=2))
+        assert delays == [0, 0, 0, 0]
+        assert sleeps == [0, pytest.approx(2, abs=0.1)]
+
+        # the number of jobs waiting to start is bounded
+        del delays[:], sleeps[:]
+        mgr.max_pending_jobs = 2
+        yield mgr.run('image.png', count=5,
+                      arrivals=arrivals.ConstantArrivals(rate=10))
+        assert delays == pytest.approx([0, 0.1, 0, 0.1, 0])
+        assert len(sleeps) == 3
+
+        # uploads are started as each job arrives
+        del delays[:], sleeps[:]
+        yield mgr.run('image.png', count=4, upload=True,
+                      arrivals=arrivals.BurstArrivals(rate=1, burst_size=2))
+        assert delays == [0] * 4
+        assert sleeps == [0, 0, 2, 0]
+
+    @pytest_twisted.inlineCallbacks
+    def test_run_staged(self, mocker):
+        mocker.patch('requests.get', dummy_ssl_redirect)
+        mgr = manager.BenchmarkingJobManager(host='localhost', job_type='job',
+                                             stage_uploads=2)
+        uploads, started = [], []
+
+        def dummy_upload(job):
+            uploads.append(job)
+            return defer.succeed('uploads/copy{}.png'.format(len(uploads)))
+
+        def make_job(*args, **kwargs):
+            j = manager.JobManager.make_job(mgr, *args, **kwargs)
+            j.start = lambda delay, upload=False: started.append(upload)
+            return j
+
+        mocker.patch('kiosk_client.job.Job.upload', dummy_upload)
+        mgr.make_job = make_job
+        mgr.check_job_status = lambda: True
+        mgr.sleep = lambda x: True
+        created_at = mgr.created_at
+
+        yield mgr.run('image.png', count=3, upload=True)
+        assert len(uploads) == 2
+        assert started == [False] * 3  # jobs do not upload again
+        assert [j.filepath for j in mgr.all_jobs] == [
+            'uploads/copy1.png', 'uploads/copy2.png', 'uploads/copy1.png']
+        assert mgr.staging_results['copies'] == 2
+        assert mgr.created_at > created_at
+
+        # no more copies than jobs
+        del uploads[:]
+        yield mgr.run('image.png', count=1, upload=True)
+        assert len(uploads) == 1
+
+        # failed uploads stop the benchmark
+        def fail_upload(job):
+            return defer.fail(RuntimeError('upload failed'))
+
+        mocker.patch('kiosk_client.job.Job.upload', fail_upload)
+        with pytest.raises(defer.FirstError):
+            yield mgr.run('image.png', count=3, upload=True)
+
+    @pytest_twisted.inlineCallbacks
+    def test_run_closed_loop(self, mocker):
+        mocker.patch('requests.get', dummy_ssl_redirect)
+        mgr = manager.BenchmarkingJobManager(host='localhost', job_type='job')
+        running, peak = [], [0]
+
+        def make_job(*args, **kwargs):
+            j = manager.JobManager.make_job(mgr, *args, **kwargs)
+
+            def dummy_start(delay, upload=False):
+                j.job_id = 'job{}'.format(j._row)
+                j.status = 'new'
+                running.append(j)
+                peak[0] = max(peak[0], len(running))
+
+            j.start = dummy_start
+            return j
+
+        def finish(job, status='done'):
+            running.remove(job)
+            job.total_time = float(job._row)
+            job.status = status  # starts the next job
+            job.is_expired = True
+
+        mgr.make_job = make_job
+        mgr.check_job_status = lambda: True
+
+        d = mgr.run_closed_loop('image.png', count=5, concurrency=[2, 3])
+        while running:
+            assert not d.called
+            finish(running[0], status=random.choice(['done', 'failed']))
+        yield d
+
+        assert len(mgr.all_jobs) == 10
+        assert peak[0] == 3
+        results = mgr.concurrency_results
+        assert [r['concurrency'] for r in results] == [2, 3]
+        assert [r['num_jobs'] for r in results] == [5, 5]
+        assert results[0]['latency_p50'] == 2
+        assert results[1]['latency_p50'] == 7
+        assert all(r['throughput'] > 0 for r in results)
+
+        # more concurrency than jobs
+        d = mgr.run_closed_loop('image.png', count=2, concurrency=4)
+        assert len(running) == 2
+        finish(running[0])
+        assert not d.called
+        finish(running[0])
+        yield d
+        assert mgr.concurrency_results[-1]['num_jobs'] == 2
+
+        with pytest.raises(ValueError):
+            yield mgr.run_closed_loop('image.png', count=2, concurrency=0)
+
+    @pytest_twisted.inlineCallbacks
+    def test_find_capacity(self, mocker):
+        mocker.patch('requests.get', dummy_ssl_redirect)
+        mgr = manager.BenchmarkingJobManager(host='localhost', job_type='job',
+                                             schedule_window=2)
+        clock = [0.]
+        mocker.patch.object(manager, 'timeit',
+                            Bunch(default_timer=lambda: clock[0]))
+        started = []
+
+        def make_job(*args, **kwargs):
+            j = manager.JobManager.make_job(mgr, *args, **kwargs)
+
+            def dummy_start(delay, upload=False):
+                started.append((clock[0] + delay, j))
+
+            j.start = dummy_start
+            return j
+
+        def serve(capacity):
+            # a single queue serving ``capacity`` jobs per second
+            free_at = 0
+            while started:
+                arrival, job = started.pop(0)
+                free_at = max(arrival, free_at) + 1 / capacity
+                clock[0] = free_at
+                job.total_time = free_at - arrival
+                job.status = 'done'
+                job.is_expired = True  # may start the next rate
+
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        mgr.make_job = make_job
+        mgr.sleep = sleep
+        mgr.check_job_status = lambda: True
+
+        d = mgr.find_capacity('image.png', count=10, rate=1)
+        serve(capacity=5)
+        yield d
+
+        # within the default tolerance of 10% of the capacity
+        results = mgr.capacity_results
+        assert results['capacity'] == 5.5
+        assert results['throughput'] == pytest.approx(5)
+        assert [s['rate'] for s in results['steps']] == [
+            1, 2, 4, 8, 6, 5, 5.5]
+        assert [s['sustainable'] for s in results['steps']] == [
+            True, True, True, False, False, True, True]
+        assert results['steps'][2]['latency_p50'] == pytest.approx(0.2)
+        assert results['steps'][3]['latency_growth'] > 2
+        assert len(mgr.all_jobs) == 70
+        # jobs are created a schedule window at a time
+        assert sleeps[:4] == [0, 2, 2, 2]
+
+        # never exceed the maximum rate
+        d = mgr.find_capacity('image.png', count=10, rate=1, max_rate=3)
+        serve(capacity=100)
+        yield d
+        results = mgr.capacity_results
+        assert [s['rate'] for s in results['steps']] == [1, 2, 3]
+        assert results['capacity'] == 3
+
+        # failed jobs are not sustainable
+        d = mgr.find_capacity('image.png', count=10, rate=1, max_steps=1)
+        while started:
+            _, job = started.pop(0)
+            job.status = 'failed'
+            job.is_expired = True
+        yield d
+        assert mgr.capacity_results['capacity'] is None
+
+        with pytest.raises(ValueError):
+            yield mgr.find_capacity('image.png', count=2)
+
+        with pytest.raises(ValueError):
+            yield mgr.find_capacity('image.png', count=3, rate=0)
+
+    @pytest_twisted.inlineCallbacks
+    def test_soak(self, tmpdir, mocker):
+        mocker.patch('requests.get', dummy_ssl_redirect)
+        outdir = str(tmpdir)
+        mgr = manager.BenchmarkingJobManager(host='localhost', job_type='job',
+                                             output_dir=outdir, start_delay=1)
+        clock = [0.]
+        mocker.patch.object(manager, 'timeit',
+                            Bunch(default_timer=lambda: clock[0]))
+        running, peak = [], [0]
+
+        def make_job(*args, **kwargs):
+            j = manager.JobManager.make_job(mgr, *args, **kwargs)
+
+            def dummy_start(delay, upload=False):
+                j.job_id = 'job{}'.format(clock[0])
+                j.status = 'done'
+                running.append(j)
+
+            j.start = dummy_start
+            peak[0] = max(peak[0], len(mgr.job_table))
+            return j
+
+        def sleep(seconds):
+            clock[0] += seconds
+            while running:  # jobs expire at the next wake up
+                running.pop(0).is_expired = True
+            if clock[0] >= 10 and not mgr.segment:
+                mgr.roll_results()
+
+        mgr.make_job = make_job
+        mgr.sleep = sleep
+        mgr._stop = lambda: None
+
+        yield mgr.soak('image.png', duration=20)
+
+        # the rows of expired jobs are reused
+        assert mgr.num_evicted == 20
+        assert peak[0] <= 2
+        assert len(mgr.job_table) == mgr.job_table.count_released()
+        assert not any(mgr.all_jobs)
+
+        # each file has the jobs that expired while it was written
+        outputs = sorted(os.listdir(outdir), key=lambda f: 'part1' in f)
+        assert len(outputs) == 2
+        assert all(f.endswith('.jsonl') for f in outputs)
+        first, second = [results.read_jsonl(os.path.join(outdir, f))
+                         for f in outputs]
+        assert first[1]['segment'] == 0
+        assert second[1]['segment'] == 1
+        assert first[1]['num_jobs'] == len(first[0]) == 10
+        assert second[1]['num_jobs'] == len(second[0]) == 10
+        assert second[1]['time_elapsed'] == 19  # until the last expired
+        assert first[0][0]['job_id'] == 'job0.0'
+        assert second[0][-1]['job_id'] == 'job19.0'
+
+        with pytest.raises(ValueError):
+            yield mgr.soak('image.png', duration=0)
+
+        with pytest.raises(ValueError):
+            yield mgr.soak('image.png', duration=1, roll_interval=0)
+
+        # jobs started all at once would never stop
+        with pytest.raises(ValueError):
+            yield mgr.soak('image.png', duration=1,
+                           arrivals=arrivals.ConstantArrivals(float('inf')))
+
+        mgr.journal = journal.Journal(os.path.join(outdir, 'journal.jsonl'))
+        with pytest.raises(ValueError):
+            yield mgr.soak('image.png', duration=1)
+
+    @pytest_twisted.inlineCallbacks
+    def test_run_resume(self, tmpdir, mocker):
+        mocker.patch('requests.get', dummy_ssl_redirect)
+        path = os.path.join(str(tmpdir), 'journal.jsonl')
+        mgr = manager.BenchmarkingJobManager(host='localhost', job_type='job',
+                                             journal=path)
+        for job_id in ('a', 'b'):
+            j = mgr.make_job('image.png')
+            j.job_id = job_id
+            j.status = 'done'
+            j.is_expired = True
+        mgr.summarize()
+
+        for upload in (False, True):
+            mgr = manager.BenchmarkingJobManager(
+                host='localhost', job_type='job', journal=path, resume=True,
+                start_delay=10)
+            started, sleeps = [], []
+
+            def make_job(*args, **kwargs):
+                j = manager.JobManager.make_job(mgr, *args, **kwargs)
+                j.start = lambda delay, upload=False: started.append(j)
+                return j
+
+            mgr.make_job = make_job
+            mgr.check_job_status = lambda: True
+            mgr.sleep = sleeps.append
+
+            yield mgr.run('image.png', count=4, upload=upload)
+            assert len(mgr.all_jobs) == 4
+            assert started == mgr.all_jobs[2:]
+            assert all(j.is_expired for j in mgr.all_jobs[:2])
+            # resumed jobs do not wait for their original start times
+            assert sum(sleeps) <= 10
+
 
 class TestBatchProcessingJobManager(object):
 
@@ -299,7 +912,8 @@ class TestBatchProcessingJobManager(object):
         mocker.patch('requests.get', dummy_ssl_redirect)
         mgr = manager.BatchProcessingJobManager(
             host='localhost',
-            job_type='job')
+            job_type='job',
+            cache_dir=os.path.join(tmpdir, 'cache'))
 
         # pylint: disable=unused-argument
         def dummy_upload_file(filepath, **kwargs):
@@ -333,3 +947,134 @@ class TestBatchProcessingJobManager(object):
             valid_images.append(valid_image)
 
         yield mgr.run(tmpdir)
+        assert os.path.isfile(os.path.join(tmpdir, 'cache', 'images.sqlite'))
+
+    @pytest_twisted.inlineCallbacks
+    def test_run_upload_concurrency(self, tmpdir, mocker):
+        tmpdir = str(tmpdir)
+        mocker.patch('requests.get', dummy_ssl_redirect)
+        mgr = manager.BatchProcessingJobManager(
+            host='localhost', job_type='job', upload_concurrency=2,
+            verify_processes=2, cache_dir='')
+        uploads, started = [], []
+
+        def make_job(*args, **kwargs):
+            j = manager.JobManager.make_job(mgr, *args, **kwargs)
+
+            def dummy_upload_file():
+                d = defer.Deferred()
+                uploads.append((j, d))
+                return d
+
+            j.upload_file = dummy_upload_file
+            j.start = lambda delay, upload=False: started.append(j)
+            return j
+
+        mgr.make_job = make_job
+        mgr.check_job_status = lambda: True
+
+        for i in range(5):
+            img = Image.new('RGB', (8, 8), (255, 255, 255))
+            img.save(os.path.join(tmpdir, 'image%s.png' % i), 'PNG')
+
+        @defer.inlineCallbacks
+        def wait_for_uploads(count):
+            # files are verified in a thread, keeping the reactor free
+            for _ in range(500):
+                if len(uploads) >= count:
+                    break
+                yield task.deferLater(reactor, 0.01, lambda: None)
+            yield task.deferLater(reactor, 0.05, lambda: None)
+            assert len(uploads) == count
+
+        d = mgr.run(tmpdir)
+        yield wait_for_uploads(2)
+        assert len(mgr.all_jobs) == 2  # bounded uploads
+
+        j, upload = uploads.pop(0)
+        j.upload_size, j.client_upload_time = 100., 2.
+        upload.callback('uploads/image.png')
+        assert started == [j]
+        assert j.filepath == 'image.png'
+        yield wait_for_uploads(2)  # the next file is uploading
+
+        j, upload = uploads.pop(0)
+        upload.errback(Exception('upload failed'))
+        assert j.is_expired and j.status == 'failed'
+
+        for remaining in (2, 2, 1):  # no more files after the 5th
+            yield wait_for_uploads(remaining)
+            j, upload = uploads.pop(0)
+            j.upload_size, j.client_upload_time = 300., 2.
+            upload.callback(j.original_name)
+        yield d
+
+        assert len(started) == 4
+        results = mgr.get_upload_results()
+        assert results['num_files'] == 4
+        assert results['total_bytes'] == 1000
+        assert results['bytes_per_second_p50'] == 150
+        assert results['upload_concurrency'] == 2
+
+        # files reused from the upload cache are not counted
+        j = manager.JobManager.make_job(mgr, 'cached.png')
+        j.upload_size, j.client_upload_time = 0, 0
+        assert mgr.get_upload_results() == results
+
+    @pytest_twisted.inlineCallbacks
+    def test_run_packed(self, tmpdir, mocker):
+        tmpdir = str(tmpdir)
+        mocker.patch('requests.get', dummy_ssl_redirect)
+        mgr = manager.BatchProcessingJobManager(
+            host='localhost', job_type='job', cache_dir='',
+            verify_processes=1, pack_max_files=2, output_dir=tmpdir)
+        packs = []
+
+        def make_job(*args, **kwargs):
+            j = manager.JobManager.make_job(mgr, *args, **kwargs)
+
+            def dummy_upload_file():
+                if j.original_name.endswith('.zip'):
+                    with zipfile.ZipFile(j.original_name) as archive:
+                        packs.append(archive.namelist())
+                return j.original_name
+
+            j.upload_file = dummy_upload_file
+            j.start = lambda delay, upload=False: True
+            return j
+
+        mgr.make_job = make_job
+        mgr.check_job_status = lambda: True
+
+        image_dir = os.path.join(tmpdir, 'images')
+        os.makedirs(image_dir)
+        for i in range(5):
+            img = Image.new('RGB', (8, 8), (255, 255, 255))
+            img.save(os.path.join(image_dir, 'image%s.png' % i), 'PNG')
+
+        yield mgr.run(image_dir)
+        assert len(mgr.all_jobs) == 3
+        assert len(packs) == 2
+        assert all(len(p) == 2 for p in packs)
+        packed = [j.packed_files for j in mgr.all_jobs]
+        assert packed[:2] == [[os.path.join(image_dir, n[6:]) for n in p]
+                              for p in packs]
+        assert packed[2] is None  # the last file is not packed
+        # packs are removed once uploaded
+        assert not any(os.path.exists(j.original_name)
+                       for j in mgr.all_jobs[:2])
+
+        mgr.summarize()
+        outputs = [f for f in os.listdir(tmpdir) if f.endswith('.json')]
+        with open(os.path.join(tmpdir, outputs[0])) as f:
+            summary = json.load(f)
+        assert summary['num_jobs'] == 3
+        assert summary['num_files'] == 5
+        assert summary['job_data'][0]['packed_files'] == packed[0]
+
+    def test_packed_resume(self, tmpdir, mocker):
+        mocker.patch('requests.get', dummy_ssl_redirect)
+        with pytest.raises(ValueError):
+            manager.BatchProcessingJobManager(
+                host='localhost', job_type='job', pack_max_files=10,
+                journal=os.path.join(str(tmpdir), 'journal'), resume=True)
@@ -0,0 +1,297 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Expose live client metrics in the Prometheus text format"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import bisect
+import threading
+
+from twisted.internet import reactor
+from twisted.web import resource
+from twisted.web import server
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = []
+    for name, value in labels:
+        value = str(value).replace('\\', r'\\')
+        value = value.replace('\n', r'\n').replace('"', r'\"')
+        escaped.append('{}="{}"'.format(name, value))
+    return '{{{}}}'.format(','.join(escaped))
+
+
+class Metric(object):
+    """A named metric with one value per combination of label values.
+
+    Args:
+        name (str): the name of the metric.
+        documentation (str): the help text of the metric.
+        labelnames (tuple): the names of the labels of each value.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values -> value
+        self._lock = threading.Lock()  # uploads run in threads
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError('Expected labels {} for metric {}, got {}.'.format(
+                ', '.join(self.labelnames), self.name,
+                ', '.join(sorted(labels))))
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def get(self, **labels):
+        """Get the current value with the given labels."""
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        """Yield each ``(suffix, labels, value)`` of the metric."""
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield '', tuple(zip(self.labelnames, key)), value
+
+    def render(self):
+        """Render the metric in the Prometheus text format."""
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} {}'.format(self.name, self.kind),
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append('{}{}{} {}'.format(
+                self.name, suffix, _format_labels(labels),
+                _format_value(value)))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """A value that only increases."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError('Counters can only be increased.')
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that can go up and down.
+
+    If ``function`` is given, it is called on every scrape and returns the
+    value of the gauge, or a dict of values by label value if the gauge has
+    labels.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super(Gauge, self).__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.function is None:
+            for sample in super(Gauge, self).samples():
+                yield sample
+            return
+
+        values = self.function()
+        if not self.labelnames:
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            if not isinstance(key, tuple):
+                key = (key,)
+            yield '', tuple(zip(self.labelnames, map(str, key))), value
+
+
+class Histogram(Metric):
+    """Count observed values in cumulative buckets.
+
+    Args:
+        buckets (list): the upper bound of each bucket, in increasing order.
+    """
+
+    kind = 'histogram'
+
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                       1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        buckets = sorted(float(b) for b in (buckets or self.default_buckets))
+        if buckets[-1] != float('inf'):
+            buckets.append(float('inf'))
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def get(self, **labels):
+        """Get the number of observed values with the given labels."""
+        value = self._values.get(self._key(labels))
+        return sum(value[0]) if value else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((k, (list(c), t))
+                            for k, (c, t) in self._values.items())
+        for key, (counts, total) in values:
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield '_bucket', labels + (('le', _format_value(bound)),), \
+                    cumulative
+            yield '_count', labels, cumulative
+            yield '_sum', labels, total
+
+
+class ClientMetrics(object):
+    """The metrics recorded by the client during a run.
+
+    Args:
+        namespace (str): the prefix of the name of each metric.
+    """
+
+    def __init__(self, namespace='kiosk_client'):
+        def name(suffix):
+            return '{}_{}'.format(namespace, suffix)
+
+        self.jobs_created = Counter(
+            name('jobs_created_total'), 'Jobs created.')
+        self.jobs_finished = Counter(
+            name('jobs_finished_total'), 'Jobs finished with status done.')
+        self.jobs_failed = Counter(
+            name('jobs_failed_total'), 'Jobs finished with status failed.')
+        self.jobs = Gauge(
+            name('jobs'), 'Jobs with each status.', ('status',),
+            function=self._count_statuses)
+        self.request_latency = Histogram(
+            name('api_request_seconds'), 'Latency of API requests.',
+            ('endpoint',))
+        self.request_retries = Counter(
+            name('api_request_retries_total'), 'Retried requests.',
+            ('endpoint',))
+        self.uploaded_bytes = Counter(
+            name('uploaded_bytes_total'), 'Bytes of files uploaded.')
+        self.downloaded_bytes = Counter(
+            name('downloaded_bytes_total'), 'Bytes of results downloaded.')
+
+        self.metrics = [
+            self.jobs_created,
+            self.jobs_finished,
+            self.jobs_failed,
+            self.jobs,
+            self.request_latency,
+            self.request_retries,
+            self.uploaded_bytes,
+            self.downloaded_bytes,
+        ]
+
+        self._table = None
+        self._statuses = set()  # report 0 once no job has a status
+
+    def watch(self, table):
+        """Count the jobs created and finished in the ``JobTable``."""
+        self._table = table
+        table.add_listener(self._on_change)
+
+    def _on_change(self, row, field, old, new):  # pylint: disable=W0613
+        if field == 'job_id' and old is None:
+            self.jobs_created.inc()
+        elif field == 'status' and new == 'done':
+            self.jobs_finished.inc()
+        elif field == 'status' and new == 'failed':
+            self.jobs_failed.inc()
+
+    def _count_statuses(self):
+        counts = {} if self._table is None else self._table.count_statuses()
+        self._statuses.update(counts)
+        return {status: counts.get(status, 0) for status in self._statuses}
+
+    def render(self):
+        """Render all metrics in the Prometheus text format."""
+        return ''.join(m.render() + '\n' for m in self.metrics)
+
+
+class MetricsResource(resource.Resource):
+    """Serve the current metrics to Prometheus."""
+
+    isLeaf = True
+
+    content_type = b'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, metrics):
+        resource.Resource.__init__(self)
+        self.metrics = metrics
+
+    def render_GET(self, request):  # pylint: disable=C0103
+        request.setHeader(b'Content-Type', self.content_type)
+        return self.metrics.render().encode('utf-8')
+
+
+def listen(metrics, port, interface=''):
+    """Serve the metrics at ``/metrics`` on the given port.
+
+    Args:
+        metrics (ClientMetrics): the metrics to serve.
+        port (int): the port to listen on, or 0 for any free port.
+        interface (str): the interface to listen on. Defaults to all.
+
+    Returns:
+        twisted.internet.interfaces.IListeningPort: the listening port.
+    """
+    root = resource.Resource()
+    root.putChild(b'metrics', MetricsResource(metrics))
+    return reactor.listenTCP(port, server.Site(root), interface=interface)
@@ -0,0 +1,135 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Tests for the client metrics"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import pytest
+import pytest_twisted
+import treq
+
+from kiosk_client import metrics
+from kiosk_client.store import JobTable
+
+
+class TestMetrics(object):
+
+    def test_counter(self):
+        c = metrics.Counter('requests_total', 'Requests.', ('endpoint',))
+        c.inc(endpoint='/a')
+        c.inc(2, endpoint='/b')
+        c.inc(endpoint='/a')
+        assert c.get(endpoint='/a') == 2
+        assert c.get(endpoint='/c') == 0
+        assert c.render() == '\n'.join([
+            '# HELP requests_total Requests.',
+            '# TYPE requests_total counter',
+            'requests_total{endpoint="/a"} 2.0',
+            'requests_total{endpoint="/b"} 2.0',
+        ])
+
+        with pytest.raises(ValueError):
+            c.inc(-1, endpoint='/a')
+
+        with pytest.raises(ValueError):
+            c.inc(status='done')
+
+        # label values are escaped
+        c.inc(endpoint='"\n')
+        assert 'requests_total{endpoint="\\"\\n"} 1.0' in c.render()
+
+    def test_gauge(self):
+        g = metrics.Gauge('temperature', 'Temperature.')
+        g.set(3)
+        g.set(1.5)
+        assert g.get() == 1.5
+        assert g.render().endswith('\ntemperature 1.5')
+
+        g = metrics.Gauge('answer', 'Answer.', function=lambda: 42)
+        assert g.render().endswith('\nanswer 42.0')
+
+        counts = {'done': 1, 'new': 2}
+        g = metrics.Gauge('jobs', 'Jobs.', ('status',), function=lambda: counts)
+        assert g.render().endswith('\njobs{status="done"} 1.0\n'
+                                   'jobs{status="new"} 2.0')
+
+    def test_histogram(self):
+        h = metrics.Histogram('latency', 'Latency.', buckets=[1, 2])
+        for value in (0.5, 1, 1.5, 3):
+            h.observe(value)
+        assert h.get() == 4
+        assert h.render() == '\n'.join([
+            '# HELP latency Latency.',
+            '# TYPE latency histogram',
+            'latency_bucket{le="1.0"} 2.0',
+            'latency_bucket{le="2.0"} 3.0',
+            'latency_bucket{le="+Inf"} 4.0',
+            'latency_count 4.0',
+            'latency_sum 6.0',
+        ])
+
+    def test_client_metrics(self):
+        table = JobTable()
+        client_metrics = metrics.ClientMetrics(namespace='test')
+        client_metrics.watch(table)
+
+        rows = [table.append() for _ in range(3)]
+        for row in rows:
+            table.set(row, 'job_id', 'job{}'.format(row))
+            table.set(row, 'status', 'new')
+        table.set(rows[0], 'status', 'done')
+        table.set(rows[1], 'status', 'failed')
+
+        assert client_metrics.jobs_created.get() == 3
+        assert client_metrics.jobs_finished.get() == 1
+        assert client_metrics.jobs_failed.get() == 1
+        text = client_metrics.render()
+        assert 'test_jobs{status="new"} 1.0' in text
+
+        # statuses are still reported once no job has them
+        table.set(rows[2], 'status', 'done')
+        assert 'test_jobs{status="new"} 0.0' in client_metrics.render()
+        assert client_metrics.jobs_finished.get() == 2
+
+    @pytest_twisted.inlineCallbacks
+    def test_listen(self):
+        client_metrics = metrics.ClientMetrics()
+        client_metrics.uploaded_bytes.inc(10)
+        port = metrics.listen(client_metrics, 0, interface='127.0.0.1')
+        try:
+            url = 'http://127.0.0.1:{}/metrics'.format(port.getHost().port)
+            response = yield treq.get(url)
+            assert response.code == 200
+            assert response.headers.getRawHeaders(b'Content-Type') == [
+                metrics.MetricsResource.content_type]
+            text = yield response.text()
+            assert 'kiosk_client_uploaded_bytes_total 10.0' in text
+
+            response = yield treq.get(url.replace('/metrics', '/other'))
+            assert response.code == 404
+        finally:
+            yield port.stopListening()
@@ -0,0 +1,118 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Pack many small image files into zip archives processed as single jobs"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import zipfile
+
+
+def get_member_name(index, filepath):
+    """Get the name of a file in a pack.
+
+    Names are prefixed with the index of the file, so they are unique and
+    their sorted order is the order of the files in the pack.
+    """
+    return '{:05d}_{}'.format(index, os.path.basename(filepath))
+
+
+def write_pack(path, filepaths):
+    """Write the files to a new zip archive.
+
+    Images are already compressed, so they are stored without compression.
+    """
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as archive:
+        for i, filepath in enumerate(filepaths):
+            archive.write(filepath, get_member_name(i, filepath))
+    return path
+
+
+def iter_packs(filepaths, output_dir, max_files=100, max_bytes=16 << 20):
+    """Group the files into zip archives of at most ``max_files`` files and
+    ``max_bytes`` bytes.
+
+    Zip files and files of at least ``max_bytes`` are not packed, nor is a
+    file that would be alone in its archive.
+
+    Args:
+        filepaths (iterable): the files to pack.
+        output_dir (str): directory of the zip archives.
+        max_files (int): maximum number of files in each archive.
+        max_bytes (int): maximum total size of the files in each archive.
+
+    Yields:
+        tuple: the path of each file to process and the files packed in it,
+            or None if the file is not a pack.
+    """
+    members, size, count = [], 0, 0
+
+    def flush():
+        if len(members) == 1:
+            return members[0], None
+        path = os.path.join(output_dir, 'pack_{:05d}.zip'.format(count))
+        return write_pack(path, members), list(members)
+
+    for filepath in filepaths:
+        filesize = os.path.getsize(filepath)
+        if filepath.lower().endswith('.zip') or filesize >= max_bytes:
+            yield filepath, None
+            continue
+
+        if members and (len(members) >= max_files or
+                        size + filesize > max_bytes):
+            yield flush()
+            members, size, count = [], 0, count + 1
+
+        members.append(filepath)
+        size += filesize
+
+    if members:
+        yield flush()
+
+
+def map_children(record, members):
+    """Map the results of each child of a packed job to its original file.
+
+    The Kiosk reports the results of the children of a zip archive as lists
+    in the order of the archive.
+
+    Args:
+        record (dict): the data of the packed job.
+        members (list): the original path of each file in the pack.
+
+    Returns:
+        list: the data of each file in the pack.
+    """
+    children = []
+    for i, filepath in enumerate(members):
+        child = {'input_file': filepath}
+        for key, value in record.items():
+            if isinstance(value, list) and len(value) == len(members):
+                child[key] = value[i]
+        children.append(child)
+    return children
@@ -0,0 +1,95 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Tests for packing files into zip archives"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import zipfile
+
+from kiosk_client import packing
+
+
+def _make_files(tmpdir, sizes):
+    filepaths = []
+    for i, size in enumerate(sizes):
+        filepath = os.path.join(tmpdir, 'image{}.png'.format(i))
+        with open(filepath, 'wb') as f:
+            f.write(b'x' * size)
+        filepaths.append(filepath)
+    return filepaths
+
+
+def test_iter_packs(tmpdir):
+    tmpdir = str(tmpdir)
+    output_dir = os.path.join(tmpdir, 'packs')
+    os.makedirs(output_dir)
+
+    files = _make_files(tmpdir, [10] * 5 + [100] + [10] * 2)
+    zippath = os.path.join(tmpdir, 'input.zip')
+    zipfile.ZipFile(zippath, 'w').close()
+
+    packs = list(packing.iter_packs(files + [zippath], output_dir,
+                                    max_files=3, max_bytes=50))
+    assert [members for _, members in packs] == [
+        files[0:3],
+        None,  # too large to pack
+        files[3:5] + files[6:7],
+        None,  # already a zip file
+        None,  # alone in the last pack
+    ]
+    assert [path for path, _ in packs][3:] == [zippath, files[7]]
+    assert packs[1][0] == files[5]
+
+    with zipfile.ZipFile(packs[0][0]) as archive:
+        assert archive.namelist() == ['00000_image0.png', '00001_image1.png',
+                                      '00002_image2.png']
+    assert os.path.dirname(packs[0][0]) == output_dir
+    assert len(set(path for path, _ in packs)) == len(packs)
+
+    # files are packed up to the maximum size
+    packs = list(packing.iter_packs(files[:5], output_dir,
+                                    max_files=10, max_bytes=30))
+    assert [members for _, members in packs] == [files[0:3], files[3:5]]
+
+    # a file alone is not packed
+    packs = list(packing.iter_packs(files[:1], output_dir))
+    assert packs == [(files[0], None)]
+
+
+def test_map_children():
+    record = {
+        'input_file': 'pack_00000.zip',
+        'prediction_time': [1., 2.],
+        'total_time': 5.,
+        'predict_retries': [0., 1., 2.],
+    }
+    children = packing.map_children(record, ['a.png', 'b.png'])
+    assert children == [
+        {'input_file': 'a.png', 'prediction_time': 1.},
+        {'input_file': 'b.png', 'prediction_time': 2.},
+    ]
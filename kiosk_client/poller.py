@@ -0,0 +1,277 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Poll the status of many jobs in batches from a single timer"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import bisect
+import collections
+import heapq
+import itertools
+import logging
+import random
+
+from twisted.internet import defer
+from twisted.internet import reactor
+from twisted.internet import task
+
+
+class PollingPolicy(object):
+    """Poll every job at a constant interval, with optional random jitter.
+
+    Args:
+        update_interval (float): seconds between each job status request.
+        jitter (float): randomly scale each interval by up to this fraction
+            to avoid synchronized bursts of requests.
+        random_state (random.Random): source of jitter, for reproducibility.
+    """
+
+    def __init__(self, update_interval=10, jitter=0, random_state=None):
+        self.update_interval = float(update_interval)
+        self.jitter = float(jitter)
+        self.random = random.Random() if random_state is None else random_state
+
+        if not 0 <= self.jitter < 1:
+            raise ValueError('jitter must be in the range [0, 1).')
+
+    def _jittered(self, interval):
+        if not self.jitter:
+            return interval
+        return interval * (1 + self.random.uniform(-self.jitter, self.jitter))
+
+    def record(self, total_time):
+        """Record the total time of a completed job."""
+
+    def next_interval(self, job, elapsed):  # pylint: disable=unused-argument
+        """Get the number of seconds until the job should be polled again.
+
+        Args:
+            job (kiosk_client.job.Job): The job being monitored.
+            elapsed (float): seconds since the job began being monitored.
+
+        Returns:
+            float: seconds until the next status request.
+        """
+        return self._jittered(self.update_interval)
+
+
+class AdaptivePollingPolicy(PollingPolicy):
+    """Poll jobs more often as they approach their expected completion.
+
+    Queued jobs are polled every ``max_interval`` seconds and jobs in their
+    final stages every ``min_interval`` seconds. All other jobs are polled
+    close to their expected completion time, learned from the running median
+    of the ``total_time`` of the most recently completed jobs.
+
+    Args:
+        update_interval (float): seconds between status requests until the
+            expected completion time is known.
+        min_interval (float): minimum seconds between status requests.
+        max_interval (float): seconds between status requests of queued jobs.
+        window (int): number of completed jobs used to compute the median.
+        jitter (float): randomly scale each interval by up to this fraction.
+        random_state (random.Random): source of jitter, for reproducibility.
+    """
+
+    queued_statuses = frozenset({None, 'new'})
+    finishing_statuses = frozenset({'post-processing', 'saving-results'})
+
+    def __init__(self, update_interval=10, min_interval=1, max_interval=30,
+                 window=1000, jitter=0, random_state=None):
+        super(AdaptivePollingPolicy, self).__init__(
+            update_interval=update_interval,
+            jitter=jitter,
+            random_state=random_state)
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+
+        if not 0 < self.min_interval <= self.max_interval:
+            raise ValueError('min_interval must be positive and no greater '
+                             'than max_interval.')
+
+        self._recent = collections.deque(maxlen=int(window))
+        self._sorted = []  # the recent total times, sorted
+
+    @property
+    def median(self):
+        """The median total time of recently completed jobs, or None."""
+        if not self._sorted:
+            return None
+        n = len(self._sorted)
+        if n % 2:
+            return self._sorted[n // 2]
+        return (self._sorted[n // 2 - 1] + self._sorted[n // 2]) / 2
+
+    def record(self, total_time):
+        try:
+            total_time = float(total_time)
+        except (TypeError, ValueError):
+            return  # total_time may be missing or a list for zip files
+        if total_time != total_time or total_time < 0:  # NaN or negative
+            return
+
+        if len(self._recent) == self._recent.maxlen:
+            oldest = self._recent.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        self._recent.append(total_time)
+        bisect.insort(self._sorted, total_time)
+
+    def next_interval(self, job, elapsed):
+        if job.status in self.queued_statuses:
+            interval = self.max_interval
+        elif job.status in self.finishing_statuses:
+            interval = self.min_interval
+        elif self.median is None:
+            interval = self.update_interval
+        else:
+            # poll again once the job is expected to be complete
+            interval = self.median - elapsed
+        interval = max(self.min_interval, min(interval, self.max_interval))
+        return self._jittered(interval)
+
+
+class StatusPoller(object):
+    """Polls the status of all in-flight jobs from a single looping timer.
+
+    Instead of every ``Job`` sleeping and polling in its own loop, jobs
+    register with the poller. Every ``tick`` seconds, up to ``batch_size``
+    jobs whose next poll is due are checked concurrently. New statuses are
+    dispatched back to the ``Job`` objects, and the ``Deferred`` returned by
+    ``register`` fires once the job reaches a final status.
+
+    The request rate is bounded by ``batch_size / tick`` regardless of the
+    number of registered jobs. The time between polls of each job is decided
+    by the ``policy``.
+
+    Args:
+        update_interval (float): seconds between polls of one job, if no
+            ``policy`` is given.
+        batch_size (int): maximum number of concurrent status requests.
+        tick (float): seconds between each batch of status requests.
+        policy (PollingPolicy): decides when each job is polled next.
+        clock (IReactorTime): provides the timer, defaults to the reactor.
+    """
+
+    def __init__(self, update_interval=10, batch_size=64, tick=1,
+                 policy=None, clock=None):
+        self.logger = logging.getLogger(str(self.__class__.__name__))
+        if policy is None:
+            policy = PollingPolicy(update_interval=update_interval)
+        self.policy = policy
+        self.batch_size = int(batch_size)
+        self.tick = float(tick)
+        self.clock = reactor if clock is None else clock
+
+        if self.batch_size <= 0:
+            raise ValueError('batch_size must be a positive integer.')
+
+        # heap of (due_time, sequence, job, deferred, registered_at)
+        self._queue = []
+        self._sequence = itertools.count()  # tie-breaker for equal due times
+        self._in_flight = 0
+        self._loop = None
+
+    def __len__(self):
+        return len(self._queue) + self._in_flight
+
+    @property
+    def is_running(self):
+        return self._loop is not None and self._loop.running
+
+    def _push(self, job, deferred, registered_at):
+        now = self.clock.seconds()
+        due = now + self.policy.next_interval(job, now - registered_at)
+        entry = (due, next(self._sequence), job, deferred, registered_at)
+        heapq.heappush(self._queue, entry)
+
+    def _start(self):
+        if not self.is_running:
+            self._loop = task.LoopingCall(self.poll)
+            self._loop.clock = self.clock
+            self._loop.start(self.tick, now=False)
+
+    def _stop(self):
+        if self.is_running:
+            self._loop.stop()
+
+    def register(self, job):
+        """Poll the status of the job until it is done.
+
+        Args:
+            job (kiosk_client.job.Job): The job to monitor.
+
+        Returns:
+            twisted.internet.defer.Deferred: fires with ``job.is_done``.
+        """
+        deferred = defer.Deferred()
+        if job.is_done:
+            deferred.callback(job.is_done)
+            return deferred
+
+        self._push(job, deferred, self.clock.seconds())
+        self._start()
+        return deferred
+
+    def record_total_time(self, total_time):
+        """Inform the policy of the total time of a completed job."""
+        self.policy.record(total_time)
+
+    def poll(self):
+        """Send status requests for the next batch of jobs that are due."""
+        now = self.clock.seconds()
+        sent = 0
+        while (self._queue and sent < self.batch_size and
+               self._in_flight < self.batch_size and
+               self._queue[0][0] <= now):
+            _, _, job, deferred, registered_at = heapq.heappop(self._queue)
+            self._in_flight += 1
+            sent += 1
+            args = (job, deferred, registered_at)
+            request = defer.maybeDeferred(job.get_redis_value, 'status')
+            request.addCallbacks(self._on_status, self._on_error,
+                                 callbackArgs=args, errbackArgs=args)
+
+        if not self._queue and not self._in_flight:
+            self._stop()
+
+    def _on_status(self, status, job, deferred, registered_at):
+        self._in_flight -= 1
+        job.update_status(status)
+
+        if job.is_done:
+            deferred.callback(job.is_done)
+        else:
+            self._push(job, deferred, registered_at)
+            self._start()
+
+    def _on_error(self, failure, job, deferred, registered_at):
+        self._in_flight -= 1
+        self.logger.error('[%s]: Encountered %s while polling status: %s',
+                          job.job_id, failure.type.__name__,
+                          failure.getErrorMessage())
+        self._push(job, deferred, registered_at)
+        self._start()
@@ -0,0 +1,221 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Tests for StatusPoller class"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import random
+
+import pytest
+
+from twisted.internet import defer
+from twisted.internet import task
+
+from kiosk_client import poller
+
+
+class DummyJob(object):
+
+    def __init__(self, job_id, statuses, fail_first=False):
+        self.job_id = job_id
+        self.status = None
+        self.statuses = list(statuses)
+        self.fail_first = fail_first
+        self.requests = 0
+
+    @property
+    def is_done(self):
+        return self.status in {'done', 'failed'}
+
+    def update_status(self, status):
+        self.status = status
+
+    def get_redis_value(self, field):
+        assert field == 'status'
+        self.requests += 1
+        if self.fail_first:
+            self.fail_first = False
+            return defer.fail(ValueError('on purpose'))
+        return defer.succeed(self.statuses.pop(0))
+
+
+class TestPollingPolicy(object):
+
+    def test_next_interval(self):
+        with pytest.raises(ValueError):
+            poller.PollingPolicy(jitter=1)
+
+        policy = poller.PollingPolicy(update_interval=5)
+        assert policy.next_interval(DummyJob('a', []), 0) == 5
+
+        policy = poller.PollingPolicy(update_interval=5, jitter=0.5,
+                                      random_state=random.Random(0))
+        intervals = [policy.next_interval(DummyJob('a', []), 0)
+                     for _ in range(20)]
+        assert all(2.5 <= i <= 7.5 for i in intervals)
+        assert len(set(intervals)) > 1
+
+
+class TestAdaptivePollingPolicy(object):
+
+    def test_init(self):
+        with pytest.raises(ValueError):
+            poller.AdaptivePollingPolicy(min_interval=0)
+        with pytest.raises(ValueError):
+            poller.AdaptivePollingPolicy(min_interval=10, max_interval=5)
+
+    def test_record(self):
+        policy = poller.AdaptivePollingPolicy(window=3)
+        assert policy.median is None
+
+        # invalid values are ignored
+        for value in (None, 'None', ['1', '2'], float('nan'), -1):
+            policy.record(value)
+        assert policy.median is None
+
+        policy.record('10')
+        assert policy.median == 10
+        policy.record(20)
+        assert policy.median == 15
+        policy.record(60)
+        assert policy.median == 20
+
+        # only the most recent values are used
+        policy.record(70)
+        policy.record(80)
+        assert policy.median == 70
+
+    def test_next_interval(self):
+        policy = poller.AdaptivePollingPolicy(
+            update_interval=10, min_interval=2, max_interval=30)
+        j = DummyJob('a', [])
+
+        # queued jobs are polled infrequently
+        for status in (None, 'new'):
+            j.status = status
+            assert policy.next_interval(j, 0) == 30
+
+        # jobs near completion are polled frequently
+        j.status = 'post-processing'
+        assert policy.next_interval(j, 0) == 2
+
+        # no completed jobs yet
+        j.status = 'predicting'
+        assert policy.next_interval(j, 0) == 10
+
+        # poll near the expected completion time
+        policy.record(25)
+        assert policy.next_interval(j, 5) == 20
+        assert policy.next_interval(j, 24) == 2
+        assert policy.next_interval(j, 100) == 2
+
+        policy.record(100)
+        policy.record(100)
+        assert policy.next_interval(j, 0) == 30
+
+
+class TestStatusPoller(object):
+
+    def test_init(self):
+        with pytest.raises(ValueError):
+            poller.StatusPoller(batch_size=0)
+
+    def test_register_done_job(self):
+        clock = task.Clock()
+        p = poller.StatusPoller(clock=clock)
+        j = DummyJob('done', [])
+        j.status = 'done'
+
+        results = []
+        p.register(j).addCallback(results.append)
+        assert results == [True]
+        assert not p.is_running
+        assert len(p) == 0  # pylint: disable=len-as-condition
+
+    def test_poll(self):
+        clock = task.Clock()
+        p = poller.StatusPoller(update_interval=2, batch_size=2, tick=1,
+                                clock=clock)
+
+        jobs = [
+            DummyJob('a', ['new', 'done']),
+            DummyJob('b', ['new', 'new', 'failed']),
+            DummyJob('c', ['done'], fail_first=True),
+        ]
+
+        results = []
+        for j in jobs:
+            p.register(j).addCallback(lambda x, j=j: results.append(j.job_id))
+
+        assert p.is_running
+        assert len(p) == len(jobs)
+
+        # no job is due until the update_interval has passed
+        clock.advance(1)
+        assert sum(j.requests for j in jobs) == 0
+
+        # only batch_size requests are sent per tick
+        clock.advance(1)
+        assert sum(j.requests for j in jobs) == 2
+
+        clock.advance(1)
+        assert sum(j.requests for j in jobs) == 3
+        assert jobs[2].requests == 1  # the first request failed
+
+        for _ in range(10):
+            clock.advance(1)
+
+        assert set(results) == {'a', 'b', 'c'}
+        assert [j.status for j in jobs] == ['done', 'failed', 'done']
+        assert [j.requests for j in jobs] == [2, 3, 2]
+
+        # the timer stops once every job is done
+        assert not p.is_running
+        assert len(p) == 0  # pylint: disable=len-as-condition
+
+    def test_policy(self):
+        clock = task.Clock()
+        policy = poller.AdaptivePollingPolicy(min_interval=1, max_interval=5)
+        p = poller.StatusPoller(batch_size=10, tick=1, policy=policy,
+                                clock=clock)
+
+        p.record_total_time(3)
+        assert policy.median == 3
+
+        j = DummyJob('a', ['predicting', 'done'])
+        j.status = 'predicting'  # polled at the median completion time
+        p.register(j)
+
+        clock.advance(2)
+        assert j.requests == 0
+        clock.advance(1)
+        assert j.requests == 1
+
+        # polled at min_interval once past the expected completion
+        clock.advance(1)
+        assert j.status == 'done'
+        assert not p.is_running
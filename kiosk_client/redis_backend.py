@@ -0,0 +1,336 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Read and expire the hashes of jobs directly in Redis"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import logging
+
+from twisted.internet import defer
+from twisted.internet import endpoints
+from twisted.internet import error as twisted_errors
+from twisted.internet import protocol
+from twisted.internet import reactor
+
+
+# errors of the connection to Redis, after which a command can be retried
+CONNECTION_ERRORS = (
+    twisted_errors.ConnectionLost,
+    twisted_errors.ConnectionDone,
+    twisted_errors.ConnectError,
+    twisted_errors.ConnectionRefusedError,
+    twisted_errors.TimeoutError,
+)
+
+# error replies of a server that is not ready yet, after which a command can
+# be retried: LOADING a dataset, BUSY running a script, TRYAGAIN during a
+# cluster resharding or MASTERDOWN while a replica lost its master.
+RETRYABLE_REPLIES = ('LOADING', 'BUSY', 'TRYAGAIN', 'MASTERDOWN')
+
+
+class RedisError(Exception):
+    """An error reply from the Redis server."""
+
+
+class IncompleteReply(Exception):
+    """More data is needed to parse the next reply."""
+
+
+def is_retryable(err):
+    """Whether a command that failed with ``err`` can be sent again."""
+    if isinstance(err, CONNECTION_ERRORS):
+        return True
+    return (isinstance(err, RedisError) and
+            str(err).split(' ', 1)[0] in RETRYABLE_REPLIES)
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode('utf-8')
+
+
+def encode_command(*args):
+    """Encode a command as a RESP array of bulk strings."""
+    parts = [b'*' + _to_bytes(len(args)) + b'\r\n']
+    for arg in args:
+        arg = _to_bytes(arg)
+        parts.append(b'$' + _to_bytes(len(arg)) + b'\r\n' + arg + b'\r\n')
+    return b''.join(parts)
+
+
+def encode_reply(value):
+    """Encode a reply of the Redis server in RESP.
+
+    Integers are encoded as integers, lists as arrays, ``RedisError`` as an
+    error and any other value as a bulk string, or a null if ``None``.
+    """
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, RedisError):
+        return b'-' + _to_bytes(value) + b'\r\n'
+    if isinstance(value, list):
+        return b''.join([b'*' + _to_bytes(len(value)) + b'\r\n'] +
+                        [encode_reply(v) for v in value])
+    if isinstance(value, int) and not isinstance(value, bool):
+        return b':' + _to_bytes(value) + b'\r\n'
+    value = _to_bytes(value)
+    return b'$' + _to_bytes(len(value)) + b'\r\n' + value + b'\r\n'
+
+
+def parse_reply(data, start=0):
+    """Parse the RESP value starting at ``start`` of the data.
+
+    Args:
+        data (bytes): the received data.
+        start (int): the index of the first byte of the value.
+
+    Returns:
+        tuple: the value and the index of the byte after it. Errors are
+            returned as ``RedisError`` and strings as bytes.
+
+    Raises:
+        IncompleteReply: the data ends before the end of the value.
+        RedisError: the data is not valid RESP.
+    """
+    end = data.find(b'\r\n', start)
+    if end < 0:
+        raise IncompleteReply()
+    kind, line, pos = data[start:start + 1], data[start + 1:end], end + 2
+
+    if kind == b'+':
+        return line, pos
+    if kind == b'-':
+        return RedisError(line.decode('utf-8', 'replace')), pos
+    if kind == b':':
+        return int(line), pos
+    if kind == b'$':
+        length = int(line)
+        if length < 0:
+            return None, pos
+        if len(data) < pos + length + 2:
+            raise IncompleteReply()
+        return data[pos:pos + length], pos + length + 2
+    if kind == b'*':
+        length = int(line)
+        if length < 0:
+            return None, pos
+        values = []
+        for _ in range(length):
+            value, pos = parse_reply(data, pos)
+            values.append(value)
+        return values, pos
+    raise RedisError('Invalid RESP data: {!r}'.format(data[start:end]))
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class RedisProtocol(protocol.Protocol):
+    """Sends pipelined commands and fires a Deferred with each reply.
+
+    If the server sends data that is not valid RESP, the replies can no
+    longer be matched to their commands, so every command waiting for a
+    reply fails with ``ConnectionLost`` and the connection is dropped.
+    """
+
+    def __init__(self):
+        self._buffer = b''
+        self._replies = collections.deque()  # Deferred of each sent command
+        self._invalid = False  # received data that is not valid RESP
+
+    def send(self, commands):
+        """Send many commands in a single write.
+
+        Args:
+            commands (list): the arguments of each command.
+
+        Returns:
+            list: a Deferred firing with the reply of each command.
+        """
+        replies = [defer.Deferred() for _ in commands]
+        self._replies.extend(replies)
+        self.transport.write(b''.join(encode_command(*c) for c in commands))
+        return replies
+
+    def dataReceived(self, data):  # pylint: disable=C0103
+        if self._invalid:
+            return  # the connection is being dropped
+
+        self._buffer += data
+        pos = 0
+        while self._replies:
+            try:
+                reply, pos = parse_reply(self._buffer, pos)
+            except IncompleteReply:
+                break
+            except (RedisError, ValueError) as err:
+                self._invalid = True
+                self._buffer = b''
+                self._fail_replies(twisted_errors.ConnectionLost(
+                    'Invalid reply from Redis: {}'.format(err)))
+                self.transport.loseConnection()
+                return
+            deferred = self._replies.popleft()
+            if isinstance(reply, RedisError):
+                deferred.errback(reply)
+            else:
+                deferred.callback(reply)
+        self._buffer = self._buffer[pos:]
+
+    # pylint: disable=C0103
+    def connectionLost(self, reason=protocol.connectionDone):
+        protocol.Protocol.connectionLost(self, reason)
+        self._fail_replies(reason)
+
+    def _fail_replies(self, reason):
+        replies, self._replies = self._replies, collections.deque()
+        for deferred in replies:
+            deferred.errback(reason)
+
+
+class RedisBackend(object):
+    """Reads and expires the hashes of jobs directly in Redis.
+
+    Commands are not sent as they are issued, but together with every
+    other command issued in the same iteration of the reactor, as a single
+    pipeline of up to ``batch_size`` commands. Jobs polled by the same
+    ``StatusPoller`` tick share a single round trip to Redis.
+
+    Args:
+        host (str): hostname of the Redis server.
+        port (int): port of the Redis server.
+        batch_size (int): maximum number of commands in each pipeline.
+        reactor (twisted.internet.interfaces.IReactorTCP): connects to the
+            server and schedules each pipeline. Defaults to the reactor.
+    """
+
+    def __init__(self, host, port=6379, batch_size=256, reactor=reactor):
+        # pylint: disable=redefined-outer-name
+        self.logger = logging.getLogger(str(self.__class__.__name__))
+        self.host = str(host)
+        self.port = int(port)
+        self.batch_size = int(batch_size)
+        self.reactor = reactor
+
+        if self.batch_size <= 0:
+            raise ValueError('batch_size must be a positive integer.')
+
+        self.pipelines = 0  # number of pipelines sent
+        self.commands = 0  # number of commands sent
+
+        self._pending = []  # (command, Deferred) of each unsent command
+        self._protocol = None
+        self._connecting = False
+        self._flush_call = None
+
+    def _connect(self):
+        endpoint = endpoints.TCP4ClientEndpoint(self.reactor, self.host,
+                                                self.port)
+        return endpoints.connectProtocol(endpoint, RedisProtocol())
+
+    def execute(self, *command):
+        """Send a command with the next pipeline.
+
+        Returns:
+            twisted.internet.defer.Deferred: fires with the reply.
+        """
+        deferred = defer.Deferred()
+        self._pending.append((command, deferred))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._flush_call is None:
+            self._flush_call = self.reactor.callLater(0, self.flush)
+        return deferred
+
+    def flush(self):
+        """Send every pending command, connecting first if required."""
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+
+        if not self._pending:
+            return
+
+        if self._protocol is None or not self._protocol.connected:
+            if not self._connecting:
+                self._connecting = True
+                self.logger.info('Connecting to Redis at %s:%s.',
+                                 self.host, self.port)
+                d = self._connect()
+                d.addCallbacks(self._on_connect, self._on_connect_error)
+            return
+
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            replies = self._protocol.send([c for c, _ in batch])
+            for reply, (_, deferred) in zip(replies, batch):
+                reply.chainDeferred(deferred)
+            self.pipelines += 1
+            self.commands += len(batch)
+
+    def _on_connect(self, redis_protocol):
+        self._connecting = False
+        self._protocol = redis_protocol
+        self.flush()
+
+    def _on_connect_error(self, failure):
+        self._connecting = False
+        pending, self._pending = self._pending, []
+        for _, deferred in pending:
+            deferred.errback(failure)
+
+    def close(self):
+        """Close the connection to the server."""
+        if self._protocol is not None and self._protocol.connected:
+            self._protocol.transport.loseConnection()
+        self._protocol = None
+
+    def hget(self, key, field):
+        """Get the value of a field of a hash, or ``None``."""
+        return self.execute('HGET', key, field).addCallback(_decode)
+
+    def hmget(self, key, fields):
+        """Get the values of many fields of a hash, as a list."""
+        d = self.execute('HMGET', key, *fields)
+        return d.addCallback(lambda values: [_decode(v) for v in values])
+
+    def hgetall(self, key):
+        """Get every field of a hash, as a dict."""
+        def to_dict(values):
+            values = [_decode(v) for v in values]
+            return dict(zip(values[::2], values[1::2]))
+
+        return self.execute('HGETALL', key).addCallback(to_dict)
+
+    def expire(self, key, seconds):
+        """Delete a key after ``seconds``, returning 1 if it exists."""
+        return self.execute('EXPIRE', key, int(seconds))
@@ -0,0 +1,192 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Tests for the direct Redis backend"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import pytest
+import pytest_twisted
+
+from twisted.internet import defer
+from twisted.internet import error as twisted_errors
+from twisted.internet import protocol
+from twisted.internet import reactor
+from twisted.internet import task
+from twisted.internet.testing import StringTransport
+
+from kiosk_client import redis_backend
+from kiosk_client import simulator
+
+
+def test_encode_command():
+    encoded = redis_backend.encode_command('HGET', 'job', 'status')
+    assert encoded == b'*3\r\n$4\r\nHGET\r\n$3\r\njob\r\n$6\r\nstatus\r\n'
+    assert redis_backend.parse_reply(encoded) == (
+        [b'HGET', b'job', b'status'], len(encoded))
+
+
+def test_parse_reply():
+    values = [None, 1, 'value', ['a', None, 2, ['nested']], '']
+    data = b''.join(redis_backend.encode_reply(v) for v in values)
+
+    parsed, pos = [], 0
+    while pos < len(data):
+        value, pos = redis_backend.parse_reply(data, pos)
+        parsed.append(value)
+    assert parsed == [None, 1, b'value', [b'a', None, 2, [b'nested']], b'']
+
+    assert redis_backend.parse_reply(b'+OK\r\n') == (b'OK', 5)
+    assert redis_backend.parse_reply(b'*-1\r\n') == (None, 5)
+
+    error, _ = redis_backend.parse_reply(
+        redis_backend.encode_reply(redis_backend.RedisError('ERR oops')))
+    assert isinstance(error, redis_backend.RedisError)
+    assert str(error) == 'ERR oops'
+
+    # replies split across reads
+    for incomplete in (b'', b'$5\r\nval', b'*2\r\n:1\r\n', b':1'):
+        with pytest.raises(redis_backend.IncompleteReply):
+            redis_backend.parse_reply(incomplete)
+
+    with pytest.raises(redis_backend.RedisError):
+        redis_backend.parse_reply(b'?\r\n')
+
+
+def test_is_retryable():
+    RedisError = redis_backend.RedisError
+    assert redis_backend.is_retryable(twisted_errors.ConnectionLost())
+    assert redis_backend.is_retryable(RedisError('LOADING Redis is loading'))
+    assert redis_backend.is_retryable(RedisError('BUSY Redis is busy'))
+    assert not redis_backend.is_retryable(RedisError('ERR unknown command'))
+    assert not redis_backend.is_retryable(ValueError('LOADING'))
+
+
+def test_protocol_invalid_reply():
+    redis_protocol = redis_backend.RedisProtocol()
+    transport = StringTransport()
+    redis_protocol.makeConnection(transport)
+
+    replies = redis_protocol.send([('GET', 'a'), ('GET', 'b'), ('GET', 'c')])
+    errors = []
+    for reply in replies:
+        reply.addErrback(errors.append)
+
+    redis_protocol.dataReceived(b'$1\r\na\r\n:not a number\r\n')
+    assert replies[0].result == b'a'
+    # every pending command fails and the connection is dropped
+    assert len(errors) == 2
+    assert all(e.check(twisted_errors.ConnectionLost) for e in errors)
+    assert transport.disconnecting
+
+    redis_protocol.dataReceived(b':1\r\n')  # ignored until disconnected
+    redis_protocol.connectionLost(twisted_errors.ConnectionDone())
+
+
+class TestRedisBackend(object):
+
+    def test_init(self):
+        with pytest.raises(ValueError):
+            redis_backend.RedisBackend('localhost', batch_size=0)
+
+    def test_pipelining(self):
+        clock = task.Clock()
+        backend = redis_backend.RedisBackend('localhost', batch_size=3,
+                                             reactor=clock)
+        sent = []
+
+        class FakeProtocol(object):
+            connected = True
+
+            def send(self, commands):
+                sent.append(commands)
+                return [defer.succeed(c[1]) for c in commands]
+
+        backend._protocol = FakeProtocol()
+
+        results = [backend.execute('GET', str(i)) for i in range(4)]
+        assert len(sent) == 1  # a full batch is sent at once
+        clock.advance(0)
+        assert [len(commands) for commands in sent] == [3, 1]
+        assert [r.result for r in results] == ['0', '1', '2', '3']
+        assert backend.pipelines == 2
+        assert backend.commands == 4
+
+    @pytest_twisted.inlineCallbacks
+    def test_commands(self):
+        sim = simulator.KioskSimulator(
+            workers=1, service_time=simulator.ServiceTime('constant', 1),
+            clock=task.Clock())
+        port = simulator.listen_redis(sim, 0, base_url='http://sim',
+                                      interface='127.0.0.1')
+        backend = redis_backend.RedisBackend('127.0.0.1',
+                                             port=port.getHost().port)
+        try:
+            hashes = [sim.create({'imageName': 'image.png'})
+                      for _ in range(300)]
+
+            # commands of the same reactor turn share a pipeline
+            statuses = yield defer.gatherResults(
+                [backend.hget(h, 'status') for h in hashes])
+            assert statuses == ['started'] + ['new'] * 299
+            assert backend.pipelines == 2
+            assert backend.commands == 300
+
+            values = yield backend.hmget(hashes[0], ['status', 'missing'])
+            assert values == ['started', None]
+
+            sim.jobs[hashes[0]]['output_url'] = '/output/image.zip'
+            values = yield backend.hgetall(hashes[0])
+            assert values['status'] == 'started'
+            assert values['output_url'] == 'http://sim/output/image.zip'
+            assert not any(k.startswith('_') for k in values)
+
+            expired = yield defer.gatherResults(
+                [backend.expire(h, 3600) for h in hashes + ['missing']])
+            assert expired == [1] * 300 + [0]
+
+            with pytest.raises(redis_backend.RedisError):
+                yield backend.execute('FLUSHALL')
+
+            # reconnects after the connection is closed
+            backend.close()
+            value = yield backend.execute('PING')
+            assert value == b'PONG'
+        finally:
+            backend.close()
+            yield port.stopListening()
+
+    @pytest_twisted.inlineCallbacks
+    def test_connection_error(self):
+        port = reactor.listenTCP(0, protocol.Factory(),
+                                 interface='127.0.0.1')
+        port_number = port.getHost().port
+        yield port.stopListening()
+
+        backend = redis_backend.RedisBackend('127.0.0.1', port=port_number)
+        with pytest.raises(redis_backend.CONNECTION_ERRORS):
+            yield backend.hget('job', 'status')
+        assert backend.pipelines == 0
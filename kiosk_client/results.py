@@ -0,0 +1,347 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Write job results to disk and read them back"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import logging
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+from kiosk_client.store import JobTable
+
+
+class JsonlResultsWriter(object):
+    """Appends each job's record to a file as a single line of JSON.
+
+    Every line is flushed as soon as it is written, so the file can be read
+    while the run is still going and is not lost if the process dies. The
+    final line is a summary of the run: ``{"summary": {...}}``.
+
+    Args:
+        path (str): path of the JSON Lines file to write.
+    """
+
+    def __init__(self, path):
+        self.logger = logging.getLogger(str(self.__class__.__name__))
+        self.path = path
+        self.count = 0  # number of job records written
+        self._file = None
+
+    @property
+    def closed(self):
+        return self._file is None
+
+    def _write(self, record):
+        if self._file is None:
+            mode = 'a' if os.path.exists(self.path) else 'w'
+            self._file = open(self.path, mode)
+        self._file.write(json.dumps(record))
+        self._file.write('\n')
+        self._file.flush()
+
+    def write(self, record):
+        """Write the record of a single job."""
+        self._write(record)
+        self.count += 1
+
+    def write_summary(self, summary):
+        """Write the summary of the run and close the file."""
+        self._write({'summary': summary})
+        self.close()
+        self.logger.info('Wrote %s job records as JSON Lines to %s.',
+                         self.count, self.path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_jsonl(path):
+    """Read a JSON Lines results file.
+
+    Args:
+        path (str): path of the file written by ``JsonlResultsWriter``.
+
+    Returns:
+        tuple: the list of job records and the summary dictionary, which is
+            empty if the run did not finish.
+    """
+    records, summary = [], {}
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break  # the last line may be incomplete if the run crashed
+            if 'summary' in record and len(record) == 1:
+                summary = record['summary']
+            else:
+                records.append(record)
+    return records, summary
+
+
+def read_json(path):
+    """Read a JSON results file written at the end of a run.
+
+    Args:
+        path (str): path of the file written by ``JobManager.summarize``.
+
+    Returns:
+        tuple: the list of job records and the summary dictionary.
+    """
+    with open(path, 'r') as f:
+        summary = json.load(f)
+    records = summary.pop('job_data', [])
+    return records, summary
+
+
+def parse_datetimes(values):
+    """Parse a column of ISO 8601 timestamps as seconds since the epoch.
+
+    Timestamps may end with a UTC offset. Missing values are NaN.
+    """
+    stamps = np.asarray(values, dtype=str)  # None is 'None'
+    stamps[(stamps == 'None') | (stamps == '')] = 'NaT'
+    if not stamps.size:
+        return np.zeros(0)
+
+    # strip the UTC offsets from the code points of the fixed-width strings
+    chars = stamps.view(np.uint32).reshape(stamps.size, -1).copy()
+    rows = np.arange(stamps.size)
+    length = (chars != 0).sum(axis=1)
+
+    def char(i):  # the code point at index ``length - i`` of each string
+        return chars[rows, np.maximum(length - i, 0)]
+
+    def digit(i):
+        return char(i).astype(np.int64) - ord('0')
+
+    sign = char(6)
+    has_offset = (((sign == ord('+')) | (sign == ord('-'))) &
+                  (char(3) == ord(':')) & (length > 19))
+    offset = (digit(5) * 600 + digit(4) * 60 + digit(2) * 10 + digit(1))
+    offset = np.where(sign == ord('-'), -offset, offset) * has_offset
+    for i in range(1, 7):
+        chars[rows[has_offset], length[has_offset] - i] = 0
+
+    is_utc = char(1) == ord('Z')
+    chars[rows[is_utc], length[is_utc] - 1] = 0
+
+    times = chars.view(stamps.dtype).ravel().astype('datetime64[us]')
+    seconds = (times - np.datetime64(0, 'us')).astype(float) / 1e6
+    seconds[np.isnat(times)] = np.nan
+    return seconds - offset * 60
+
+
+def _encode(values):
+    """Dictionary-encode values as codes into an array of strings.
+
+    Returns:
+        tuple: the code of each value, or -1 if it is ``None``, and the
+            UTF-8 encoded string of each code.
+    """
+    lookup = {}
+    codes = np.fromiter(
+        (-1 if v is None else lookup.setdefault(v, len(lookup))
+         for v in values), dtype=np.int32, count=len(values))
+    strings = np.array([str(v).encode('utf-8')
+                        for v in sorted(lookup, key=lookup.get)], dtype=bytes)
+    return codes, strings
+
+
+def decode(codes, strings):
+    """Decode dictionary-encoded strings as an array of objects."""
+    strings = np.char.decode(strings, 'utf-8').astype(object)
+    return np.append(strings, None)[codes]  # -1 is None
+
+
+def write_npz(path, table, summary):
+    """Write the job data and summary of a run as NumPy arrays.
+
+    The file is an uncompressed ``.npz`` archive with an array for each
+    field of the jobs:
+
+    - numeric fields, such as ``total_time``, as floats, with ``NaN`` for
+      missing values and values that are not numbers.
+    - ``created_at`` and ``finished_at`` as seconds since the epoch.
+    - ``is_expired`` and ``failed`` as booleans.
+    - ``status`` and each string field, such as ``model``, as integer
+      codes, with the UTF-8 strings of the codes in ``<field>_strings``.
+
+    The values of numeric fields that are not numbers, such as the values
+    of each file of a zip, and the ``packed_files`` of each job are in the
+    ``extras`` JSON string, and the summary in the ``summary`` JSON string.
+
+    Args:
+        path (str): path of the ``.npz`` file to write.
+        table (kiosk_client.store.JobTable): the data of the jobs.
+        summary (dict): the summary of the run.
+    """
+    arrays = {}
+    extras = {}
+    for field in table.float_fields:
+        arrays[field] = np.array(table.column(field), dtype=float)
+        values = table.get_extras(field)
+        if values:
+            extras[field] = {str(row): v for row, v in values.items()}
+
+    for field in table.flag_fields:
+        arrays[field] = np.array(table.column(field), dtype=bool)
+
+    arrays['status'] = np.array(table.column('status'), dtype=np.int32)
+    arrays['status_strings'] = np.array(
+        [s.encode('utf-8') for s in table.status_names], dtype=bytes)
+
+    for field in table.object_fields:
+        column = table.column(field)
+        if field in ('created_at', 'finished_at'):
+            arrays[field] = parse_datetimes(column)
+        elif field == 'packed_files':
+            extras[field] = {str(row): v for row, v in enumerate(column)
+                             if v}
+        else:
+            arrays[field], arrays[field + '_strings'] = _encode(column)
+
+    arrays['extras'] = np.array(json.dumps(extras))
+    arrays['summary'] = np.array(json.dumps(summary))
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def load_npz(path, mmap_mode=None):
+    """Load the arrays of a file written by ``write_npz``.
+
+    Args:
+        path (str): path of the ``.npz`` file.
+        mmap_mode (str): if set, memory-map the arrays from the file with
+            this mode of ``numpy.memmap`` instead of reading them.
+
+    Returns:
+        dict: each array by name.
+    """
+    if mmap_mode is None:
+        with np.load(path) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+
+            # the array starts after the local header of the member
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            start = info.header_offset + 30 + name_length + extra_length
+            f.seek(start)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                header = np.lib.format.read_array_header_1_0(f)
+            else:
+                header = np.lib.format.read_array_header_2_0(f)
+            shape, fortran_order, dtype = header
+
+            if dtype.hasobject or not np.prod(shape, dtype=np.int64):
+                f.seek(start)  # not mappable
+                arrays[name] = np.lib.format.read_array(f)
+            else:
+                arrays[name] = np.memmap(
+                    f, dtype=dtype, mode=mmap_mode, offset=f.tell(),
+                    shape=shape, order='F' if fortran_order else 'C')
+    return arrays
+
+
+def read_npz(path):
+    """Read the job records of a file written by ``write_npz``.
+
+    Args:
+        path (str): path of the ``.npz`` file.
+
+    Returns:
+        tuple: the list of job records and the summary dictionary.
+    """
+    arrays = load_npz(path)
+    extras = json.loads(str(arrays['extras']))
+    timestamps = {f: _format_datetimes(arrays[f])
+                  for f in ('created_at', 'finished_at')}
+
+    table = JobTable()
+    columns = {'status': decode(arrays['status'], arrays['status_strings'])}
+    for field in table.float_fields + table.flag_fields:
+        columns[field] = arrays[field].tolist()
+    for field in table.object_fields:
+        if field in timestamps:
+            columns[field] = timestamps[field]
+        elif field + '_strings' in arrays:
+            columns[field] = decode(arrays[field],
+                                    arrays[field + '_strings']).tolist()
+
+    for row in range(len(columns['status'])):
+        table.append(**{f: c[row] for f, c in columns.items()})
+    for field, values in extras.items():
+        for row, value in values.items():
+            table.set(int(row), field, value)
+
+    return list(table.iter_records()), json.loads(str(arrays['summary']))
+
+
+def _format_datetimes(seconds):
+    known = np.isfinite(seconds)
+    times = np.full(seconds.shape, 'NaT', dtype='datetime64[us]')
+    times[known] = np.round(seconds[known] * 1e6).astype(np.int64)
+    strings = np.datetime_as_string(times, timezone='UTC').astype(object)
+    strings[~known] = None
+    return strings.tolist()
+
+
+def read_results(path):
+    """Read a results file in any of the output formats.
+
+    Args:
+        path (str): path of a ``.json``, ``.jsonl`` or ``.npz`` results
+            file.
+
+    Returns:
+        tuple: the list of job records and the summary dictionary.
+    """
+    if path.endswith('.jsonl'):
+        return read_jsonl(path)
+    if path.endswith('.npz'):
+        return read_npz(path)
+    return read_json(path)
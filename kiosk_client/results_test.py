@@ -0,0 +1,167 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Tests for writing results"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+
+import numpy as np
+
+from kiosk_client import results
+from kiosk_client import store
+
+
+class TestJsonlResultsWriter(object):
+
+    def test_write(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'results.jsonl')
+        writer = results.JsonlResultsWriter(path)
+        assert writer.closed
+        assert not os.path.exists(path)
+
+        writer.write({'job_id': 'a'})
+        assert not writer.closed
+
+        # each record is readable as soon as it is written
+        records, summary = results.read_jsonl(path)
+        assert records == [{'job_id': 'a'}]
+        assert summary == {}
+
+        writer.write({'job_id': 'b', 'summary': 'not a summary'})
+        writer.write_summary({'num_jobs': 2})
+        assert writer.closed
+        assert writer.count == 2
+
+        records, summary = results.read_jsonl(path)
+        assert records == [{'job_id': 'a'},
+                           {'job_id': 'b', 'summary': 'not a summary'}]
+        assert summary == {'num_jobs': 2}
+
+    def test_read_jsonl_incomplete(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'results.jsonl')
+        with open(path, 'w') as f:
+            f.write('{"job_id": "a"}\n\n{"job_id": "b"}\n{"job_')
+
+        records, summary = results.read_jsonl(path)
+        assert records == [{'job_id': 'a'}, {'job_id': 'b'}]
+        assert summary == {}
+
+
+def _get_table():
+    table = store.JobTable()
+    table.append(original_name='a.png', model='m:0', status='done',
+                 created_at='2021-01-01T00:00:00+00:00',
+                 finished_at='2021-01-01T00:00:05.5Z',
+                 total_time=5.5, output_url='a.zip')
+    table.append(original_name='b.zip', model='m:0', status='failed',
+                 reason='boom', failed=True,
+                 prediction_time=['1', '2'],
+                 packed_files=['x.png', 'y.png'])
+    table.append()
+    return table
+
+
+class TestNpz(object):
+
+    def test_write_npz(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'results.npz')
+        results.write_npz(path, _get_table(), {'num_jobs': 3})
+
+        arrays = results.load_npz(path)
+        np.testing.assert_equal(arrays['total_time'], [5.5, np.nan, np.nan])
+        np.testing.assert_equal(arrays['created_at'],
+                                [1609459200, np.nan, np.nan])
+        np.testing.assert_equal(arrays['failed'], [False, True, False])
+        assert arrays['status'].tolist() == [0, 1, -1]
+        assert arrays['status_strings'].tolist() == [b'done', b'failed']
+        assert arrays['model'].tolist() == [0, 0, -1]
+        assert arrays['model_strings'].tolist() == [b'm:0']
+        reasons = results.decode(arrays['reason'], arrays['reason_strings'])
+        assert reasons.tolist() == [None, 'boom', None]
+        assert json.loads(str(arrays['extras'])) == {
+            'prediction_time': {'1': ['1', '2']},
+            'packed_files': {'1': ['x.png', 'y.png']},
+        }
+        assert json.loads(str(arrays['summary'])) == {'num_jobs': 3}
+
+    def test_load_npz_mmap(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'results.npz')
+        results.write_npz(path, _get_table(), {})
+
+        arrays = results.load_npz(path)
+        mapped = results.load_npz(path, mmap_mode='r')
+        assert set(mapped) == set(arrays)
+        assert isinstance(mapped['total_time'], np.memmap)
+        for name, array in arrays.items():
+            np.testing.assert_equal(mapped[name], array)
+            assert mapped[name].dtype == array.dtype
+
+    def test_read_npz(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'results.npz')
+        table = _get_table()
+        results.write_npz(path, table, {'num_jobs': 3})
+
+        records, summary = results.read_npz(path)
+        assert summary == {'num_jobs': 3}
+
+        # timestamps are written in UTC
+        expected = list(table.iter_records())
+        expected[0]['created_at'] = '2021-01-01T00:00:00.000000Z'
+        expected[0]['finished_at'] = '2021-01-01T00:00:05.500000Z'
+        assert records == expected
+
+        # no jobs
+        results.write_npz(path, store.JobTable(), {})
+        assert results.read_npz(path) == ([], {})
+
+
+def test_read_results(tmpdir):
+    path = os.path.join(str(tmpdir), 'results.json')
+    with open(path, 'w') as f:
+        json.dump({'num_jobs': 1, 'job_data': [{'job_id': 'a'}]}, f)
+
+    records, summary = results.read_results(path)
+    assert records == [{'job_id': 'a'}]
+    assert summary == {'num_jobs': 1}
+
+    path = os.path.join(str(tmpdir), 'results.jsonl')
+    writer = results.JsonlResultsWriter(path)
+    writer.write({'job_id': 'a'})
+    writer.write_summary({'num_jobs': 1})
+
+    records, summary = results.read_results(path)
+    assert records == [{'job_id': 'a'}]
+    assert summary == {'num_jobs': 1}
+
+    path = os.path.join(str(tmpdir), 'results.npz')
+    results.write_npz(path, _get_table(), {'num_jobs': 3})
+
+    records, summary = results.read_results(path)
+    assert [r['input_file'] for r in records] == ['a.png', 'b.zip', None]
+    assert summary == {'num_jobs': 3}
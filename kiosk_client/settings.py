@@ -31,7 +31,7 @@ from __future__ import print_function
 import errno
 import os
 
-from decouple import config
+from decouple import config, Csv
 
 from kiosk_client.utils import get_download_path
 
@@ -66,9 +66,46 @@ POSTPROCESS = config('POSTPROCESS', default='')
 # How frequently Jobs update their statuses
 UPDATE_INTERVAL = config('UPDATE_INTERVAL', default=10, cast=float)
 
+# Maximum number of job statuses to request every POLL_TICK seconds.
+# If 0, each job polls its own status, with the same jitter and adaptive
+# intervals. Otherwise, use at least the number of jobs in flight *
+# POLL_TICK / UPDATE_INTERVAL, or each job is polled less often than every
+# UPDATE_INTERVAL.
+POLL_BATCH_SIZE = config('POLL_BATCH_SIZE', default=0, cast=int)
+POLL_TICK = config('POLL_TICK', default=1, cast=float)
+
+# Randomly scale each poll interval by up to this fraction.
+POLL_JITTER = config('POLL_JITTER', default=0.1, cast=float)
+
+# Adapt poll intervals to each job's status and expected completion time.
+ADAPTIVE_POLLING = config('ADAPTIVE_POLLING', default=False, cast=bool)
+MIN_UPDATE_INTERVAL = config('MIN_UPDATE_INTERVAL', default=1, cast=float)
+MAX_UPDATE_INTERVAL = config('MAX_UPDATE_INTERVAL', default=30, cast=float)
+
+# Request all summary fields of a job at once, if the API supports it.
+REDIS_MULTI_GET = config('REDIS_MULTI_GET', default=False, cast=bool)
+
+# Read and expire job hashes directly in Redis instead of through the API.
+# Disabled if REDIS_HOST is empty.
+REDIS_HOST = config('REDIS_HOST', default='')
+REDIS_PORT = config('REDIS_PORT', default=6379, cast=int)
+REDIS_BATCH_SIZE = config('REDIS_BATCH_SIZE', default=256, cast=int)
+
 # Time to wait between starting jobs (for staggering redis entries)
 START_DELAY = config('START_DELAY', default=0.05, cast=float)
 
+# Only create benchmarking jobs starting within this many seconds.
+SCHEDULE_WINDOW = config('SCHEDULE_WINDOW', default=1, cast=float)
+
+# Maximum number of benchmarking jobs created but not yet started.
+MAX_PENDING_JOBS = config('MAX_PENDING_JOBS', default=1000, cast=int)
+
+# Maximum number of files uploaded at once when processing a directory.
+UPLOAD_CONCURRENCY = config('UPLOAD_CONCURRENCY', default=4, cast=int)
+
+# Upload this many copies of a benchmarked file before the first job.
+STAGE_UPLOADS = config('STAGE_UPLOADS', default=0, cast=int)
+
 # Time interval between Manager status checks
 MANAGER_REFRESH_RATE = config('MANAGER_REFRESH_RATE', default=10, cast=float)
 
@@ -78,10 +115,44 @@ EXPIRE_TIME = config('EXPIRE_TIME', default=3600, cast=int)
 # Name of upload folder in storage bucket.
 UPLOAD_PREFIX = config('UPLOAD_PREFIX', default='uploads', cast=str)
 
+# Maximum number of files uploaded to the storage bucket at once.
+UPLOAD_WORKERS = config('UPLOAD_WORKERS', default=8, cast=int)
+
+# Upload files of at least this many bytes in chunks of UPLOAD_CHUNK_SIZE.
+RESUMABLE_UPLOAD_THRESHOLD = config('RESUMABLE_UPLOAD_THRESHOLD',
+                                    default=8388608, cast=int)
+UPLOAD_CHUNK_SIZE = config('UPLOAD_CHUNK_SIZE', default=8388608, cast=int)
+
 # HTTP Settings
 CONCURRENT_REQUESTS_PER_HOST = config('CONCURRENT_REQUESTS_PER_HOST',
                                       default=64, cast=int)
 
+# Output file formats, any of "json", "jsonl" and "npz".
+OUTPUT_FORMATS = config('OUTPUT_FORMATS', default='json', cast=Csv())
+
+# Record the lifecycle of each job to this file to allow resuming the run.
+JOURNAL_FILE = config('JOURNAL_FILE', default='')
+
+# Serve live client metrics to Prometheus on this port. Disabled if 0.
+METRICS_PORT = config('METRICS_PORT', default=0, cast=int)
+
+# Upload the contents of each file only once, reusing previous uploads.
+UPLOAD_CACHE = config('UPLOAD_CACHE', default=False, cast=bool)
+
+# Check that cached uploads still exist in the bucket before reusing them.
+VERIFY_CACHED_UPLOADS = config('VERIFY_CACHED_UPLOADS', default=False,
+                               cast=bool)
+
+# Pack up to this many small image files into each zip archive job.
+PACK_MAX_FILES = config('PACK_MAX_FILES', default=0, cast=int)
+
+# Maximum total size in bytes of the files packed into each zip archive.
+PACK_MAX_BYTES = config('PACK_MAX_BYTES', default=16777216, cast=int)
+
+# Number of processes verifying image files. If 0 or 1, verify them in
+# the client process.
+VERIFY_PROCESSES = config('VERIFY_PROCESSES', default=0, cast=int)
+
 # Application directories
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DOWNLOAD_DIR = os.path.join(ROOT_DIR, 'download')
@@ -99,6 +170,7 @@ LOG_FILE = os.path.join(LOG_DIR, LOG_FILE)
 DOWNLOAD_DIR = config('DOWNLOAD_DIR', default=DOWNLOAD_DIR)
 OUTPUT_DIR = config('OUTPUT_DIR', default=OUTPUT_DIR)
 LOG_DIR = config('LOG_DIR', default=LOG_DIR)
+CACHE_DIR = config('CACHE_DIR', default='')  # disabled if empty
 
 for d in (DOWNLOAD_DIR, OUTPUT_DIR, LOG_DIR):
     try:
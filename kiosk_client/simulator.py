@@ -0,0 +1,563 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""A local simulator of the Kiosk frontend API, for benchmarking the client
+
+Run the simulator with ``python -m kiosk_client.simulator``, then point the
+client at it with ``--host localhost:8080``. With ``--redis-port``, the
+fields of the simulated jobs are also served over the Redis protocol.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import collections
+import datetime
+import json
+import logging
+import math
+import random
+import uuid
+
+from twisted.internet import protocol
+from twisted.internet import reactor
+from twisted.internet import task
+from twisted.web import resource
+from twisted.web import server
+
+from kiosk_client.redis_backend import IncompleteReply
+from kiosk_client.redis_backend import RedisError
+from kiosk_client.redis_backend import encode_reply
+from kiosk_client.redis_backend import parse_reply
+
+
+SERVICE_TIMES = ('constant', 'exponential', 'lognormal')
+
+
+class ServiceTime(object):
+    """The random time taken by a worker to process a job.
+
+    Args:
+        distribution (str): name of the distribution, one of
+            ``SERVICE_TIMES``.
+        mean (float): the mean service time in seconds.
+        sigma (float): the standard deviation of the logarithm of
+            ``lognormal`` service times.
+        random_state (random.Random): source of randomness.
+    """
+
+    def __init__(self, distribution='exponential', mean=1, sigma=0.5,
+                 random_state=None):
+        if distribution not in SERVICE_TIMES:
+            raise ValueError('Invalid service time distribution "%s", must '
+                             'be one of %s.' % (distribution,
+                                                ', '.join(SERVICE_TIMES)))
+        if not mean > 0:
+            raise ValueError('mean must be a positive number.')
+        if not sigma >= 0:
+            raise ValueError('sigma must not be negative.')
+
+        self.distribution = distribution
+        self.mean = float(mean)
+        self.sigma = float(sigma)
+        self.random = random.Random() if random_state is None else random_state
+
+    def sample(self):
+        """Get the service time of a job."""
+        if self.distribution == 'exponential':
+            return self.random.expovariate(1 / self.mean)
+        if self.distribution == 'lognormal':
+            mu = math.log(self.mean) - self.sigma ** 2 / 2
+            return self.random.lognormvariate(mu, self.sigma)
+        return self.mean
+
+
+class KioskSimulator(object):
+    """An in-memory job queue processed by a fixed number of workers.
+
+    API requests can be answered with errors or dropped at random, to
+    measure how the client retries. Downloads of output files can only be
+    dropped.
+
+    Args:
+        workers (int): the number of jobs processed at once.
+        service_time (ServiceTime): the time taken to process each job.
+        throttle_rate (float): fraction of requests answered with a 429.
+        error_rate (float): fraction of requests answered with a 500 or 503.
+        drop_rate (float): fraction of requests whose connection is dropped.
+        failure_rate (float): fraction of jobs that fail.
+        api_latency (float): seconds taken to answer each request.
+        output_size (int): bytes of each output file.
+        random_state (random.Random): source of randomness.
+        clock (twisted.internet.interfaces.IReactorTime): the clock of
+            service times and expirations.
+    """
+
+    def __init__(self, workers=1, service_time=None, throttle_rate=0,
+                 error_rate=0, drop_rate=0, failure_rate=0, api_latency=0,
+                 output_size=1024, random_state=None, clock=reactor):
+        rates = {
+            'throttle_rate': throttle_rate,
+            'error_rate': error_rate,
+            'drop_rate': drop_rate,
+            'failure_rate': failure_rate,
+        }
+        for name, rate in rates.items():
+            if not 0 <= rate <= 1:
+                raise ValueError('%s must be in the range [0, 1].' % name)
+        if throttle_rate + error_rate + drop_rate > 1:
+            raise ValueError('The sum of throttle_rate, error_rate and '
+                             'drop_rate must be at most 1.')
+        if int(workers) < 1:
+            raise ValueError('workers must be a positive integer.')
+
+        self.random = random.Random() if random_state is None else random_state
+        if service_time is None:
+            service_time = ServiceTime(random_state=self.random)
+
+        self.workers = int(workers)
+        self.service_time = service_time
+        self.throttle_rate = float(throttle_rate)
+        self.error_rate = float(error_rate)
+        self.drop_rate = float(drop_rate)
+        self.failure_rate = float(failure_rate)
+        self.api_latency = float(api_latency)
+        self.output_size = int(output_size)
+        self.clock = clock
+
+        self.jobs = {}  # job hash -> fields
+        self.queue = collections.deque()  # hashes of jobs waiting for workers
+        self.busy = 0  # number of jobs being processed
+        self.responses = collections.Counter()  # number of each response
+        self._expirations = {}  # job hash -> DelayedCall
+
+        self.logger = logging.getLogger(str(self.__class__.__name__))
+
+    def _now(self):
+        return datetime.datetime.utcfromtimestamp(
+            self.clock.seconds()).isoformat()
+
+    def get_fault(self):
+        """Decide whether to drop or fail a request.
+
+        Returns:
+            object: ``'drop'`` to drop the connection, the HTTP status code of
+                an error response, or ``None`` to answer the request.
+        """
+        x = self.random.random()
+        if x < self.drop_rate:
+            return 'drop'
+        x -= self.drop_rate
+        if x < self.throttle_rate:
+            return 429
+        x -= self.throttle_rate
+        if x < self.error_rate:
+            return self.random.choice((500, 503))
+        return None
+
+    def upload(self, size):  # pylint: disable=unused-argument
+        """Store an uploaded file, returning its uploaded name."""
+        return 'uploads/{}'.format(uuid.uuid4().hex)
+
+    def create(self, data):
+        """Create a job and queue it for a worker, returning its hash."""
+        job_hash = '{}:{}:{}'.format(data.get('jobType') or 'predict',
+                                     uuid.uuid4().hex,
+                                     data.get('imageName') or '')
+        self.jobs[job_hash] = {
+            'status': 'new',
+            'created_at': self._now(),
+            'model_name': data.get('modelName'),
+            'model_version': data.get('modelVersion'),
+            'input_file_name': data.get('uploadedName'),
+            '_created': self.clock.seconds(),
+        }
+        self.queue.append(job_hash)
+        self._dispatch()
+        return job_hash
+
+    def _dispatch(self):
+        while self.queue and self.busy < self.workers:
+            job_hash = self.queue.popleft()
+            job = self.jobs.get(job_hash)
+            if job is None:
+                continue  # expired before it was processed
+            self.busy += 1
+            job['status'] = 'started'
+            job['_started'] = self.clock.seconds()
+            self.clock.callLater(self.service_time.sample(),
+                                 self._finish, job_hash)
+
+    def _finish(self, job_hash):
+        self.busy -= 1
+        job = self.jobs.get(job_hash)
+        if job is not None:
+            now = self.clock.seconds()
+            job['finished_at'] = self._now()
+            job['prediction_time'] = now - job['_started']
+            job['total_time'] = now - job['_created']
+            if self.random.random() < self.failure_rate:
+                job['status'] = 'failed'
+                job['reason'] = 'Simulated failure.'
+            else:
+                job['status'] = 'done'
+                job['output_url'] = '/output/{}.zip'.format(uuid.uuid4().hex)
+        self._dispatch()
+
+    def get_value(self, job_hash, key, base_url=''):
+        """Get the value of a field of a job, or ``None``.
+
+        The ``output_url`` is prefixed with the ``base_url`` of the API, as
+        output files are downloaded from the simulator.
+        """
+        if key.startswith('_'):
+            return None  # private fields of the simulator
+        value = self.jobs.get(job_hash, {}).get(key)
+        if key == 'output_url' and value:
+            value = base_url + value
+        return value
+
+    def get_values(self, job_hash, base_url=''):
+        """Get every field of a job that has a value."""
+        values = {}
+        for key in self.jobs.get(job_hash, {}):
+            value = self.get_value(job_hash, key, base_url=base_url)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def expire(self, job_hash, seconds):
+        """Delete the job after ``seconds``, returning 1 if it exists."""
+        if job_hash not in self.jobs:
+            return 0
+        expiration = self._expirations.pop(job_hash, None)
+        if expiration is not None and expiration.active():
+            expiration.cancel()
+        self._expirations[job_hash] = self.clock.callLater(
+            seconds, self._delete, job_hash)
+        return 1
+
+    def _delete(self, job_hash):
+        self.jobs.pop(job_hash, None)
+        self._expirations.pop(job_hash, None)
+
+    def log_status(self):
+        statuses = collections.Counter(j['status'] for j in self.jobs.values())
+        self.logger.info('%s jobs queued; %s jobs processing; statuses: %s; '
+                         'responses: %s', len(self.queue), self.busy,
+                         dict(statuses), dict(self.responses))
+
+
+class SimulatorResource(resource.Resource):
+    """Serve the Kiosk frontend API from a ``KioskSimulator``."""
+
+    isLeaf = True
+
+    def __init__(self, simulator):
+        resource.Resource.__init__(self)
+        self.simulator = simulator
+
+    def _respond(self, request, code, body, content_type=b'application/json'):
+        """Answer the request after the simulated API latency."""
+        self.simulator.responses[code] += 1
+        disconnected = []
+        request.notifyFinish().addErrback(disconnected.append)
+
+        def write():
+            if disconnected:
+                return  # the client gave up on the request
+            request.setResponseCode(code)
+            request.setHeader(b'Content-Type', content_type)
+            request.write(body)
+            request.finish()
+
+        self.simulator.clock.callLater(self.simulator.api_latency, write)
+        return server.NOT_DONE_YET
+
+    def _inject_fault(self, request, errors=True):
+        fault = self.simulator.get_fault()
+        if fault == 'drop':
+            self.simulator.responses['dropped'] += 1
+            request.transport.abortConnection()
+            return server.NOT_DONE_YET
+        if fault is not None and errors:
+            return self._respond(request, fault, b'Simulated error.',
+                                 content_type=b'text/plain')
+        return None
+
+    def render_GET(self, request):  # pylint: disable=C0103
+        if not request.path.startswith(b'/output/'):
+            return self._respond(request, 200, b'Kiosk simulator',
+                                 content_type=b'text/plain')
+
+        # output files are served by the storage bucket, not the API
+        fault = self._inject_fault(request, errors=False)
+        if fault is not None:
+            return fault
+        return self._respond(request, 200, b'\0' * self.simulator.output_size,
+                             content_type=b'application/zip')
+
+    def render_POST(self, request):  # pylint: disable=C0103
+        sim = self.simulator
+        base_url = 'http://{}'.format(request.getHeader(b'host').decode())
+        routes = {
+            b'/api/predict': lambda d: {'hash': sim.create(d)},
+            b'/api/redis': lambda d: self._get_redis_value(d, base_url),
+            b'/api/redis/expire': lambda d: {
+                'value': sim.expire(d['hash'], int(d['expireIn']))},
+        }
+        if request.path != b'/api/upload' and request.path not in routes:
+            return self._respond(request, 404, b'Not found.',
+                                 content_type=b'text/plain')
+
+        fault = self._inject_fault(request)
+        if fault is not None:
+            return fault
+
+        content = request.content.read()
+        if request.path == b'/api/upload':
+            result = {'uploadedName': sim.upload(len(content))}
+        else:
+            try:
+                result = routes[request.path](json.loads(content.decode()))
+            except (ValueError, KeyError, TypeError) as err:
+                message = 'Invalid request: {}'.format(err)
+                return self._respond(request, 400, message.encode(),
+                                     content_type=b'text/plain')
+        return self._respond(request, 200, json.dumps(result).encode())
+
+    def _get_redis_value(self, data, base_url):
+        def get_value(key):
+            return self.simulator.get_value(data['hash'], key, base_url)
+
+        if 'keys' in data:
+            return {'value': [get_value(k) for k in data['keys']]}
+        return {'value': get_value(data['key'])}
+
+
+class RedisServerProtocol(protocol.Protocol):
+    """Answer Redis commands with the fields of the simulated jobs.
+
+    Supports ``PING``, ``HGET``, ``HMGET``, ``HGETALL`` and ``EXPIRE``, with
+    each job as a hash. Commands are always answered, without faults.
+    """
+
+    def __init__(self, simulator, base_url=''):
+        self.simulator = simulator
+        self.base_url = base_url
+        self._buffer = b''
+
+    def dataReceived(self, data):  # pylint: disable=C0103
+        self._buffer += data
+        replies, pos = [], 0
+        while True:
+            try:
+                command, pos = parse_reply(self._buffer, pos)
+            except IncompleteReply:
+                break
+            except (RedisError, ValueError) as err:
+                self.transport.write(encode_reply(RedisError(
+                    'ERR Protocol error: {}'.format(err))))
+                self.transport.loseConnection()
+                return
+            replies.append(encode_reply(self.execute(command)))
+        self._buffer = self._buffer[pos:]
+        if replies:  # answer a pipeline of commands at once
+            self.transport.write(b''.join(replies))
+
+    def execute(self, command):
+        """Get the reply to a command, as a list of its arguments."""
+        if not isinstance(command, list) or not command:
+            return RedisError('ERR invalid command')
+        name = command[0].decode().upper()
+        args = [arg.decode() for arg in command[1:]]
+        sim = self.simulator
+        sim.responses['redis'] += 1
+
+        if name == 'PING':
+            return 'PONG'
+        if name == 'HGET' and len(args) == 2:
+            return sim.get_value(args[0], args[1], self.base_url)
+        if name == 'HMGET' and len(args) > 1:
+            return [sim.get_value(args[0], key, self.base_url)
+                    for key in args[1:]]
+        if name == 'HGETALL' and len(args) == 1:
+            values = sim.get_values(args[0], self.base_url)
+            return [x for item in sorted(values.items()) for x in item]
+        if name == 'EXPIRE' and len(args) == 2:
+            try:
+                return sim.expire(args[0], int(args[1]))
+            except ValueError:
+                return RedisError('ERR value is not an integer')
+        return RedisError('ERR unknown command or wrong number of '
+                          'arguments for {!r}'.format(name))
+
+
+class RedisServerFactory(protocol.ServerFactory):
+    """Creates a ``RedisServerProtocol`` for each connection."""
+
+    noisy = False
+
+    def __init__(self, simulator, base_url=''):
+        self.simulator = simulator
+        self.base_url = base_url
+
+    def buildProtocol(self, addr):  # pylint: disable=C0103
+        return RedisServerProtocol(self.simulator, self.base_url)
+
+
+def listen(simulator, port, interface=''):
+    """Serve the simulated API on the given port.
+
+    Args:
+        simulator (KioskSimulator): the simulated frontend.
+        port (int): the port to listen on, or 0 for any free port.
+        interface (str): the interface to listen on. Defaults to all.
+
+    Returns:
+        twisted.internet.interfaces.IListeningPort: the listening port.
+    """
+    site = server.Site(SimulatorResource(simulator))
+    site.noisy = False
+    return reactor.listenTCP(port, site, interface=interface)
+
+
+def listen_redis(simulator, port, base_url='', interface=''):
+    """Serve the fields of the simulated jobs over the Redis protocol.
+
+    Args:
+        simulator (KioskSimulator): the simulated frontend.
+        port (int): the port to listen on, or 0 for any free port.
+        base_url (str): the URL of the simulated API, which serves the
+            output files.
+        interface (str): the interface to listen on. Defaults to all.
+
+    Returns:
+        twisted.internet.interfaces.IListeningPort: the listening port.
+    """
+    factory = RedisServerFactory(simulator, base_url)
+    return reactor.listenTCP(port, factory, interface=interface)
+
+
+def get_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Simulate the Kiosk frontend API locally.')
+
+    parser.add_argument('--port', type=int, default=8080,
+                        help='Port of the simulated API.')
+
+    parser.add_argument('--interface', type=str, default='',
+                        help='Interface to listen on. Defaults to all.')
+
+    parser.add_argument('--redis-port', type=int, default=0,
+                        help='Port to serve the simulated jobs over the '
+                             'Redis protocol. Disabled if 0.')
+
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of jobs processed at once.')
+
+    parser.add_argument('--service-time', type=str, default='exponential',
+                        choices=SERVICE_TIMES,
+                        help='Distribution of the time taken to process '
+                             'each job.')
+
+    parser.add_argument('--mean-service-time', type=float, default=1,
+                        help='Mean seconds taken to process each job.')
+
+    parser.add_argument('--service-time-sigma', type=float, default=0.5,
+                        help='Standard deviation of the logarithm of '
+                             '`lognormal` service times.')
+
+    parser.add_argument('--throttle-rate', type=float, default=0,
+                        help='Fraction of requests answered with a 429.')
+
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='Fraction of requests answered with a 500 or '
+                             '503.')
+
+    parser.add_argument('--drop-rate', type=float, default=0,
+                        help='Fraction of requests whose connection is '
+                             'dropped.')
+
+    parser.add_argument('--failure-rate', type=float, default=0,
+                        help='Fraction of jobs that fail.')
+
+    parser.add_argument('--api-latency', type=float, default=0,
+                        help='Seconds taken to answer each request.')
+
+    parser.add_argument('--output-size', type=int, default=1024,
+                        help='Bytes of each output file.')
+
+    parser.add_argument('--seed', type=int,
+                        help='Random seed, for reproducible runs.')
+
+    parser.add_argument('--log-interval', type=float, default=10,
+                        help='Seconds between each status log.')
+
+    return parser
+
+
+def main():
+    args = get_arg_parser().parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(asctime)s]:[%(levelname)s]:[%(name)s]: %(message)s')
+
+    random_state = random.Random(args.seed)
+    try:
+        simulator = KioskSimulator(
+            workers=args.workers,
+            service_time=ServiceTime(args.service_time,
+                                     mean=args.mean_service_time,
+                                     sigma=args.service_time_sigma,
+                                     random_state=random_state),
+            throttle_rate=args.throttle_rate,
+            error_rate=args.error_rate,
+            drop_rate=args.drop_rate,
+            failure_rate=args.failure_rate,
+            api_latency=args.api_latency,
+            output_size=args.output_size,
+            random_state=random_state)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(str(err))
+
+    port = listen(simulator, args.port, interface=args.interface)
+    simulator.logger.info('Simulating the Kiosk frontend on port %s.',
+                          port.getHost().port)
+    if args.redis_port:
+        base_url = 'http://localhost:{}'.format(port.getHost().port)
+        redis_port = listen_redis(simulator, args.redis_port,
+                                  base_url=base_url,
+                                  interface=args.interface)
+        simulator.logger.info('Serving the simulated jobs over the Redis '
+                              'protocol on port %s.', redis_port.getHost().port)
+    task.LoopingCall(simulator.log_status).start(args.log_interval,
+                                                 now=False)
+    reactor.run()  # pylint: disable=E1101
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Tests for the Kiosk frontend simulator"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import random
+
+import pytest
+import pytest_twisted
+
+from twisted.internet import defer
+from twisted.internet import reactor
+from twisted.internet import task
+from twisted.web.client import HTTPConnectionPool
+
+from kiosk_client import job
+from kiosk_client import redis_backend
+from kiosk_client import simulator
+
+
+class TestSimulator(object):
+
+    def test_service_time(self):
+        service_time = simulator.ServiceTime('constant', mean=2)
+        assert service_time.sample() == 2
+
+        for distribution in ('exponential', 'lognormal'):
+            service_time = simulator.ServiceTime(
+                distribution, mean=2, random_state=random.Random(1))
+            samples = [service_time.sample() for _ in range(5000)]
+            assert sum(samples) / len(samples) == pytest.approx(2, rel=0.1)
+            assert min(samples) > 0
+
+        with pytest.raises(ValueError):
+            simulator.ServiceTime('uniform')
+
+        with pytest.raises(ValueError):
+            simulator.ServiceTime(mean=0)
+
+        with pytest.raises(ValueError):
+            simulator.ServiceTime(sigma=-1)
+
+    def test_queue(self):
+        clock = task.Clock()
+        sim = simulator.KioskSimulator(
+            workers=2, service_time=simulator.ServiceTime('constant', 1),
+            clock=clock)
+
+        hashes = [sim.create({'imageName': 'image.png'}) for _ in range(3)]
+        assert all(h.endswith(':image.png') for h in hashes)
+        assert [sim.get_value(h, 'status') for h in hashes] == [
+            'started', 'started', 'new']
+
+        clock.advance(1)
+        assert [sim.get_value(h, 'status') for h in hashes] == [
+            'done', 'done', 'started']
+
+        clock.advance(1)
+        assert sim.get_value(hashes[2], 'status') == 'done'
+        assert sim.get_value(hashes[2], 'total_time') == 2
+        assert sim.get_value(hashes[2], 'prediction_time') == 1
+        assert sim.get_value(hashes[2], 'output_url').startswith('/output/')
+        assert sim.get_value(hashes[2], '_created') is None
+        assert sim.busy == 0
+
+        # expired jobs are deleted
+        assert sim.expire(hashes[0], 10) == 1
+        assert sim.expire(hashes[0], 5) == 1  # replaces the expiration
+        clock.advance(5)
+        assert sim.get_value(hashes[0], 'status') is None
+        assert sim.expire(hashes[0], 10) == 0
+
+        # jobs can fail
+        sim.failure_rate = 1
+        job_hash = sim.create({})
+        clock.advance(1)
+        assert sim.get_value(job_hash, 'status') == 'failed'
+        assert sim.get_value(job_hash, 'reason')
+
+    def test_get_fault(self):
+        assert simulator.KioskSimulator().get_fault() is None
+        assert simulator.KioskSimulator(drop_rate=1).get_fault() == 'drop'
+        assert simulator.KioskSimulator(throttle_rate=1).get_fault() == 429
+        assert simulator.KioskSimulator(error_rate=1).get_fault() in {500, 503}
+
+        sim = simulator.KioskSimulator(throttle_rate=0.2, error_rate=0.1,
+                                       random_state=random.Random(1))
+        faults = [sim.get_fault() for _ in range(5000)]
+        assert faults.count(429) / len(faults) == pytest.approx(0.2, abs=0.02)
+        assert 'drop' not in faults
+
+        with pytest.raises(ValueError):
+            simulator.KioskSimulator(drop_rate=2)
+
+        with pytest.raises(ValueError):
+            simulator.KioskSimulator(drop_rate=0.6, error_rate=0.6)
+
+        with pytest.raises(ValueError):
+            simulator.KioskSimulator(workers=0)
+
+    @pytest_twisted.inlineCallbacks
+    def test_job(self, tmpdir):
+        tmpdir = str(tmpdir)
+        sim = simulator.KioskSimulator(
+            workers=2,
+            service_time=simulator.ServiceTime('constant', mean=0.01),
+            random_state=random.Random(0))
+        port = simulator.listen(sim, 0, interface='127.0.0.1')
+
+        filepath = os.path.join(tmpdir, 'image.png')
+        with open(filepath, 'wb') as f:
+            f.write(b'image')
+
+        try:
+            jobs = [job.Job(filepath=filepath,
+                            host='http://127.0.0.1:{}'.format(
+                                port.getHost().port),
+                            model_name='model',
+                            model_version='0',
+                            update_interval=0,
+                            expire_time=1,
+                            download_results=True,
+                            multi_get=multi_get,
+                            output_dir=tmpdir,
+                            pool=HTTPConnectionPool(reactor, persistent=False))
+                    for multi_get in (False, True)]
+            for j in jobs:
+                sim.throttle_rate, sim.error_rate, sim.drop_rate = 0, 0, 0
+                yield j.upload()
+
+                # jobs are retried until they are done
+                sim.throttle_rate, sim.error_rate, sim.drop_rate = .2, .1, .1
+                yield j.start()
+                assert j.status == 'done'
+                assert j.is_expired
+                assert j.total_time > 0
+                assert j.is_summarized
+                output = os.path.join(tmpdir, j.output_url.split('/')[-1])
+                assert os.path.getsize(output) == sim.output_size
+
+            assert sim.responses[429] > 0  # retried
+        finally:
+            yield port.stopListening()
+
+    @pytest_twisted.inlineCallbacks
+    def test_job_redis(self, tmpdir):
+        tmpdir = str(tmpdir)
+        sim = simulator.KioskSimulator(
+            workers=2,
+            service_time=simulator.ServiceTime('constant', mean=0.01),
+            random_state=random.Random(0))
+        port = simulator.listen(sim, 0, interface='127.0.0.1')
+        host = 'http://127.0.0.1:{}'.format(port.getHost().port)
+        redis_port = simulator.listen_redis(sim, 0, base_url=host,
+                                            interface='127.0.0.1')
+        backend = redis_backend.RedisBackend(
+            '127.0.0.1', port=redis_port.getHost().port)
+
+        filepath = os.path.join(tmpdir, 'image.png')
+        with open(filepath, 'wb') as f:
+            f.write(b'image')
+
+        try:
+            jobs = [job.Job(filepath=filepath,
+                            host=host,
+                            model_name='model',
+                            model_version='0',
+                            update_interval=0,
+                            expire_time=1,
+                            download_results=True,
+                            redis=backend,
+                            output_dir=tmpdir,
+                            pool=HTTPConnectionPool(reactor, persistent=False))
+                    for _ in range(4)]
+            yield defer.gatherResults([j.start() for j in jobs])
+            for j in jobs:
+                assert j.status == 'done'
+                assert j.is_expired
+                assert j.is_summarized
+                output = os.path.join(tmpdir, j.output_url.split('/')[-1])
+                assert os.path.getsize(output) == sim.output_size
+
+            # statuses, summaries and expirations are read from Redis
+            assert sim.responses['redis'] == backend.commands
+            assert backend.pipelines < backend.commands
+        finally:
+            backend.close()
+            yield redis_port.stopListening()
+            yield port.stopListening()
@@ -0,0 +1,172 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Storage backends and a thread pool to upload files off the reactor"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import os
+import shutil
+import threading
+
+from google.cloud import storage as google_storage
+from twisted.internet import reactor, threads
+from twisted.python.threadpool import ThreadPool
+
+
+class StorageBackend(object):
+    """Interface of the storage of uploaded files.
+
+    The methods of a backend are called from worker threads.
+    """
+
+    def upload(self, filepath, name, acl=None):
+        """Upload the file as ``name``."""
+        raise NotImplementedError
+
+    def exists(self, name):
+        """Returns True if ``name`` was uploaded."""
+        raise NotImplementedError
+
+
+class GoogleStorage(StorageBackend):
+    """Uploads files to a Google Cloud Storage bucket.
+
+    The client and bucket are created once and shared by all uploads.
+    Files of at least ``resumable_threshold`` bytes are uploaded in chunks
+    of ``chunk_size`` bytes with a resumable upload, so a failed request
+    only resends the current chunk.
+
+    Args:
+        bucket (str): name of the bucket, e.g. "gs://storage-bucket".
+        chunk_size (int): bytes of each chunk, a multiple of 256 KB.
+        resumable_threshold (int): minimum bytes of a resumable upload.
+    """
+
+    def __init__(self, bucket, chunk_size=8 << 20, resumable_threshold=8 << 20):
+        self.logger = logging.getLogger(str(self.__class__.__name__))
+        if bucket.startswith('gs://'):
+            bucket = bucket[len('gs://'):]
+        self.bucket_name = bucket.strip('/')
+        self.chunk_size = int(chunk_size)
+        self.resumable_threshold = int(resumable_threshold)
+        self._bucket = None
+        self._lock = threading.Lock()
+
+    @property
+    def bucket(self):
+        with self._lock:
+            if self._bucket is None:
+                client = google_storage.Client()
+                self._bucket = client.bucket(self.bucket_name)
+            return self._bucket
+
+    def upload(self, filepath, name, acl=None):
+        chunk_size = None  # upload in a single request
+        if os.path.getsize(filepath) >= self.resumable_threshold:
+            chunk_size = self.chunk_size
+        blob = self.bucket.blob(name, chunk_size=chunk_size)
+        blob.upload_from_filename(filepath, predefined_acl=acl)
+        return blob.name
+
+    def exists(self, name):
+        return self.bucket.blob(name).exists()
+
+
+class LocalStorage(StorageBackend):
+    """Copies files into a local directory, as a stand-in for a bucket.
+
+    Args:
+        root (str): the directory of the uploaded files.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def upload(self, filepath, name, acl=None):
+        dest = os.path.join(self.root, name)
+        if not os.path.isdir(os.path.dirname(dest)):
+            os.makedirs(os.path.dirname(dest))
+        shutil.copyfile(filepath, dest)
+        return name
+
+    def exists(self, name):
+        return os.path.isfile(os.path.join(self.root, name))
+
+
+def get_storage(bucket, **kwargs):
+    """Get the storage backend of the bucket.
+
+    Args:
+        bucket (str): a Google Cloud Storage bucket, or a local directory
+            as "file:///path/to/dir".
+        kwargs (dict): other arguments of ``GoogleStorage``.
+
+    Returns:
+        StorageBackend: the storage of the bucket.
+    """
+    if str(bucket).startswith('file://'):
+        return LocalStorage(bucket[len('file://'):])
+    return GoogleStorage(str(bucket), **kwargs)
+
+
+class Uploader(object):
+    """Runs uploads in a pool of worker threads, off the reactor thread.
+
+    The pool is started with the first upload and stopped when the reactor
+    shuts down.
+
+    Args:
+        max_workers (int): maximum number of concurrent uploads.
+    """
+
+    def __init__(self, max_workers=8):
+        self.logger = logging.getLogger(str(self.__class__.__name__))
+        self.max_workers = int(max_workers)
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ThreadPool(0, self.max_workers, name='Uploader')
+            self._pool.start()
+            reactor.addSystemEventTrigger(  # pylint: disable=no-member
+                'during', 'shutdown', self.stop)
+        return self._pool
+
+    def run(self, func, *args, **kwargs):
+        """Call the function in a worker thread.
+
+        Returns:
+            twisted.internet.defer.Deferred: fires with the result.
+        """
+        return threads.deferToThreadPool(
+            reactor, self._get_pool(), func, *args, **kwargs)
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.stop()
+            self._pool = None
@@ -0,0 +1,138 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Tests for storage backends and the Uploader"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import threading
+
+import pytest
+import pytest_twisted
+
+from kiosk_client import storage
+
+
+class Bunch(object):
+    def __init__(self, **kwds):
+        self.__dict__.update(kwds)
+
+
+class DummyBlob(object):
+
+    uploaded = {}
+
+    def __init__(self, name, chunk_size=None):
+        self.name = name
+        self.chunk_size = chunk_size
+
+    def upload_from_filename(self, filepath, predefined_acl=None):
+        self.uploaded[self.name] = (filepath, self.chunk_size, predefined_acl)
+
+    def exists(self):
+        return self.name in self.uploaded
+
+
+class TestGoogleStorage(object):
+
+    def test_upload(self, tmpdir, mocker):
+        clients = []
+
+        def make_client():
+            client = Bunch(bucket=lambda name: Bunch(name=name,
+                                                     blob=DummyBlob))
+            clients.append(client)
+            return client
+
+        mocker.patch('google.cloud.storage.Client', make_client)
+
+        small = tmpdir.join('small.png')
+        small.write('x')
+        large = tmpdir.join('large.png')
+        large.write('x' * 10)
+
+        backend = storage.GoogleStorage('gs://bucket/', chunk_size=4,
+                                        resumable_threshold=10)
+        assert backend.bucket_name == 'bucket'
+        assert not clients  # created with the first upload
+
+        assert backend.upload(str(small), 'a/small.png') == 'a/small.png'
+        assert DummyBlob.uploaded['a/small.png'] == (str(small), None, None)
+        assert backend.upload(str(large), 'large.png', acl='publicRead')
+        assert DummyBlob.uploaded['large.png'] == (str(large), 4, 'publicRead')
+        assert backend.exists('large.png')
+        assert not backend.exists('missing.png')
+        assert len(clients) == 1  # the client is reused
+
+
+class TestLocalStorage(object):
+
+    def test_upload(self, tmpdir):
+        src = tmpdir.join('image.png')
+        src.write('content')
+        root = os.path.join(str(tmpdir), 'bucket')
+        backend = storage.get_storage('file://' + root)
+        assert isinstance(backend, storage.LocalStorage)
+
+        assert not backend.exists('uploads/image.png')
+        assert backend.upload(str(src), 'uploads/image.png')
+        assert backend.exists('uploads/image.png')
+        with open(os.path.join(root, 'uploads', 'image.png')) as f:
+            assert f.read() == 'content'
+
+
+def test_storage_backend():
+    backend = storage.StorageBackend()
+    with pytest.raises(NotImplementedError):
+        backend.upload('image.png', 'image.png')
+    with pytest.raises(NotImplementedError):
+        backend.exists('image.png')
+
+    assert isinstance(storage.get_storage('gs://bucket'),
+                      storage.GoogleStorage)
+
+
+class TestUploader(object):
+
+    @pytest_twisted.inlineCallbacks
+    def test_run(self):
+        uploader = storage.Uploader(max_workers=2)
+        main_thread = threading.current_thread()
+
+        result = yield uploader.run(lambda x: (x, threading.current_thread()),
+                                    1)
+        assert result[0] == 1
+        assert result[1] is not main_thread  # not on the reactor thread
+
+        with pytest.raises(ZeroDivisionError):
+            yield uploader.run(lambda: 1 / 0)
+
+        uploader.stop()
+        uploader.stop()  # stopping twice is fine
+        result = yield uploader.run(lambda: 2)  # restarted
+        assert result == 2
+        uploader.stop()
@@ -0,0 +1,399 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Compact, column-oriented storage of job data"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import array
+
+from kiosk_client.packing import map_children
+
+
+NAN = float('nan')
+
+
+def _float(x):
+    if isinstance(x, list):
+        return [_float(y) for y in x]
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return x
+
+
+class TableField(object):
+    """Descriptor that stores a job attribute in the job's ``JobTable`` row.
+
+    Args:
+        name (str): name of the column in the table.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance._table.get(instance._row, self.name)
+
+    def __set__(self, instance, value):
+        instance._table.set(instance._row, self.name, value)
+
+
+class JobTable(object):
+    """Stores the data of many jobs in typed, column-oriented arrays.
+
+    Each job is a row in the table. Numeric fields are stored as arrays of
+    floats (``NaN`` if missing), the status as a small integer code, and
+    boolean flags as bytes. Values of numeric fields that are not numbers,
+    such as lists of values for zip files, are stored separately.
+
+    The number of created, summarized and flagged rows and the number of
+    rows with each status are updated as values change, so counting does
+    not depend on the size of the table. Rows of finished jobs can be
+    ``release``d and are then reused by new rows, so the size of the table
+    is bounded by the number of jobs in flight. Listeners added with
+    ``add_listener`` are called with ``(row, field, old, new)`` whenever one
+    of the ``state_fields`` of a row changes.
+    """
+
+    float_fields = (
+        'total_time',
+        'total_jobs',
+        'prediction_time',
+        'postprocess_time',
+        'upload_time',
+        'download_time',
+        'predict_retries',
+        'cleanup_time',
+        'children_upload_time',
+        'client_upload_time',
+        'upload_size',
+    )
+
+    object_fields = (
+        'original_name',
+        'model',
+        'preprocess',
+        'postprocess',
+        'job_id',
+        'created_at',
+        'finished_at',
+        'output_url',
+        'reason',
+        'packed_files',
+    )
+
+    flag_fields = (
+        'is_expired',
+        'failed',
+    )
+
+    # changes to these fields are published to listeners
+    state_fields = frozenset({'status', 'job_id', 'is_expired', 'failed'})
+
+    # these fields determine whether a row is summarized
+    summary_fields = frozenset({'status', 'created_at', 'finished_at',
+                                'output_url'})
+
+    def __init__(self):
+        self._floats = {f: array.array('d') for f in self.float_fields}
+        self._objects = {f: [] for f in self.object_fields}
+        self._flags = {f: bytearray() for f in self.flag_fields}
+        self._extras = {}  # (field, row) -> non-numeric value of float field
+
+        self._status_codes = array.array('h')  # -1 if status is None
+        self._status_names = []  # code -> status
+        self._status_lookup = {}  # status -> code
+
+        # counters updated on every change
+        self._status_counts = []  # code -> number of rows
+        self._flag_counts = {f: 0 for f in self.flag_fields}
+        self._summarized = bytearray()
+        self._summarized_count = 0
+        self._created_count = 0
+        self._failed_rows = set()
+        self._released = set()  # cleared rows to reuse
+
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Call ``listener(row, field, old, new)`` when a state changes."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def __len__(self):
+        return len(self._status_codes)
+
+    def append(self, **values):
+        """Add a new row to the table, reusing a released row if any.
+
+        Args:
+            values (dict): initial values of any fields of the row.
+
+        Returns:
+            int: the index of the new row.
+        """
+        if self._released:
+            row = self._released.pop()
+        else:
+            row = len(self)
+            for column in self._floats.values():
+                column.append(NAN)
+            for column in self._objects.values():
+                column.append(None)
+            for column in self._flags.values():
+                column.append(0)
+            self._status_codes.append(-1)
+            self._summarized.append(0)
+
+        for field, value in values.items():
+            self.set(row, field, value)
+        return row
+
+    def release(self, row):
+        """Clear the values of a row and reuse it for the next new row.
+
+        Listeners are not called with the cleared values, and released rows
+        are skipped by ``iter_flagged`` and ``iter_records``.
+        """
+        listeners, self._listeners = self._listeners, []
+        try:
+            self.set(row, 'status', None)
+            for field in (self.float_fields + self.object_fields +
+                          self.flag_fields):
+                self.set(row, field, None)
+        finally:
+            self._listeners = listeners
+        self._released.add(row)
+
+    def count_released(self):
+        """Get the number of released rows that are not yet reused."""
+        return len(self._released)
+
+    def _encode_status(self, status):
+        if status is None:
+            return -1
+        try:
+            return self._status_lookup[status]
+        except KeyError:
+            code = len(self._status_names)
+            self._status_names.append(status)
+            self._status_lookup[status] = code
+            self._status_counts.append(0)
+            return code
+
+    def get(self, row, field):
+        """Get the value of a field of a row."""
+        if field == 'status':
+            code = self._status_codes[row]
+            return None if code < 0 else self._status_names[code]
+
+        if field in self._floats:
+            if (field, row) in self._extras:
+                return self._extras[(field, row)]
+            value = self._floats[field][row]
+            return None if value != value else value  # NaN is None
+
+        if field in self._flags:
+            return bool(self._flags[field][row])
+
+        return self._objects[field][row]
+
+    def set(self, row, field, value):
+        """Set the value of a field of a row."""
+        if field in self.state_fields and self._listeners:
+            old = self.get(row, field)
+
+        if field == 'status':
+            code = self._encode_status(value)
+            old_code = self._status_codes[row]
+            if old_code >= 0:
+                self._status_counts[old_code] -= 1
+            if code >= 0:
+                self._status_counts[code] += 1
+            self._status_codes[row] = code
+
+        elif field in self._floats:
+            self._extras.pop((field, row), None)
+            if value is None:
+                value = NAN
+            elif not isinstance(value, float):
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    self._extras[(field, row)] = value
+                    value = NAN
+            self._floats[field][row] = value
+
+        elif field in self._flags:
+            value = int(bool(value))
+            column = self._flags[field]
+            self._flag_counts[field] += value - column[row]
+            column[row] = value
+            if field == 'failed':
+                if value:
+                    self._failed_rows.add(row)
+                else:
+                    self._failed_rows.discard(row)
+
+        else:
+            column = self._objects[field]
+            if field == 'job_id':
+                self._created_count += ((value is not None) -
+                                        (column[row] is not None))
+            column[row] = value
+
+        if field in self.summary_fields:
+            summarized = int(self.is_summarized(row))
+            self._summarized_count += summarized - self._summarized[row]
+            self._summarized[row] = summarized
+
+        if field in self.state_fields and self._listeners:
+            new = self.get(row, field)
+            if new != old:
+                for listener in list(self._listeners):
+                    listener(row, field, old, new)
+
+    def column(self, field):
+        """Get the stored values of a field for every row.
+
+        Numeric fields are arrays of floats, with ``NaN`` for missing and
+        non-numeric values, flags are bytearrays and the status is an array
+        of indices into ``status_names``, or -1 if the status is ``None``.
+        Other fields are lists of values.
+        """
+        if field == 'status':
+            return self._status_codes
+        if field in self._floats:
+            return self._floats[field]
+        if field in self._flags:
+            return self._flags[field]
+        return self._objects[field]
+
+    @property
+    def status_names(self):
+        """Every status of any row, in the order of their codes."""
+        return list(self._status_names)
+
+    def get_extras(self, field):
+        """Get the non-numeric values of a numeric field by row."""
+        return {row: value for (f, row), value in self._extras.items()
+                if f == field}
+
+    def is_summarized(self, row):
+        status = self.get(row, 'status')
+        if status == 'failed':
+            return True
+        if status != 'done':
+            return False
+        return all(self._objects[f][row] is not None
+                   for f in ('created_at', 'finished_at', 'output_url'))
+
+    def count_statuses(self):
+        """Get the number of rows with each status."""
+        return {status: count for status, count
+                in zip(self._status_names, self._status_counts) if count}
+
+    def count_created(self):
+        """Get the number of rows with a job ID."""
+        return self._created_count
+
+    def count_summarized(self):
+        """Get the number of rows that are summarized."""
+        return self._summarized_count
+
+    def count_flagged(self, field):
+        """Get the number of rows with the given flag set."""
+        return self._flag_counts[field]
+
+    def failed_rows(self):
+        """Get the index of every row with the ``failed`` flag set."""
+        return sorted(self._failed_rows)
+
+    def iter_flagged(self, field, value=True):
+        """Iterate over the index of each row where the flag has the value."""
+        column = self._flags[field]
+        flag = b'\x01' if value else b'\x00'
+        row = column.find(flag)
+        while row >= 0:
+            if row not in self._released:
+                yield row
+            row = column.find(flag, row + 1)
+
+    def record(self, row):
+        """Get the data of a row as a JSON-serializable dictionary.
+
+        The record of a packed job also has the data of each file in the
+        pack as ``children``.
+        """
+        get = lambda field: self.get(row, field)
+        record = {
+            'input_file': get('original_name'),
+            'status': get('status'),
+            'total_time': _float(get('total_time')),
+            'total_jobs': _float(get('total_jobs')),
+            'download_url': get('output_url'),
+            'created_at': get('created_at'),
+            'finished_at': get('finished_at'),
+            'prediction_time': _float(get('prediction_time')),
+            'postprocess_time': _float(get('postprocess_time')),
+            'upload_time': _float(get('upload_time')),
+            'download_time': _float(get('download_time')),
+            'predict_retries': _float(get('predict_retries')),
+            'cleanup_time': _float(get('cleanup_time')),
+            'children_upload_time': _float(get('children_upload_time')),
+            'client_upload_time': _float(get('client_upload_time')),
+            'upload_size': _float(get('upload_size')),
+            'model': get('model'),
+            'postprocess': get('postprocess'),
+            'preprocess': get('preprocess'),
+            'reason': get('reason'),
+            'job_id': get('job_id'),
+        }
+        packed_files = get('packed_files')
+        if packed_files:
+            record['children'] = map_children(record, packed_files)
+            record['packed_files'] = packed_files
+        return record
+
+    def load_record(self, row, record):
+        """Set the data of a row from the output of ``record``."""
+        renamed = {'input_file': 'original_name', 'download_url': 'output_url'}
+        for key, value in record.items():
+            field = renamed.get(key, key)
+            if field == 'status' or field in self._floats or \
+                    field in self._objects:
+                self.set(row, field, value)
+
+    def iter_records(self):
+        """Iterate over the data of each row."""
+        for row in range(len(self)):
+            if row not in self._released:
+                yield self.record(row)
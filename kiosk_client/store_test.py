@@ -0,0 +1,286 @@
+# Copyright 2016-2021 The Van Valen Lab at the California Institute of
+# Technology (Caltech), with support from the Paul Allen Family Foundation,
+# Google, & National Institutes of Health (NIH) under Grant U24CA224309-01.
+# All rights reserved.
+#
+# Licensed under a modified Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.github.com/vanvalenlab/kiosk-client/LICENSE
+#
+# The Work provided may be used for non-commercial academic purposes only.
+# For any other use of the Work, including commercial use, please contact:
+# vanvalenlab@gmail.com
+#
+# Neither the name of Caltech nor the names of its contributors may be used
+# to endorse or promote products derived from this software without specific
+# prior written permission.
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Tests for JobTable class"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from kiosk_client import store
+
+
+class Bunch(object):
+
+    status = store.TableField('status')
+    total_time = store.TableField('total_time')
+
+    def __init__(self, table):
+        self._table = table
+        self._row = table.append()
+
+
+class TestTableField(object):
+
+    def test_get_set(self):
+        table = store.JobTable()
+        a, b = Bunch(table), Bunch(table)
+
+        assert isinstance(Bunch.status, store.TableField)
+        assert a.status is None and b.status is None
+
+        a.status = 'done'
+        b.total_time = '3.5'
+        assert a.status == 'done' and b.status is None
+        assert a.total_time is None and b.total_time == 3.5
+        assert table.get(0, 'status') == 'done'
+
+
+class TestJobTable(object):
+
+    def test_append(self):
+        table = store.JobTable()
+        assert len(table) == 0  # pylint: disable=len-as-condition
+
+        row = table.append(original_name='a.png', model='m:0')
+        assert row == 0
+        assert table.append() == 1
+        assert len(table) == 2
+
+        assert table.get(0, 'original_name') == 'a.png'
+        assert table.get(0, 'model') == 'm:0'
+        assert table.get(1, 'original_name') is None
+        assert table.get(1, 'total_time') is None
+        assert table.get(1, 'is_expired') is False
+
+    def test_get_set(self):
+        table = store.JobTable()
+        row = table.append()
+
+        # statuses are encoded as small integers
+        for status in ('new', 'done', 'new', None, 1):
+            table.set(row, 'status', status)
+            assert table.get(row, 'status') == status
+        assert len(table._status_names) == 3
+
+        # numbers are stored as floats
+        for value, expected in (('1.5', 1.5), (2, 2.0), (None, None)):
+            table.set(row, 'total_time', value)
+            assert table.get(row, 'total_time') == expected
+
+        # other values are stored as they are
+        for value in (['1', '2'], 'None'):
+            table.set(row, 'total_time', value)
+            assert table.get(row, 'total_time') == value
+        table.set(row, 'total_time', 3)
+        assert table.get(row, 'total_time') == 3
+
+        table.set(row, 'failed', True)
+        assert table.get(row, 'failed') is True
+        table.set(row, 'failed', 0)
+        assert table.get(row, 'failed') is False
+
+        table.set(row, 'job_id', 'abc')
+        assert table.get(row, 'job_id') == 'abc'
+
+    def test_counts(self):
+        table = store.JobTable()
+        rows = [table.append() for _ in range(4)]
+
+        assert table.count_created() == 0
+        assert table.count_statuses() == {}
+        assert table.count_summarized() == 0
+        assert table.count_flagged('is_expired') == 0
+
+        for row, status in zip(rows, ('new', 'done', 'done', 'failed')):
+            table.set(row, 'status', status)
+            table.set(row, 'job_id', str(row))
+
+        table.set(rows[0], 'status', 'predicting')
+
+        for field in ('created_at', 'finished_at', 'output_url'):
+            table.set(rows[1], field, 'value')
+
+        table.set(rows[3], 'is_expired', True)
+
+        assert table.count_created() == 4
+        assert table.count_statuses() == {
+            'predicting': 1, 'done': 2, 'failed': 1}
+        assert table.count_summarized() == 2
+        assert table.count_flagged('is_expired') == 1
+        assert list(table.iter_flagged('is_expired')) == [3]
+        assert list(table.iter_flagged('is_expired', False)) == [0, 1, 2]
+
+    def test_counters(self):
+        table = store.JobTable()
+        row = table.append()
+
+        table.set(row, 'status', 'done')
+        table.set(row, 'status', 'done')
+        assert table.count_statuses() == {'done': 1}
+        table.set(row, 'status', 'new')
+        assert table.count_statuses() == {'new': 1}
+        table.set(row, 'status', None)
+        assert table.count_statuses() == {}
+
+        table.set(row, 'job_id', 'a')
+        table.set(row, 'job_id', 'b')
+        assert table.count_created() == 1
+        table.set(row, 'job_id', None)
+        assert table.count_created() == 0
+
+        table.set(row, 'failed', True)
+        table.set(row, 'failed', True)
+        assert table.count_flagged('failed') == 1
+        assert table.failed_rows() == [row]
+        table.set(row, 'failed', False)
+        assert table.count_flagged('failed') == 0
+        assert table.failed_rows() == []
+
+        # summarized as soon as the last summary field is set
+        table.set(row, 'status', 'done')
+        for field in ('created_at', 'finished_at', 'output_url'):
+            assert table.count_summarized() == 0
+            table.set(row, field, 'value')
+        assert table.count_summarized() == 1
+        table.set(row, 'output_url', 'value2')
+        assert table.count_summarized() == 1
+        table.set(row, 'status', 'predicting')
+        assert table.count_summarized() == 0
+        table.set(row, 'status', 'failed')
+        assert table.count_summarized() == 1
+
+    def test_listeners(self):
+        table = store.JobTable()
+        row = table.append()
+
+        events = []
+        listener = lambda *args: events.append(args)
+        table.add_listener(listener)
+
+        table.set(row, 'status', 'new')
+        table.set(row, 'status', 'new')  # no change
+        table.set(row, 'job_id', 'a')
+        table.set(row, 'total_time', 1)  # not a state field
+        table.set(row, 'is_expired', True)
+
+        assert events == [
+            (row, 'status', None, 'new'),
+            (row, 'job_id', None, 'a'),
+            (row, 'is_expired', False, True),
+        ]
+
+        table.remove_listener(listener)
+        table.set(row, 'status', 'done')
+        assert len(events) == 3
+
+    def test_records(self):
+        table = store.JobTable()
+        table.append(original_name='a.png', model='m:0')
+        table.append(original_name='b.png', model='m:0')
+
+        table.set(0, 'prediction_time', ['1', '2'])
+        table.set(0, 'total_time', '3')
+        table.set(1, 'total_time', 'None')
+
+        records = list(table.iter_records())
+        assert len(records) == 2
+        assert records[0]['input_file'] == 'a.png'
+        assert records[0]['prediction_time'] == [1.0, 2.0]
+        assert records[0]['total_time'] == 3.0
+        assert records[1]['total_time'] == 'None'
+        assert records[1]['upload_time'] is None
+        assert 'children' not in records[0]
+
+        # the results of packed jobs are mapped to each packed file
+        table.set(0, 'packed_files', ['x.png', 'y.png'])
+        record = table.record(0)
+        assert record['packed_files'] == ['x.png', 'y.png']
+        assert record['children'] == [
+            {'input_file': 'x.png', 'prediction_time': 1.0},
+            {'input_file': 'y.png', 'prediction_time': 2.0},
+        ]
+
+    def test_load_record(self):
+        table = store.JobTable()
+        table.append(original_name='a.png', model='m:0')
+        table.set(0, 'status', 'done')
+        table.set(0, 'output_url', 'url')
+        table.set(0, 'prediction_time', ['1', '2'])
+        table.set(0, 'total_time', '3')
+
+        record = table.record(0)
+        row = table.append()
+        table.load_record(row, dict(record, unknown_key=1))
+        assert table.record(row) == record
+        assert table.count_statuses() == {'done': 2}
+
+    def test_columns(self):
+        table = store.JobTable()
+        table.append(original_name='a.png', total_time=1)
+        table.append(original_name='b.png', total_time='None')
+        table.set(1, 'status', 'done')
+        table.set(1, 'failed', True)
+
+        assert list(table.column('original_name')) == ['a.png', 'b.png']
+        assert list(table.column('total_time'))[0] == 1
+        assert list(table.column('failed')) == [0, 1]
+        assert list(table.column('status')) == [-1, 0]
+        assert table.status_names == ['done']
+
+        # values that are not numbers are kept separately
+        assert table.get_extras('total_time') == {1: 'None'}
+        assert table.get_extras('upload_time') == {}
+
+    def test_release(self):
+        table = store.JobTable()
+        events = []
+        table.add_listener(lambda *args: events.append(args))
+        for name in ('a.png', 'b.png', 'c.png'):
+            row = table.append(original_name=name, job_id=name,
+                               status='done', total_time=[1, 2])
+            table.set(row, 'is_expired', True)
+        table.set(1, 'failed', True)
+        del events[:]
+
+        table.release(1)
+        table.release(0)
+        assert not events
+        assert len(table) == 3
+        assert table.count_released() == 2
+        assert table.count_created() == 1
+        assert table.count_statuses() == {'done': 1}
+        assert table.count_flagged('is_expired') == 1
+        assert table.failed_rows() == []
+        assert list(table.iter_flagged('is_expired', False)) == []
+        assert [r['input_file'] for r in table.iter_records()] == ['c.png']
+        assert table.get_extras('total_time') == {2: [1, 2]}
+
+        # released rows are reused before the table grows
+        rows = [table.append(original_name=n) for n in ('d.png', 'e.png')]
+        assert sorted(rows) == [0, 1]
+        assert table.get(rows[0], 'job_id') is None
+        assert table.get(rows[0], 'is_expired') is False
+        assert table.append() == 3
+        assert table.count_released() == 0
@@ -28,7 +28,10 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import multiprocessing
 import os
+import signal
+import threading
 
 from PIL import Image
 
@@ -67,6 +70,25 @@ def sleep(seconds):
     return deferLater(reactor, seconds, lambda: None)
 
 
+def percentile(values, q):
+    """Get the q-th percentile of the values, interpolating linearly.
+
+    Args:
+        values (list): the numbers.
+        q (float): the percentile, between 0 and 100.
+
+    Returns:
+        float: the percentile, or None if there are no values.
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    rank = (len(values) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
 def is_image_file(filepath):
     """Returns True if the file is an image file, otherwise False"""
     try:
@@ -77,23 +99,165 @@ def is_image_file(filepath):
         return False
 
 
-def iter_image_files(path, include_archives=True):
+# leading bytes of image formats, for files without an image extension
+IMAGE_SIGNATURES = (
+    b'\x89PNG\r\n\x1a\n',  # PNG
+    b'\xff\xd8\xff',  # JPEG
+    b'GIF87a', b'GIF89a',  # GIF
+    b'II*\x00', b'MM\x00*',  # TIFF
+    b'BM',  # BMP
+    b'\x00\x00\x01\x00',  # ICO
+    b'\x00\x00\x00\x0cjP  ',  # JPEG 2000
+)
+
+
+def _image_extensions():
+    Image.init()  # register all plugins
+    return frozenset(ext.lower() for ext in Image.registered_extensions())
+
+
+def has_image_signature(filepath, extensions=None):
+    """Returns True if the file may be an image, without decoding it.
+
+    Files with an image extension are accepted, otherwise the first bytes
+    of the file must match a known image format.
+    """
+    extensions = _image_extensions() if extensions is None else extensions
+    _, ext = os.path.splitext(filepath.lower())
+    if ext in extensions:
+        return True
+    try:
+        with open(filepath, 'rb') as f:
+            header = f.read(16)
+    except (IOError, OSError):
+        return False
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return True
+    return any(header.startswith(sig) for sig in IMAGE_SIGNATURES)
+
+
+def _init_worker():
+    # forked workers inherit the reactor's signal handlers, which would keep
+    # them alive when the pool is terminated
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _verify_image(item):
+    """Verify the image file of a ``(filepath, stat, verdict)`` item,
+    unless its verdict is already known.
+
+    Runs in a worker process.
+    """
+    filepath, stat, verdict = item
+    if verdict is None:
+        verdict = is_image_file(filepath)
+    return filepath, verdict, stat
+
+
+def iter_image_files(path, include_archives=True, processes=1, index=None,
+                     chunksize=16):
+    """Iterate over the image and archive files in a directory.
+
+    Candidate files are prefiltered by extension or leading bytes before
+    being verified with PIL. Files are yielded as soon as they are
+    verified, which may not be in order if using multiple processes.
+    Zip files and files with a known verdict are yielded in turn with the
+    verified files, without being verified again.
+    At most ``2 * processes * chunksize`` files are being verified at once,
+    so the workers can finish them quickly if the iteration stops early.
+
+    Args:
+        path (str): a directory or a single file.
+        include_archives (bool): also yield zip files.
+        processes (int): verify images in this many worker processes.
+            If 1, images are verified in this process.
+        index (kiosk_client.cache.FileIndex): the known verdict of files.
+            Only new or modified files are verified.
+        chunksize (int): number of files sent to each worker at once.
+    """
     archive_extensions = {'.zip'}
-    if os.path.isfile(path):
-        _, ext = os.path.splitext(path.lower())
-        if ext in archive_extensions and include_archives:
-            yield path
-        elif is_image_file(path):
-            yield path
-
-    for (dirpath, _, filenames) in os.walk(path):
-        for filename in filenames:
-            filepath = os.path.join(dirpath, filename)
+    image_extensions = _image_extensions()
+
+    # bound the files sent to the workers but not yet yielded
+    parallel = processes > 1
+    in_flight = threading.BoundedSemaphore(2 * processes * chunksize)
+    stopped = threading.Event()
+
+    def iter_candidates():
+        if os.path.isfile(path):
+            filepaths = [path]
+        else:
+            filepaths = (os.path.join(dirpath, filename)
+                         for (dirpath, _, filenames) in os.walk(path)
+                         for filename in filenames)
+
+        for filepath in filepaths:
+            if stopped.is_set():
+                return
+
             # process all zip images
             _, ext = os.path.splitext(filepath.lower())
-            if ext in archive_extensions and include_archives:
-                yield filepath
+            verdict = None
+            if ext in archive_extensions:
+                if not include_archives:
+                    continue
+                verdict = True
+
+            elif not has_image_signature(filepath, image_extensions):
+                continue
+
+            stat = None  # only recorded in the index if verified
+            if index is not None and verdict is None:
+                try:
+                    st = os.stat(filepath)
+                except OSError:
+                    continue
+                verdict = index.get(filepath, st.st_size, st.st_mtime)
+                if verdict is None:
+                    stat = (st.st_size, st.st_mtime)
+                elif not verdict:
+                    continue
 
-            # process all images
-            elif is_image_file(filepath):
+            if parallel:
+                in_flight.acquire()
+                if stopped.is_set():
+                    return
+            yield filepath, stat, verdict
+
+    pool = None
+    if parallel:
+        pool = multiprocessing.Pool(processes, initializer=_init_worker)
+        results = pool.imap_unordered(
+            _verify_image, iter_candidates(), chunksize)
+    else:
+        results = (_verify_image(item) for item in iter_candidates())
+
+    try:
+        for i, (filepath, verdict, stat) in enumerate(results):
+            if parallel:
+                in_flight.release()
+            if stat is not None:
+                index.put(filepath, stat[0], stat[1], verdict)
+                if i % 1000 == 999:
+                    index.commit()
+            if verdict:
                 yield filepath
+
+        if pool is not None:  # all files are verified
+            pool.close()
+            pool.join()
+            pool = None
+    finally:
+        if pool is not None:  # stopped early
+            # let the workers finish the files in flight: terminating them
+            # could kill a worker holding the lock of the result queue
+            stopped.set()
+            try:
+                in_flight.release()  # wake up the candidate generator
+            except ValueError:
+                pass  # it is not waiting
+            pool.close()
+            pool.join()
+        if index is not None:
+            index.commit()
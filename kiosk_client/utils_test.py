@@ -35,6 +35,7 @@ import zipfile
 from PIL import Image
 import pytest
 
+from kiosk_client import cache
 from kiosk_client import utils
 
 
@@ -100,6 +101,91 @@ class TestUtils(object):
         results = utils.iter_image_files(valid_images[0])
         assert set(list(results)) == set((valid_images[0],))
 
+    def test_has_image_signature(self, tmpdir):
+        tmpdir = str(tmpdir)
+        no_ext = os.path.join(tmpdir, 'image')
+        Image.new('RGB', (8, 8)).save(no_ext, 'PNG')
+        assert utils.has_image_signature(no_ext)
+
+        text = os.path.join(tmpdir, 'notes')
+        with open(text, 'w') as f:
+            f.write('not an image')
+        assert not utils.has_image_signature(text)
+
+        # files with image extensions are verified later
+        bad_ext = os.path.join(tmpdir, 'bad.png')
+        with open(bad_ext, 'w') as f:
+            f.write('not an image')
+        assert utils.has_image_signature(bad_ext)
+
+        assert not utils.has_image_signature(os.path.join(tmpdir, 'x'))
+
+    def test_iter_image_files_parallel(self, tmpdir):
+        tmpdir = str(tmpdir)
+        valid_images = []
+        for i in range(10):
+            valid_image = os.path.join(tmpdir, 'image%s' % i)
+            Image.new('RGB', (8, 8)).save(valid_image, 'PNG')
+            valid_images.append(valid_image)
+        with open(os.path.join(tmpdir, 'bad.png'), 'w') as f:
+            f.write('not an image')
+
+        results = utils.iter_image_files(tmpdir, processes=2, chunksize=2)
+        assert sorted(results) == sorted(valid_images)
+
+        # stopping early stops the workers
+        for _ in range(20):
+            results = utils.iter_image_files(tmpdir, processes=2, chunksize=2)
+            assert next(results) in valid_images
+            results.close()
+
+    def test_iter_image_files_index(self, tmpdir, mocker):
+        tmpdir = str(tmpdir)
+        valid_images = []
+        for i in range(3):
+            valid_image = os.path.join(tmpdir, 'image%s.png' % i)
+            Image.new('RGB', (8, 8)).save(valid_image, 'PNG')
+            valid_images.append(valid_image)
+        bad_image = os.path.join(tmpdir, 'bad.png')
+        with open(bad_image, 'w') as f:
+            f.write('not an image')
+
+        index = cache.FileIndex()
+        verify = mocker.spy(utils, 'is_image_file')
+        results = utils.iter_image_files(tmpdir, index=index)
+        assert sorted(results) == sorted(valid_images)
+        assert verify.call_count == 4
+        assert len(index) == 4
+
+        # only modified files are verified again
+        verify.reset_mock()
+        with open(bad_image, 'w') as f:
+            f.write('still not an image')
+        results = utils.iter_image_files(tmpdir, index=index)
+        assert sorted(results) == sorted(valid_images)
+        assert verify.call_count == 1
+
+        # known files are yielded with the parallel verification too
+        results = utils.iter_image_files(tmpdir, index=index, processes=2)
+        assert sorted(results) == sorted(valid_images)
+
+        # known files are yielded as they are found, not after the walk
+        lookup = mocker.spy(index, 'get')
+        results = utils.iter_image_files(tmpdir, index=index)
+        assert next(results) in valid_images
+        assert lookup.call_count < len(index)
+        results.close()
+
+    def test_percentile(self):
+        assert utils.percentile([], 50) is None
+        assert utils.percentile([3], 99) == 3
+        values = [4, 1, 3, 2, 5]
+        assert utils.percentile(values, 0) == 1
+        assert utils.percentile(values, 50) == 3
+        assert utils.percentile(values, 100) == 5
+        assert utils.percentile(values, 90) == pytest.approx(4.6)
+        assert utils.percentile([1, 2], 50) == 1.5
+
     def test_strip_bucket_prefix(self):
         names = [
             'uploads',
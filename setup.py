@@ -54,6 +54,7 @@ setup(name=about['__title__'],
           about['__url__'], about['__version__']),
       python_requires=">=2.7, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*, !=3.4.*",
       install_requires=['google-cloud-storage',
+                        'numpy',
                         'Pillow',
                         'python-decouple',
                         'python-dateutil',